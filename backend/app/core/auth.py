@@ -0,0 +1,91 @@
+import os
+import time
+import hashlib
+import logging
+from typing import Any, Dict
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt as jose_jwt, JWTError
+
+from app.core.cache import TTLCache
+from app.core.metrics import metrics
+from app.core.security import ALGORITHM, SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_MAXSIZE = int(os.getenv("AUTH_CACHE_MAXSIZE", "10000"))
+# Upper bound for how long a verified token is trusted without re-checking its signature
+AUTH_CACHE_MAX_TTL = float(os.getenv("AUTH_CACHE_MAX_TTL", "3600"))
+
+# PyJWT (C-accelerated HMAC, less overhead) when installed; python-jose otherwise
+try:
+    import jwt as pyjwt
+    JWT_BACKEND = "pyjwt"
+    _JWT_ERRORS = (JWTError, pyjwt.PyJWTError)
+except ImportError:
+    pyjwt = None
+    JWT_BACKEND = "jose"
+    _JWT_ERRORS = (JWTError,)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+
+# sha256(token) -> verified claims, kept until the token's exp
+_claims = TTLCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_MAX_TTL)
+
+class InvalidToken(Exception):
+    pass
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Verifies signature and expiry. Raises InvalidToken."""
+    try:
+        if pyjwt is not None:
+            return pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        return jose_jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except _JWT_ERRORS as e:
+        raise InvalidToken(str(e))
+
+def get_token_claims(token: str) -> Dict[str, Any]:
+    """
+    Verified claims of `token`, from memory when the same token was seen before.
+    Entries expire with the token (exp), so an expired token is never served from cache.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    claims = _claims.get(key)
+    if claims is not None:
+        metrics.incr("auth.cache.hits")
+        return claims
+
+    metrics.incr("auth.cache.misses")
+    claims = decode_token(token)
+    exp = claims.get("exp")
+    ttl = AUTH_CACHE_MAX_TTL if exp is None else min(AUTH_CACHE_MAX_TTL, float(exp) - time.time())
+    if ttl > 0:
+        _claims.set(key, claims, ttl=ttl)
+    return claims
+
+def invalidate_cached_tokens():
+    """Drops every cached verification (e.g. after rotating SECRET_KEY)."""
+    _claims.clear()
+
+async def get_current_claims(request: Request, token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    # async def on purpose: nothing here blocks, and a sync dependency would cost
+    # a threadpool hop on every request, even when the token is cached
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        claims = get_token_claims(token)
+    except InvalidToken:
+        raise credentials_exception
+    # Refresh tokens are only good for /auth/refresh
+    if claims.get("uid") is None or claims.get("type", "access") != "access":
+        raise credentials_exception
+    request.state.user_id = claims["uid"]
+    return claims
+
+async def get_current_user_id(claims: Dict[str, Any] = Depends(get_current_claims)) -> int:
+    """Shared auth dependency: the authenticated user's id (JWT `uid` claim)."""
+    return claims["uid"]
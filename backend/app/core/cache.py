@@ -0,0 +1,122 @@
+import time
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.redis import get_redis, get_pubsub_redis
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache with per-entry TTL and LRU eviction.
+    Used for hot-path lookups that would otherwise hit the database on every request.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+            return default if item is _MISSING else item[0]
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """Removes every entry for which predicate(key, value) is true. Returns the count removed."""
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+# Cross-process invalidation
+# Each process keeps its own caches; writers call broadcast_invalidation() so every
+# API worker and background worker drops the stale entries, not just the local one.
+INVALIDATION_CHANNEL = "cache:invalidate"
+_invalidation_handlers: Dict[str, Callable[[dict], None]] = {}
+
+def register_invalidation_handler(name: str, handler: Callable[[dict], None]):
+    """
+    Registers the local invalidation for cache `name`. The handler receives the
+    broadcast message; a message with only {"cache": name} means "drop everything".
+    """
+    _invalidation_handlers[name] = handler
+
+def _apply_invalidation(message: dict):
+    handler = _invalidation_handlers.get(message.get("cache"))
+    if handler:
+        handler(message)
+
+async def broadcast_invalidation(name: str, **fields):
+    message = {"cache": name, **fields}
+    _apply_invalidation(message)
+    try:
+        await get_redis().publish(INVALIDATION_CHANNEL, json.dumps(message))
+    except RedisError as e:
+        logger.warning(f"Could not broadcast invalidation for '{name}': {str(e)}")
+
+async def listen_for_invalidations():
+    """Long-running task: applies invalidations published by other processes."""
+    while True:
+        pubsub = get_pubsub_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages may have been missed while (re)connecting: start clean.
+            for name in list(_invalidation_handlers):
+                _apply_invalidation({"cache": name})
+
+            async for message in pubsub.listen():
+                try:
+                    _apply_invalidation(json.loads(message["data"]))
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Ignoring malformed invalidation message: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener disconnected, retrying: {str(e)}")
+            await asyncio.sleep(5)
+        finally:
+            try:
+                await pubsub.close()
+            except Exception:
+                pass
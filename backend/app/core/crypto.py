@@ -1,117 +1,271 @@
 import os
 import base64
+import hashlib
 import logging
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
+from cryptography.fernet import Fernet, InvalidToken
 
 logger = logging.getLogger(__name__)
 
-# Load encryption key from environment
-ENCRYPTION_KEY_B64 = os.getenv("ENCRYPTION_KEY")
+# Versioned ciphertext: "v1:<key id>:<base64(nonce + tag + ciphertext)>" (AES-256-GCM).
+# The "v1:<key id>" header is authenticated as associated data.
+CIPHERTEXT_VERSION = "v1"
+NONCE_SIZE = 12
+TAG_SIZE = 16
 
-if not ENCRYPTION_KEY_B64:
-    logger.warning("ENCRYPTION_KEY not set. Using insecure fallback for development only!")
-    # Generate a random key for development (DO NOT USE IN PRODUCTION)
-    ENCRYPTION_KEY = get_random_bytes(32)
-else:
-    try:
-        ENCRYPTION_KEY = base64.b64decode(ENCRYPTION_KEY_B64)
-        if len(ENCRYPTION_KEY) != 32:
-            raise ValueError("ENCRYPTION_KEY must be 32 bytes (256 bits)")
-    except Exception as e:
-        logger.error(f"Failed to decode ENCRYPTION_KEY: {str(e)}")
-        raise ValueError("Invalid ENCRYPTION_KEY format. Must be 32 bytes encoded in base64.")
+# Legacy formats still accepted by decrypt_secret():
+# - unversioned base64(nonce + tag + ciphertext), AES-256-GCM (old encrypt_secret)
+# - Fernet tokens (old security.encrypt_value), which always start with "gAAAAA"
+FERNET_PREFIX = "gAAAAA"
+
+DECRYPT_CACHE_SIZE = int(os.getenv("DECRYPT_CACHE_SIZE", "1024"))
+
+
+def _decode_key(encoded: str) -> bytes:
+    """Accepts standard or URL-safe base64 (Fernet-style keys are the same 32 bytes)."""
+    encoded = encoded.strip()
+    key = base64.b64decode(encoded.replace("-", "+").replace("_", "/") + "=" * (-len(encoded) % 4))
+    if len(key) != 32:
+        raise ValueError("Encryption keys must be 32 bytes (256 bits)")
+    return key
+
+
+class Keyring:
+    """
+    Encryption keys by id. New secrets are encrypted with the primary key;
+    any key in the ring can decrypt, which is what makes rotation possible.
+    """
+
+    def __init__(self, keys: Dict[str, bytes], primary_id: str):
+        if primary_id not in keys:
+            raise ValueError(f"Primary key '{primary_id}' is not in the keyring")
+        self.keys = dict(keys)
+        self.primary_id = primary_id
+
+    @property
+    def primary_key(self) -> bytes:
+        return self.keys[self.primary_id]
+
+    @classmethod
+    def from_env(cls) -> "Keyring":
+        """
+        ENCRYPTION_KEYS="<id>:<base64 key>,<id>:<base64 key>,..." (first one is primary),
+        or the single legacy ENCRYPTION_KEY (key id "1").
+        """
+        keys_env = os.getenv("ENCRYPTION_KEYS")
+        legacy_env = os.getenv("ENCRYPTION_KEY")
+
+        try:
+            if keys_env:
+                keys = {}
+                primary_id = None
+                for entry in keys_env.split(","):
+                    key_id, _, encoded = entry.strip().partition(":")
+                    if not key_id or not encoded:
+                        raise ValueError("expected <id>:<base64 key>")
+                    keys[key_id] = _decode_key(encoded)
+                    primary_id = primary_id or key_id
+                return cls(keys, primary_id)
+            if legacy_env:
+                return cls({"1": _decode_key(legacy_env)}, "1")
+        except Exception as e:
+            logger.error(f"Failed to decode encryption keys: {str(e)}")
+            raise ValueError("Invalid ENCRYPTION_KEYS / ENCRYPTION_KEY format. Keys must be 32 bytes encoded in base64.")
+
+        logger.warning("ENCRYPTION_KEY not set. Using insecure fallback for development only!")
+        # Generate a random key for development (DO NOT USE IN PRODUCTION)
+        return cls({"dev": get_random_bytes(32)}, "dev")
+
+
+class SecretCache:
+    """
+    Bounded LRU of decrypted secrets, keyed by SHA-256 of the ciphertext.
+    Plaintexts are kept in bytearrays and overwritten with zeros when evicted
+    or cleared (best effort: str copies handed to callers are not covered).
+    """
+
+    def __init__(self, maxsize: int = DECRYPT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[bytes, bytearray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _zeroize(buffer: bytearray):
+        buffer[:] = bytes(len(buffer))
+
+    def get(self, digest: bytes) -> Optional[str]:
+        with self._lock:
+            buffer = self._data.get(digest)
+            if buffer is None:
+                return None
+            self._data.move_to_end(digest)
+            return buffer.decode("utf-8")
+
+    def set(self, digest: bytes, plain_text: str):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            old = self._data.pop(digest, None)
+            if old is not None:
+                self._zeroize(old)
+            self._data[digest] = bytearray(plain_text.encode("utf-8"))
+            while len(self._data) > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self._zeroize(evicted)
+
+    def clear(self):
+        with self._lock:
+            for buffer in self._data.values():
+                self._zeroize(buffer)
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+keyring = Keyring.from_env()
+_secret_cache = SecretCache()
+
+
+def set_keyring(new_keyring: Keyring):
+    """Swaps the active keyring (key rotation, tests) and drops cached plaintexts."""
+    global keyring
+    keyring = new_keyring
+    _secret_cache.clear()
+
+
+def _header(key_id: str) -> str:
+    return f"{CIPHERTEXT_VERSION}:{key_id}"
+
+
+def _aes_decrypt(key: bytes, payload: str, associated_data: Optional[bytes] = None) -> str:
+    combined = base64.b64decode(payload)
+    nonce = combined[:NONCE_SIZE]
+    tag = combined[NONCE_SIZE:NONCE_SIZE + TAG_SIZE]
+    ciphertext = combined[NONCE_SIZE + TAG_SIZE:]
+
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+    if associated_data:
+        cipher.update(associated_data)
+    # Raises ValueError if the tag doesn't match (wrong key or tampered data)
+    return cipher.decrypt_and_verify(ciphertext, tag).decode("utf-8")
 
 
 def encrypt_secret(plain_text: str) -> str:
     """
-    Encrypts a plaintext secret using AES-256-GCM.
-    
+    Encrypts a plaintext secret using AES-256-GCM with the primary key.
+
     Args:
         plain_text: The secret to encrypt
-        
+
     Returns:
-        Base64-encoded string in format: nonce:tag:ciphertext
-        
+        Versioned string in format: v1:<key id>:<base64(nonce + tag + ciphertext)>
+
     Raises:
         ValueError: If plain_text is empty or None
     """
     if not plain_text:
         raise ValueError("Cannot encrypt empty secret")
-    
+
     try:
         # Generate random nonce (12 bytes recommended for GCM)
-        nonce = get_random_bytes(12)
-        
-        # Create cipher
-        cipher = AES.new(ENCRYPTION_KEY, AES.MODE_GCM, nonce=nonce)
-        
-        # Encrypt and get authentication tag
+        nonce = get_random_bytes(NONCE_SIZE)
+        header = _header(keyring.primary_id)
+
+        cipher = AES.new(keyring.primary_key, AES.MODE_GCM, nonce=nonce)
+        cipher.update(header.encode("utf-8"))
         ciphertext, tag = cipher.encrypt_and_digest(plain_text.encode('utf-8'))
-        
-        # Combine nonce:tag:ciphertext and encode as base64
-        combined = nonce + tag + ciphertext
-        encrypted = base64.b64encode(combined).decode('utf-8')
-        
+
+        encrypted = f"{header}:{base64.b64encode(nonce + tag + ciphertext).decode('utf-8')}"
+
         logger.debug(f"Encrypted secret (length: {len(plain_text)} chars)")
         return encrypted
-        
+
     except Exception as e:
         logger.error(f"Encryption failed: {str(e)}", exc_info=True)
         raise ValueError(f"Failed to encrypt secret: {str(e)}")
 
 
+def _decrypt_uncached(cipher_text: str) -> str:
+    if cipher_text.startswith(CIPHERTEXT_VERSION + ":"):
+        _, key_id, payload = cipher_text.split(":", 2)
+        key = keyring.keys.get(key_id)
+        if key is None:
+            raise ValueError(f"Unknown encryption key id '{key_id}'")
+        return _aes_decrypt(key, payload, _header(key_id).encode("utf-8"))
+
+    # Legacy ciphertexts don't say which key made them: try each one
+    if cipher_text.startswith(FERNET_PREFIX):
+        for key in keyring.keys.values():
+            try:
+                return Fernet(base64.urlsafe_b64encode(key)).decrypt(cipher_text.encode()).decode("utf-8")
+            except InvalidToken:
+                continue
+    else:
+        for key in keyring.keys.values():
+            try:
+                return _aes_decrypt(key, cipher_text)
+            except ValueError:
+                continue
+    raise ValueError("no key in the keyring matches")
+
+
 def decrypt_secret(cipher_text: str) -> Optional[str]:
     """
-    Decrypts a secret encrypted with encrypt_secret().
-    
+    Decrypts a secret encrypted with encrypt_secret() (any key in the keyring),
+    including legacy unversioned AES-GCM and Fernet ciphertexts.
+    Results are cached in memory (bounded LRU), so hot paths decrypt each secret once.
+
     Args:
-        cipher_text: Base64-encoded encrypted secret
-        
+        cipher_text: Encrypted secret
+
     Returns:
-        Decrypted plaintext, or None if decryption fails
-        
+        Decrypted plaintext, or None if cipher_text is empty
+
     Raises:
-        ValueError: If cipher_text format is invalid
+        ValueError: If the secret can't be authenticated with any key (corrupted, tampered or unknown key)
     """
     if not cipher_text:
         return None
-    
+
+    digest = hashlib.sha256(cipher_text.encode("utf-8")).digest()
+    cached = _secret_cache.get(digest)
+    if cached is not None:
+        return cached
+
     try:
-        # Decode from base64
-        combined = base64.b64decode(cipher_text)
-        
-        # Extract components (nonce: 12 bytes, tag: 16 bytes, rest: ciphertext)
-        nonce = combined[:12]
-        tag = combined[12:28]
-        ciphertext = combined[28:]
-        
-        # Create cipher
-        cipher = AES.new(ENCRYPTION_KEY, AES.MODE_GCM, nonce=nonce)
-        
-        # Decrypt and verify authentication tag
-        plaintext = cipher.decrypt_and_verify(ciphertext, tag)
-        
-        decrypted = plaintext.decode('utf-8')
-        logger.debug(f"Decrypted secret (length: {len(decrypted)} chars)")
-        return decrypted
-        
-    except ValueError as e:
-        # Authentication failed - data was tampered with
+        decrypted = _decrypt_uncached(cipher_text)
+    except Exception as e:
+        # Authentication failed - data was tampered with or the key is gone
         logger.error(f"Decryption failed - authentication error: {str(e)}")
         raise ValueError("Secret authentication failed. Data may be corrupted or tampered.")
-    except Exception as e:
-        logger.error(f"Decryption failed: {str(e)}", exc_info=True)
-        raise ValueError(f"Failed to decrypt secret: {str(e)}")
+
+    _secret_cache.set(digest, decrypted)
+    logger.debug(f"Decrypted secret (length: {len(decrypted)} chars)")
+    return decrypted
+
+
+def needs_reencryption(cipher_text: str) -> bool:
+    """True unless cipher_text is already in the current format under the primary key."""
+    return not cipher_text.startswith(_header(keyring.primary_id) + ":")
+
+
+def reencrypt_secret(cipher_text: str) -> str:
+    """Re-encrypts any accepted ciphertext with the primary key (current format)."""
+    return encrypt_secret(decrypt_secret(cipher_text))
 
 
 def generate_encryption_key() -> str:
     """
     Generates a new 256-bit encryption key.
-    
+
     Returns:
-        Base64-encoded 32-byte key suitable for ENCRYPTION_KEY env var
+        Base64-encoded 32-byte key suitable for ENCRYPTION_KEY / ENCRYPTION_KEYS
     """
     key = get_random_bytes(32)
     return base64.b64encode(key).decode('utf-8')
@@ -0,0 +1,69 @@
+import os
+import asyncio
+import logging
+from typing import Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))  # per base URL
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+# In-flight requests per host. With HTTP/2 many requests share one connection,
+# so connection limits alone don't bound the load we put on an upstream.
+HTTP_PER_HOST_CONCURRENCY = int(os.getenv("HTTP_PER_HOST_CONCURRENCY", "20"))
+
+try:
+    import h2  # noqa: F401  (httpx[http2] extra)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+def _key(base_url: str) -> str:
+    return base_url.rstrip("/")
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """
+    Process-wide pooled client for `base_url` (keep-alive, HTTP/2 when available).
+    Do not close it: the app lifespan does that via close_http_clients().
+    """
+    key = _key(base_url)
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=key,
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _clients[key] = client
+    return client
+
+async def http_request(base_url: str, method: str, path: str, **kwargs) -> httpx.Response:
+    """Sends a request through the pooled client, capped at HTTP_PER_HOST_CONCURRENCY in flight."""
+    key = _key(base_url)
+    slot = _host_slots.get(key)
+    if slot is None:
+        slot = _host_slots[key] = asyncio.Semaphore(HTTP_PER_HOST_CONCURRENCY)
+    async with slot:
+        return await get_http_client(key).request(method, path, **kwargs)
+
+async def close_http_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    _host_slots.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client: {str(e)}")
@@ -0,0 +1,42 @@
+import threading
+from typing import Dict
+
+class Metrics:
+    """
+    Minimal in-process counters and timings, exposed by GET /metrics.
+    Values are per worker process and reset on restart.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}"
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Records one sample (e.g. a latency in ms): keeps count, sum and max."""
+        key = self._key(name, labels)
+        with self._lock:
+            stats = self._timings.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["sum"] += value
+            stats["max"] = max(stats["max"], value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {k: dict(v) for k, v in self._timings.items()},
+            }
+
+metrics = Metrics()
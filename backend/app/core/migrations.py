@@ -0,0 +1,161 @@
+import re
+import time
+import logging
+from sqlalchemy import text
+
+from app.core.normalization import normalize_email, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+def backfill_deal_contact_keys(conn):
+    """Fills email_normalized / phone_e164 for deals created before those columns existed."""
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(text("""
+            SELECT id, email, phone FROM crm_deals
+            WHERE id > :last_id
+              AND ((email IS NOT NULL AND email_normalized IS NULL)
+                OR (phone IS NOT NULL AND phone_e164 IS NULL))
+            ORDER BY id
+            LIMIT :batch
+        """), {"last_id": last_id, "batch": BACKFILL_BATCH_SIZE}).all()
+        if not rows:
+            break
+        conn.execute(
+            text("UPDATE crm_deals SET email_normalized = :email, phone_e164 = :phone WHERE id = :id"),
+            [{"id": r.id, "email": normalize_email(r.email), "phone": normalize_phone(r.phone)} for r in rows]
+        )
+        total += len(rows)
+        last_id = rows[-1].id
+    if total:
+        logger.info(f"Backfilled contact keys for {total} deals")
+
+# Idempotent DDL applied on startup, after Base.metadata.create_all().
+# create_all() only builds missing tables, so columns/indexes added to
+# existing models must also be listed here to reach databases created earlier.
+# Append only: entries run in order, each once per database (tracked by position
+# in crm_schema_migrations), and must still be safe to re-run.
+# An entry is either a SQL string or a callable taking the connection.
+# Indexes on crm_deals are built CONCURRENTLY (outside a transaction) so they
+# don't block writes while they build.
+MIGRATIONS = [
+    # Keyset pagination / filtered listing of deals
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_status_updated
+    ON crm_deals (user_id, status, updated_at)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_updated_id
+    ON crm_deals (user_id, updated_at, id)
+    """,
+    # Normalized contact keys for webhook deal matching
+    "ALTER TABLE crm_deals ADD COLUMN IF NOT EXISTS email_normalized VARCHAR",
+    "ALTER TABLE crm_deals ADD COLUMN IF NOT EXISTS phone_e164 VARCHAR",
+    backfill_deal_contact_keys,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_email_normalized
+    ON crm_deals (user_id, email_normalized)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_phone_e164
+    ON crm_deals (user_id, phone_e164)
+    """,
+    # Cached Chatwoot ids for reverse sync
+    "ALTER TABLE crm_deals ADD COLUMN IF NOT EXISTS chatwoot_contact_id INTEGER",
+    "ALTER TABLE crm_deals ADD COLUMN IF NOT EXISTS last_conversation_id INTEGER",
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_chatwoot_contact
+    ON crm_deals (user_id, chatwoot_contact_id)
+    """,
+    # Lead search (deal_service.search_deals): trigram GIN indexes, tenant-scoped via
+    # btree_gin. All three extensions are trusted, so the database owner can create them.
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+    # unaccent() is only STABLE (its dictionary can change), so it can't be indexed directly.
+    # Pinning the dictionary makes this wrapper safe to declare IMMUTABLE.
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    AS $func$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $func$
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_name_trgm
+    ON crm_deals USING gin (user_id, lower(f_unaccent(name)) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_email_trgm
+    ON crm_deals USING gin (user_id, email_normalized gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crm_deals_user_phone_trgm
+    ON crm_deals USING gin (user_id, phone_e164 gin_trgm_ops)
+    """,
+]
+
+# Serializes migrations across processes (every API worker runs them at startup)
+MIGRATION_LOCK_ID = 7_302_111
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+_CONCURRENT_INDEX_RE = re.compile(r"CREATE\s+INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+def _migration_name(migration) -> str:
+    return migration.__name__ if callable(migration) else migration.strip().splitlines()[0]
+
+def _build_index_concurrently(engine, sql: str, index_name: str):
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        # A build interrupted earlier leaves an INVALID index that IF NOT EXISTS would keep
+        invalid = conn.execute(text("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name AND NOT i.indisvalid
+        """), {"name": index_name}).first()
+        if invalid:
+            logger.warning(f"Rebuilding invalid index {index_name}")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+        conn.execute(text(sql))
+
+def run_migrations(engine, metadata=None):
+    """
+    Creates missing tables (`metadata`) and applies pending MIGRATIONS using the
+    given (sync) engine. A session advisory lock makes concurrent callers wait for
+    the first one; they then find nothing pending.
+    """
+    with engine.connect() as lock_conn:
+        lock_conn = lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Poll instead of blocking in pg_advisory_lock(): a waiting statement holds a
+        # snapshot, and CREATE INDEX CONCURRENTLY in the lock holder would wait on it forever
+        while not lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID}).scalar():
+            time.sleep(MIGRATION_LOCK_POLL_SECONDS)
+        try:
+            with engine.begin() as conn:
+                if metadata is not None:
+                    metadata.create_all(bind=conn)
+                conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS crm_schema_migrations "
+                    "(id INTEGER PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+                ))
+                applied = set(conn.execute(text("SELECT id FROM crm_schema_migrations")).scalars())
+
+            for position, migration in enumerate(MIGRATIONS):
+                if position in applied:
+                    continue
+                try:
+                    index = None if callable(migration) else _CONCURRENT_INDEX_RE.search(migration)
+                    if index:
+                        _build_index_concurrently(engine, migration, index.group(1))
+                    with engine.begin() as conn:
+                        if callable(migration):
+                            migration(conn)
+                        elif not index:
+                            conn.execute(text(migration))
+                        conn.execute(text("INSERT INTO crm_schema_migrations (id) VALUES (:id)"), {"id": position})
+                except Exception as e:
+                    logger.error(f"Migration failed: {_migration_name(migration)} -> {e}")
+                    raise
+                logger.info(f"Applied migration {position}: {_migration_name(migration)}")
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
@@ -0,0 +1,37 @@
+import re
+from typing import Optional
+
+DEFAULT_COUNTRY_CODE = "55"  # Brazil
+
+_NON_DIGITS = re.compile(r"\D")
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Canonical form used for matching: trimmed and lower-cased."""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email or None
+
+def normalize_phone(phone: Optional[str], country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    Best-effort E.164 normalization (e.g. "(11) 98765-4321" -> "+5511987654321").
+    Numbers without a country code are assumed to be Brazilian (DDD + number).
+    """
+    if not phone:
+        return None
+    raw = phone.strip()
+    digits = _NON_DIGITS.sub("", raw)
+    if not digits:
+        return None
+
+    if raw.startswith("+"):
+        return "+" + digits
+    if raw.startswith("00"):
+        # International dialing prefix
+        return "+" + digits[2:]
+
+    # National trunk prefix, e.g. "011 98765-4321"
+    digits = digits.lstrip("0")
+    if len(digits) in (10, 11):
+        return "+" + country_code + digits
+    return "+" + digits
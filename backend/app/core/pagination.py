@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+def encode_cursor(updated_at: datetime, id: int) -> str:
+    """
+    Encodes the (updated_at, id) position of the last row of a page into an opaque cursor.
+    """
+    raw = json.dumps({"u": updated_at.isoformat(), "i": id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    Decodes a cursor produced by encode_cursor().
+    Raises HTTP 400 if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(data["u"]), int(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_rank_cursor(rank: float, id: int) -> str:
+    """Cursor for results ordered by (rank DESC, id DESC), e.g. search."""
+    raw = json.dumps({"r": rank, "i": id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """
+    Decodes a cursor produced by encode_rank_cursor().
+    Raises HTTP 400 if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(data["r"]), int(data["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,52 @@
+import os
+import logging
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://tork-redis:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+
+_client: Optional[aioredis.Redis] = None
+_pubsub_client: Optional[aioredis.Redis] = None
+
+def init_redis() -> aioredis.Redis:
+    """Creates the process-wide async Redis client (one shared connection pool)."""
+    global _client
+    if _client is None:
+        pool = aioredis.ConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            decode_responses=True,
+        )
+        _client = aioredis.Redis(connection_pool=pool)
+    return _client
+
+def get_redis() -> aioredis.Redis:
+    """Returns the shared client, creating it on first use (e.g. in workers and scripts)."""
+    return _client or init_redis()
+
+def get_pubsub_redis() -> aioredis.Redis:
+    """
+    Separate client for long-lived SUBSCRIBE connections: no socket timeout
+    (they sit idle between messages) and no competition with the command pool.
+    """
+    global _pubsub_client
+    if _pubsub_client is None:
+        _pubsub_client = aioredis.Redis.from_url(REDIS_URL, decode_responses=True, health_check_interval=30)
+    return _pubsub_client
+
+async def close_redis():
+    global _client, _pubsub_client
+    if _client is not None:
+        await _client.close()
+        await _client.connection_pool.disconnect()
+        _client = None
+    if _pubsub_client is not None:
+        await _pubsub_client.close()
+        _pubsub_client = None
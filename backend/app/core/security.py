@@ -3,10 +3,12 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
+import uuid
 
 SECRET_KEY = os.getenv("SECRET_KEY", "super_secret_key_change_me_in_prod")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 hours
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -21,20 +23,29 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-from cryptography.fernet import Fernet
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """
+    Long-lived token only accepted by /auth/refresh (type "refresh"), never as a bearer token.
+    Each one gets a unique jti, so rotated tokens are always distinct.
+    """
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+from app.core.crypto import encrypt_secret, decrypt_secret
 
-# Simple encryption for API Keys using a fixed key (In prod, use env var)
-# This key must be 32 url-safe base64-encoded bytes.
-current_key = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode()) 
-cipher_suite = Fernet(current_key.encode())
+# API keys/tokens stored in UserSettings. Same keyring and format as app.core.crypto;
+# values written by the old Fernet implementation still decrypt.
 
 def encrypt_value(value: str) -> str:
     if not value: return None
-    return cipher_suite.encrypt(value.encode()).decode()
+    return encrypt_secret(value)
 
 def decrypt_value(value: str) -> str:
+    """Like decrypt_secret(), but returns None instead of raising on bad ciphertext."""
     if not value: return None
     try:
-        return cipher_suite.decrypt(value.encode()).decode()
-    except:
+        return decrypt_secret(value)
+    except ValueError:
         return None
@@ -1,7 +1,29 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Tork CRM API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_redis()
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    get_sync_queue().start()
+    get_extraction_queue().start()
+    yield
+    # Shutdown: flush pending syncs, stop background tasks, then release pooled connections
+    await get_sync_queue().stop()
+    await get_extraction_queue().stop()
+    invalidation_listener.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await invalidation_listener
+    await close_http_clients()
+    await close_ai_clients()
+    await close_redis()
+    await async_engine.dispose()
+    engine.dispose()
+
+app = FastAPI(title="Tork CRM API", version="0.1.0", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -17,19 +39,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Disposition"],
 )
 
-from app.core.database import engine, Base
-from app.routers import auth, settings, deals, webhooks, stages
+from app.core.database import engine, async_engine, Base
+from app.core.migrations import run_migrations
+from app.core.redis import init_redis, close_redis
+from app.core.cache import listen_for_invalidations
+from app.core.http import close_http_clients
+from app.services.ai_service import close_ai_clients
+from app.services.sync_queue import get_sync_queue
+from app.services.extraction_jobs import get_extraction_queue
+from app.core.metrics import metrics
+from app.routers import auth, settings, deals, webhooks, stages, board, analytics
 
 
-# Create Tables (Simple Migration)
-Base.metadata.create_all(bind=engine)
+# Create Tables (Simple Migration), serialized across workers
+run_migrations(engine, Base.metadata)
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(settings.router, prefix="/crm/settings", tags=["Settings"])
 app.include_router(stages.router, prefix="/crm/stages", tags=["Stages"])
 app.include_router(deals.router, prefix="/crm/leads", tags=["Deals"])
+app.include_router(board.router, prefix="/crm/board", tags=["Board"])
+app.include_router(analytics.router, prefix="/crm/analytics", tags=["Analytics"])
 app.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
 
 @app.get("/")
@@ -39,3 +72,7 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Float, Date, DateTime, Index
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class DealStageEvent(Base):
+    """
+    Append-only log of deal status changes (one row per move between stages).
+    Source of truth for the crm_pipeline_daily rollup.
+    """
+    __tablename__ = "crm_deal_stage_events"
+    __table_args__ = (
+        # Time spent in the current stage: latest event per deal
+        Index("ix_crm_deal_stage_events_deal_occurred", "deal_id", "occurred_at"),
+        Index("ix_crm_deal_stage_events_user_occurred", "user_id", "occurred_at"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    deal_id = Column(Integer, nullable=False)  # no FK: events outlive deleted deals
+    from_status = Column(String, nullable=True)
+    to_status = Column(String, nullable=False)
+    value = Column(Float, nullable=True)  # deal value at the time of the move
+    seconds_in_stage = Column(Float, nullable=True)  # time spent in from_status
+    occurred_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class PipelineDailyStat(Base):
+    """
+    Moves between stages per tenant and day, updated in the same transaction as
+    the DealStageEvent rows. Dashboards read O(days x transitions) rows from here.
+    """
+    __tablename__ = "crm_pipeline_daily"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)  # in ANALYTICS_TIMEZONE
+    from_status = Column(String, primary_key=True)  # "" when the deal had no status
+    to_status = Column(String, primary_key=True)
+
+    moves = Column(Integer, nullable=False, default=0)
+    moved_value = Column(Float, nullable=False, default=0.0)
+    seconds_in_stage = Column(Float, nullable=False, default=0.0)  # sum over moves with a known duration
+    # Moves per time-in-stage bucket (analytics_service.TIME_IN_STAGE_BUCKETS), for medians
+    seconds_histogram = Column(ARRAY(Integer), nullable=False)
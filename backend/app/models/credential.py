@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.core.database import Base, TimestampMixin
+
+class LoginCredential(Base, TimestampMixin):
+    """
+    Local copy of a Chatwoot login, refreshed on every successful upstream sign-in.
+    Lets /auth/login verify credentials without calling Chatwoot each time.
+    """
+    __tablename__ = "crm_login_credentials"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, unique=True, index=True, nullable=False)  # normalized (lowercase)
+    password_hash = Column(String, nullable=False)  # bcrypt (pwd_context)
+    chatwoot_user_id = Column(Integer, index=True, nullable=False)
+    name = Column(String, nullable=True)
+    verified_at = Column(DateTime(timezone=True), nullable=False)  # last successful Chatwoot sign-in
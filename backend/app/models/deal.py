@@ -1,6 +1,8 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, Enum
+from sqlalchemy import Column, Integer, String, Float, Enum, Index
+from sqlalchemy.orm import validates
 from app.core.database import Base, TimestampMixin
+from app.core.normalization import normalize_email, normalize_phone
 
 class DealStatus(str, enum.Enum):
     NEW = "new"
@@ -16,6 +18,18 @@ class DealPriority(str, enum.Enum):
 
 class Deal(Base, TimestampMixin):
     __tablename__ = "crm_deals"
+    __table_args__ = (
+        # Filtered board/list queries: WHERE user_id = ? AND status = ? ORDER BY updated_at
+        Index("ix_crm_deals_user_status_updated", "user_id", "status", "updated_at"),
+        # Unfiltered keyset pagination: ORDER BY updated_at DESC, id DESC
+        Index("ix_crm_deals_user_updated_id", "user_id", "updated_at", "id"),
+        # Contact matching for Chatwoot webhooks (per tenant)
+        Index("ix_crm_deals_user_email_normalized", "user_id", "email_normalized"),
+        Index("ix_crm_deals_user_phone_e164", "user_id", "phone_e164"),
+        Index("ix_crm_deals_user_chatwoot_contact", "user_id", "chatwoot_contact_id"),
+        # Search trigram indexes (ix_crm_deals_user_*_trgm) need extensions and
+        # f_unaccent(), so they are created in app.core.migrations only.
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True, nullable=False)
@@ -23,7 +37,25 @@ class Deal(Base, TimestampMixin):
     name = Column(String, index=True, nullable=False)
     email = Column(String, nullable=True)
     phone = Column(String, nullable=True)
+
+    # Matching keys, kept in sync with email/phone by the validators below
+    email_normalized = Column(String, nullable=True)
+    phone_e164 = Column(String, nullable=True)
+
+    # Chatwoot ids learned from webhooks/sync (saves search round-trips on reverse sync)
+    chatwoot_contact_id = Column(Integer, nullable=True)
+    last_conversation_id = Column(Integer, nullable=True)
     
     status = Column(String, default="new")  # Dynamic status using Stage slugs
     value = Column(Float, default=0.0)
     priority = Column(Enum(DealPriority), default=DealPriority.MEDIUM)
+
+    @validates("email")
+    def _sync_email_normalized(self, key, value):
+        self.email_normalized = normalize_email(value)
+        return value
+
+    @validates("phone")
+    def _sync_phone_e164(self, key, value):
+        self.phone_e164 = normalize_phone(value)
+        return value
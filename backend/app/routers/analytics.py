@@ -0,0 +1,36 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_async_db
+from app.core.auth import get_current_user_id
+from app.schemas.analytics import PipelineAnalytics
+from app.services.analytics_service import ANALYTICS_TIMEZONE, get_pipeline_analytics
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 366
+
+@router.get("/", response_model=PipelineAnalytics)
+@router.get("", response_model=PipelineAnalytics, include_in_schema=False)
+async def read_pipeline_analytics(
+    start: Optional[date] = Query(None, description="First day (inclusive). Default: 30 days before `end`"),
+    end: Optional[date] = Query(None, description="Last day (inclusive). Default: today"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Stage movement, time in stage, conversion and value over time for the period,
+    read from the daily rollup (cost grows with the number of days, not of deals).
+    Only moves recorded since the stage-change log was introduced are counted.
+    """
+    end = end or datetime.now(ANALYTICS_TIMEZONE).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="`start` must not be after `end`")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RANGE_DAYS} days per request")
+
+    return await get_pipeline_analytics(db, user_id, start, end)
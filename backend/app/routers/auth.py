@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-import httpx
-from app.core.security import create_access_token
-import os
+from app.core.auth import InvalidToken, decode_token
+from app.core.security import create_access_token, create_refresh_token
+from app.services.login_service import (
+    AuthUnavailable, InvalidCredentials, authenticate, get_credential, user_from_credential
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -10,63 +15,66 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
     user: dict
 
-CHATWOOT_URL = os.getenv("CHATWOOT_API_URL", "http://bot-chatwoot-rails-1:3000")
+def _issue_tokens(user: dict) -> dict:
+    claims = {"sub": user["email"], "uid": user["id"], "role": "admin"}
+    # Assuming admin for now, ideally check chatwoot role
+    return {
+        "access_token": create_access_token(data=claims),
+        "refresh_token": create_refresh_token(data=claims),
+        "token_type": "bearer",
+        "user": user,
+    }
 
 @router.post("/login", response_model=Token)
 async def login(request: LoginRequest):
-    # Determine URL to call
-    # If running in Docker link, use container name. If testing locally, might need localhost 
-    # But usually backend is in docker too.
-    
-    # Use Chatwoot's API to sign in
-    sign_in_url = f"{CHATWOOT_URL}/auth/sign_in"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            # Chatwoot expects just email and password in form data or json? 
-            # Devise Token Auth usually: { "email": "...", "password": "..." }
-            response = await client.post(sign_in_url, json={
-                "email": request.email, 
-                "password": request.password
-            })
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid credentials (Chatwoot Auth Failed)"
-                )
-            
-            # Extract user info
-            cw_data = response.json()
-            user_data = cw_data.get("data", {})
-            user_id = user_data.get("id")
-            
-            # Create our own JWT
-            access_token = create_access_token(
-                data={"sub": request.email, "uid": user_id, "role": "admin"} 
-                # Assuming admin for now, ideally check chatwoot role
-            )
-            
-            return {
-                "access_token": access_token, 
-                "token_type": "bearer",
-                "user": {
-                    "email": request.email,
-                    "id": user_id,
-                    "name": user_data.get("name")
-                }
-            }
-            
-        except httpx.RequestError as exc:
-            print(f"Connection error to Chatwoot: {exc}")
-            # Fallback for dev if chatwoot is not reachable?
-            # NO, user said "Validar contra Chatwoot".
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Could not connect to Auth Provider: {exc}"
-            )
+    # Validated against Chatwoot (Devise Token Auth), with a local credential cache
+    # so repeated logins don't depend on Chatwoot's latency or availability
+    try:
+        user = await authenticate(request.email, request.password)
+    except InvalidCredentials:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials (Chatwoot Auth Failed)"
+        )
+    except AuthUnavailable as exc:
+        logger.error(f"Connection error to Chatwoot: {exc}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not connect to Auth Provider: {exc}"
+        )
+
+    return _issue_tokens(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """
+    Exchanges a refresh token for a new access token (and a rotated refresh token)
+    without going to Chatwoot. Fails once the local credential was dropped,
+    e.g. after Chatwoot rejected the user's password.
+    """
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        claims = decode_token(request.refresh_token)
+    except InvalidToken:
+        raise invalid
+    if claims.get("type") != "refresh" or not claims.get("sub"):
+        raise invalid
+
+    credential = await get_credential(claims["sub"])
+    if credential is None or credential.chatwoot_user_id != claims.get("uid"):
+        raise invalid
+
+    return _issue_tokens(user_from_credential(credential))
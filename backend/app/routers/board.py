@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import List
+
+from app.core.database import get_async_db
+from app.models.deal import Deal
+from app.models.stage import Stage
+from app.schemas.board import BoardColumn, BoardStage
+from app.schemas.deal import DealResponse
+from app.core.auth import get_current_user_id
+
+router = APIRouter()
+
+@router.get("/", response_model=List[BoardColumn])
+@router.get("", response_model=List[BoardColumn], include_in_schema=False)
+async def read_board(
+    cards_per_stage: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Kanban board in one round-trip: every stage (in Stage.order) with its deal count,
+    total value and the most recently updated `cards_per_stage` deals.
+    Counts and sums cover the whole stage, not only the returned cards.
+    """
+    ranked = (
+        select(
+            Deal,
+            func.row_number().over(
+                partition_by=Deal.status,
+                order_by=(Deal.updated_at.desc(), Deal.id.desc())
+            ).label("rank"),
+            func.count().over(partition_by=Deal.status).label("stage_count"),
+            func.coalesce(func.sum(Deal.value).over(partition_by=Deal.status), 0).label("stage_value"),
+        )
+        # SECURITY: Filter by user_id
+        .where(Deal.user_id == user_id)
+        .subquery()
+    )
+    ranked_deal = aliased(Deal, ranked)
+
+    query = (
+        select(Stage, ranked_deal, ranked.c.stage_count, ranked.c.stage_value)
+        .outerjoin(ranked, and_(ranked.c.status == Stage.slug, ranked.c.rank <= cards_per_stage))
+        .order_by(Stage.order, Stage.id, ranked.c.rank)
+    )
+    result = await db.execute(query)
+
+    columns = {}
+    for stage, deal, stage_count, stage_value in result.all():
+        column = columns.get(stage.id)
+        if column is None:
+            column = columns[stage.id] = BoardColumn(
+                stage=BoardStage.model_validate(stage),
+                count=stage_count or 0,
+                total_value=stage_value or 0.0,
+            )
+        if deal is not None:
+            column.deals.append(DealResponse.model_validate(deal))
+
+    return list(columns.values())
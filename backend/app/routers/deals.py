@@ -1,249 +1,383 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks
-import httpx
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
 import os
+import json
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy import select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.pagination import encode_cursor, decode_cursor, encode_rank_cursor, decode_rank_cursor
 from app.models.deal import Deal, DealStatus
 from app.models.settings import UserSettings
-from app.schemas.deal import DealCreate, DealUpdate, DealResponse
-from app.core.security import ALGORITHM, SECRET_KEY, decrypt_value
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from app.schemas.deal import (
+    DealCreate, DealUpdate, DealResponse, DealPriority,
+    DealBulkUpdate, DealBulkDelete, DealBulkDeleteResponse,
+)
+from app.core.auth import get_current_user_id
+from app.core.security import decrypt_value
 
-from app.services.pdf_service import extract_text_from_pdf
-from app.services.ai_service import extract_lead_info
-
-from app.services.ai_service import extract_lead_info
+from app.services.extraction_jobs import JobStoreUnavailable, QueueFullError, get_extraction_queue
+from app.services.batch_extraction import (
+    EXTRACT_BATCH_MAX_FILE_BYTES, EXTRACT_BATCH_MAX_FILES, EXTRACT_BATCH_MAX_TOTAL_BYTES, BatchError,
+    extract_batch, is_pdf, is_zip, pdfs_from_zip,
+)
+from app.services.sync_queue import get_sync_queue
+from app.services.deal_service import bulk_create_deals, bulk_update_deals, bulk_delete_deals, search_deals
+from app.services.import_service import ImportFormatError, detect_format, import_deals
+from app.services.export_service import EXPORT_FORMATS, export_deals
+from app.services.analytics_service import StageChange, record_stage_changes
 
 logger = logging.getLogger(__name__)
-CHATWOOT_API_URL = os.getenv("CHATWOOT_API_URL", "http://bot-chatwoot-rails-1:3000")
-# Token should ideally come from UserSettings, but for now we might use env or settings
-# For this implementation, we will try to fetch it from UserSettings if available, or rely on a system token
 
 router = APIRouter()
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-
-def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("uid")
-        if user_id is None:
-            raise credentials_exception
-        return user_id
-    except JWTError:
-        raise credentials_exception
+BULK_MAX_ITEMS = int(os.getenv("DEALS_BULK_MAX_ITEMS", "1000"))
 
 @router.get("/", response_model=List[DealResponse])
 @router.get("", response_model=List[DealResponse], include_in_schema=False)
-def read_deals(
-    skip: int = 0, 
-    limit: int = 100, 
-    db: Session = Depends(get_db), 
+async def read_deals(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    priority: Optional[List[DealPriority]] = Query(None),
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    name_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(get_current_user_id)
 ):
+    """
+    Lists deals newest-first using keyset pagination on (updated_at, id).
+    Pass the `X-Next-Cursor` response header back as `cursor` to get the next page;
+    the header is absent on the last page.
+    """
     # SECURITY: Filter by user_id
-    leads = db.query(Deal).filter(Deal.user_id == user_id).offset(skip).limit(limit).all()
+    query = select(Deal).where(Deal.user_id == user_id)
+
+    if status_filter:
+        query = query.where(Deal.status.in_(status_filter))
+    if priority:
+        query = query.where(Deal.priority.in_(priority))
+    if min_value is not None:
+        query = query.where(Deal.value >= min_value)
+    if max_value is not None:
+        query = query.where(Deal.value <= max_value)
+    if name_prefix:
+        escaped = name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Deal.name.ilike(f"{escaped}%", escape="\\"))
+
+    position = decode_cursor(cursor)
+    if position:
+        last_updated_at, last_id = position
+        query = query.where(or_(
+            Deal.updated_at < last_updated_at,
+            and_(Deal.updated_at == last_updated_at, Deal.id < last_id)
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    query = query.order_by(Deal.updated_at.desc(), Deal.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    leads = result.scalars().all()
+
+    if len(leads) > limit:
+        leads = leads[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(leads[-1].updated_at, leads[-1].id)
+
     return leads
 
+@router.get("/search", response_model=List[DealResponse])
+async def search_leads(
+    response: Response,
+    q: str = Query(..., min_length=3, max_length=100),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Searches the user's deals by name (accent-insensitive, typo-tolerant), email or phone,
+    best matches first. Paginate with the `X-Next-Cursor` header, as in the list endpoint.
+    """
+    results = await search_deals(
+        db, user_id, q, limit + 1, after=decode_rank_cursor(cursor), status_filter=status_filter
+    )
+    if len(results) > limit:
+        results = results[:limit]
+        last_deal, last_rank = results[-1]
+        response.headers["X-Next-Cursor"] = encode_rank_cursor(last_rank, last_deal.id)
+
+    return [deal for deal, _ in results]
+
 @router.post("/", response_model=DealResponse)
 @router.post("", response_model=DealResponse, include_in_schema=False)
-def create_deal(
+async def create_deal(
     deal: DealCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user_id: int = Depends(get_current_user_id)
 ):
     # Create deal linked to current user
     db_deal = Deal(**deal.dict(), user_id=user_id)
     db.add(db_deal)
-    db.commit()
-    db.refresh(db_deal)
+    await db.commit()
+    await db.refresh(db_deal)
     return db_deal
 
+def _check_bulk_size(count: int):
+    if count > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_ITEMS} items per bulk request"
+        )
+
+# NOTE: /bulk routes must be declared before /{deal_id}
+
+@router.post("/bulk", response_model=List[DealResponse])
+async def bulk_create(
+    deals: List[DealCreate],
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Creates all deals in one INSERT (all or nothing)."""
+    _check_bulk_size(len(deals))
+    created = await bulk_create_deals(db, user_id, deals)
+    await db.commit()
+    return created
+
+@router.patch("/bulk", response_model=List[DealResponse])
+async def bulk_update(
+    updates: List[DealBulkUpdate],
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Partially updates many deals in one UPDATE (all or nothing).
+    Omitted or null fields are left unchanged; when an id repeats, later items win.
+    Returns only the deals that were updated (unknown ids and other tenants' deals are skipped).
+    """
+    _check_bulk_size(len(updates))
+    merged = {}
+    for item in updates:
+        changes = item.dict(exclude_unset=True, exclude={"id"})
+        if item.id in merged:
+            changes = {**merged[item.id].dict(exclude_unset=True), **changes}
+        merged[item.id] = DealUpdate(**changes)
+
+    updated = await bulk_update_deals(db, user_id, merged)
+    await db.commit()
+
+    # TRIGGER REVERSE SYNC for every moved deal (one batch on the debounced queue)
+    moved = {deal_id for deal_id, changes in merged.items() if changes.status}
+    get_sync_queue().enqueue_many(deal.id for deal in updated if deal.id in moved)
+
+    return updated
+
+@router.delete("/bulk", response_model=DealBulkDeleteResponse)
+async def bulk_delete(
+    request: DealBulkDelete,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Deletes many deals in one statement. Returns the ids that were actually deleted."""
+    _check_bulk_size(len(request.ids))
+    deleted = await bulk_delete_deals(db, user_id, request.ids)
+    await db.commit()
+    return {"deleted": deleted}
+
+@router.post("/import")
+async def import_leads(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format"),
+    filename: Optional[str] = None,
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Imports deals from a CSV (header row, ',' or ';') or NDJSON file sent as the raw
+    request body (e.g. `fetch(url, {method: "POST", body: file})`).
+    The body is consumed as it arrives; the response is an NDJSON stream of
+    progress/error events ending with a `done` (or `failed`) summary.
+    """
+    try:
+        import_format = detect_format(fmt, request.headers.get("content-type"), filename)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+
+    async def events():
+        async for event in import_deals(user_id, import_format, request.stream()):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@router.get("/export")
+async def export_leads(
+    fmt: str = Query("csv", alias="format"),
+    gzip: bool = False,
+    status_filter: Optional[List[str]] = Query(None, alias="status"),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Streams all of the tenant's deals as CSV or NDJSON (constant memory).
+    `gzip=true` compresses on the fly and serves a .gz attachment.
+    """
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"deals.{fmt}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        export_deals(user_id, fmt, compress=gzip, status_filter=status_filter),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @router.patch("/{deal_id}", response_model=DealResponse)
-def update_deal_status(
+async def update_deal_status(
     deal_id: int, 
     deal_update: DealUpdate, 
-    db: Session = Depends(get_db), 
-    user_id: int = Depends(get_current_user_id),
-    background_tasks: BackgroundTasks = BackgroundTasks()
+    db: AsyncSession = Depends(get_async_db), 
+    user_id: int = Depends(get_current_user_id)
 ):
     # SECURITY: Ensure deal belongs to user
-    db_deal = db.query(Deal).filter(Deal.id == deal_id, Deal.user_id == user_id).first()
+    # FOR UPDATE: concurrent moves of the same deal serialize, so each one sees the
+    # status the previous one left and stage events chain correctly
+    result = await db.execute(
+        select(Deal).where(Deal.id == deal_id, Deal.user_id == user_id).with_for_update()
+    )
+    db_deal = result.scalars().first()
     if not db_deal:
         raise HTTPException(status_code=404, detail="Deal not found or access denied")
     
     update_data = deal_update.dict(exclude_unset=True)
+    previous_status = db_deal.status
     for key, value in update_data.items():
         setattr(db_deal, key, value)
+
+    if deal_update.status and deal_update.status != previous_status:
+        await record_stage_changes(db, user_id, [StageChange(
+            db_deal.id, previous_status, db_deal.status, db_deal.value, db_deal.created_at
+        )])
     
-    db.commit()
-    db.refresh(db_deal)
-    db.commit()
-    db.refresh(db_deal)
-    db.commit()
-    db.refresh(db_deal)
+    await db.commit()
+    await db.refresh(db_deal)
     
-    # TRIGGER REVERSE SYNC
+    # TRIGGER REVERSE SYNC (debounced per deal, see sync_queue)
     if deal_update.status:
-         background_tasks.add_task(sync_status_to_chatwoot, db_deal, db)
+        get_sync_queue().enqueue(db_deal.id)
 
     return db_deal
 
-async def sync_status_to_chatwoot(deal: Deal, db: Session):
-    """
-    Reverse Sync: Updates Chatwoot contact/conversation label when CRM status changes.
-    """
-    try:
-        # 1. Get User Chatwoot Config
-        settings = db.query(UserSettings).filter(UserSettings.user_id == deal.user_id).first()
-        if not settings or not settings.chatwoot_user_token or not settings.chatwoot_account_id:
-            logger.warning("Chatwoot settings not configured for user. Skipping sync.")
-            return
-
-        chatwoot_url = settings.chatwoot_url or CHATWOOT_API_URL
-        account_id = settings.chatwoot_account_id
-        token = decrypt_value(settings.chatwoot_user_token) # Assuming we need to decrypt
-
-        if not token:
-             logger.warning("Could not decrypt Chatwoot token.")
-             return
-
-        # 2. Find Contact in Chatwoot (by email) -> This requires Chatwoot API search
-        # Simplifying: We assume we might have a `chatwoot_id` on Deal model later, 
-        # but for now let's search by email.
-        
-        headers = {"api_access_token": token, "Content-Type": "application/json"}
-        
-        async with httpx.AsyncClient() as client:
-            # Search Contact
-            search_res = await client.get(
-                f"{chatwoot_url}/api/v1/accounts/{account_id}/contacts/search",
-                params={"q": deal.email},
-                headers=headers
-            )
-            
-            if search_res.status_code != 200:
-                logger.error(f"Failed to search chatwoot contact: {search_res.text}")
-                return
-
-            data = search_res.json()
-            contacts = data.get("payload", [])
-            
-            if not contacts:
-                logger.info("Contact not found in Chatwoot.")
-                return
-                
-            contact_id = contacts[0]["id"]
-            
-            # 3. Update Contact Label (or Custom Attribute)
-            # Chatwoot labels are usually on Conversations.
-            # LOGIC: Read-Modify-Write for Conversation Labels
-            
-            # 3.1 Find Open Conversation for Contact
-            conv_res = await client.get(
-                f"{chatwoot_url}/api/v1/accounts/{account_id}/conversations",
-                params={"status": "open", "contact_id": int(contact_id)},
-                headers=headers
-            )
-            
-            if conv_res.status_code == 200:
-                conv_data = conv_res.json()
-                conversations = conv_data.get("data", {}).get("payload", [])
-                
-                if conversations:
-                    # Pick the most recent open conversation
-                    conversation = conversations[0]
-                    conversation_id = conversation["id"]
-                    current_labels = conversation.get("labels", [])
-                    
-                    # MERGE LABELS
-                    new_label = deal.status
-                    if new_label not in current_labels:
-                        updated_labels = current_labels + [new_label]
-                        
-                        # POST LABELS (Read-Modify-Write complete)
-                        label_res = await client.post(
-                            f"{chatwoot_url}/api/v1/accounts/{account_id}/conversations/{conversation_id}/labels",
-                            json={"labels": updated_labels},
-                            headers=headers
-                        )
-                        
-                        if label_res.status_code == 200:
-                            logger.info(f"Updated labels for Conversation {conversation_id}: {updated_labels}")
-                        else:
-                            logger.error(f"Failed to update labels: {label_res.text}")
-            
-            # 3.2 Update contact custom attribute 'status' (Legacy/Backup)
-            update_payload = {
-                "custom_attributes": {
-                    "crm_status": deal.status,
-                    "crm_deal_value": str(deal.value)
-                }
-            }
-            
-            update_res = await client.put(
-                f"{chatwoot_url}/api/v1/accounts/{account_id}/contacts/{contact_id}",
-                json=update_payload,
-                headers=headers
-            )
-            
-            if update_res.status_code == 200:
-                logger.info(f"Successfully synced Deal {deal.id} to Chatwoot Contact {contact_id}")
-            else:
-                 logger.error(f"Failed to update chatwoot contact: {update_res.text}")
-
-    except Exception as e:
-        logger.error(f"Reverse Sync Error: {e}")
-
-@router.post("/extract")
-@router.post("/extract/", include_in_schema=False)
-def extract_deal_from_pdf(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    user_id: int = Depends(get_current_user_id)
-):
-    # 1. Fetch User Settings (API Key)
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
-    if not settings or not settings.api_key:
+async def _load_ai_settings(db: AsyncSession, user_id: int):
+    """(provider, decrypted api key, model) for the user, or 400/500 if not configured."""
+    result = await db.execute(select(UserSettings).where(UserSettings.user_id == user_id))
+    settings = result.scalars().first()
+    if not settings or not settings.ai_api_key:
         raise HTTPException(
             status_code=400, 
             detail="Configuração de IA não encontrada. Vá em Configurações e adicione uma chave de API."
         )
 
-    # 2. Decrypt Key
-    decrypted_key = decrypt_value(settings.api_key)
+    decrypted_key = decrypt_value(settings.ai_api_key)
     if not decrypted_key:
         raise HTTPException(status_code=500, detail="Falha ao descriptografar chave de API.")
+    return settings.ai_provider, decrypted_key, settings.ai_model
+
+@router.post("/extract", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/extract/", status_code=status.HTTP_202_ACCEPTED, include_in_schema=False)
+async def extract_deal_from_pdf(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Queues a PDF for lead extraction and returns {"job_id", "status"} immediately.
+    Poll GET /extract/{job_id} for the result.
+    """
+    provider, api_key, model = await _load_ai_settings(db, user_id)
 
-    # 3. Read PDF
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Arquivo deve ser um PDF.")
-    
-    try:
-        file_bytes = file.file.read()
-        text = extract_text_from_pdf(file_bytes)
-    except ValueError as e:
-        raise HTTPException(status_code=422, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Erro ao ler arquivo PDF.")
-
-    # 4. Call AI
+    file_bytes = await file.read()
+
     try:
-        extracted_data = extract_lead_info(
-            text=text,
-            provider=settings.provider,
-            api_key=decrypted_key,
-            model=settings.model
+        job_id = await get_extraction_queue().submit(
+            user_id, file_bytes,
+            provider=provider,
+            api_key=api_key,
+            model=model
         )
-        return extracted_data
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Muitas extrações em andamento. Tente novamente em instantes.")
+    except JobStoreUnavailable:
+        raise HTTPException(status_code=503, detail="Serviço de extração indisponível. Tente novamente em instantes.")
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/extract/{job_id}")
+async def get_extraction_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=30),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Extraction job status: queued | running | done (with `result`) | failed (with `error`).
+    `wait` long-polls up to that many seconds for the job to finish.
+    """
+    queue = get_extraction_queue()
+    job = await queue.wait(job_id, user_id, wait) if wait else await queue.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/extract/batch")
+async def extract_deals_from_pdfs(
+    files: List[UploadFile] = File(...),
+    create_deals: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Extracts many PDFs at once (any mix of PDFs and ZIPs of PDFs).
+    Streams NDJSON events as each file finishes; see batch_extraction.extract_batch.
+    With `create_deals=true` the extracted leads are created in one bulk insert.
+    """
+    provider, api_key, model = await _load_ai_settings(db, user_id)
+
+    pdfs = []
+    total_bytes = 0
+    try:
+        for upload in files:
+            filename = upload.filename or "arquivo"
+            content_type = upload.content_type or ""
+            data = await upload.read()
+            if is_zip(filename, content_type):
+                extracted = pdfs_from_zip(data, max_total_bytes=EXTRACT_BATCH_MAX_TOTAL_BYTES - total_bytes)
+                pdfs.extend(extracted)
+                total_bytes += sum(len(pdf) for _, pdf in extracted)
+            elif is_pdf(filename, content_type):
+                if len(data) > EXTRACT_BATCH_MAX_FILE_BYTES:
+                    raise BatchError(f"{filename}: arquivo muito grande.")
+                pdfs.append((filename, data))
+                total_bytes += len(data)
+            else:
+                raise BatchError(f"{filename}: envie PDFs ou arquivos ZIP.")
+            if len(pdfs) > EXTRACT_BATCH_MAX_FILES:
+                raise BatchError(f"No máximo {EXTRACT_BATCH_MAX_FILES} PDFs por lote.")
+            if total_bytes > EXTRACT_BATCH_MAX_TOTAL_BYTES:
+                raise BatchError("Lote muito grande: reduza o número ou o tamanho dos PDFs.")
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not pdfs:
+        raise HTTPException(status_code=400, detail="Nenhum PDF encontrado.")
+
+    async def events():
+        async for event in extract_batch(user_id, pdfs, provider, api_key, model, create_deals=create_deals):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_async_db
 from app.models.settings import UserSettings
 from app.core.security import encrypt_value, decrypt_value
+from app.services.tenant_service import publish_tenant_change
 from typing import Optional
 
 router = APIRouter()
@@ -25,8 +27,9 @@ class SettingsResponse(BaseModel):
     is_api_key_set: bool 
 
 @router.get("/{user_id}", response_model=SettingsResponse)
-def get_settings(user_id: int, db: Session = Depends(get_db)):
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+async def get_settings(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(UserSettings).where(UserSettings.user_id == user_id))
+    settings = result.scalars().first()
     if not settings:
         # Return defaults
         return {
@@ -46,8 +49,9 @@ def get_settings(user_id: int, db: Session = Depends(get_db)):
     }
 
 @router.put("/")
-def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
-    settings = db.query(UserSettings).filter(UserSettings.user_id == data.user_id).first()
+async def update_settings(data: SettingsUpdate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(UserSettings).where(UserSettings.user_id == data.user_id))
+    settings = result.scalars().first()
     
     if not settings:
         settings = UserSettings(user_id=data.user_id)
@@ -62,5 +66,6 @@ def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
     if data.ai_api_key and len(data.ai_api_key.strip()) > 0:
         settings.ai_api_key = encrypt_value(data.ai_api_key)
         
-    db.commit()
+    await db.commit()
+    await publish_tenant_change(user_id=data.user_id, account_id=settings.chatwoot_account_id)
     return {"status": "ok"}
@@ -1,19 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import AsyncSessionLocal, get_async_db
 from app.models.stage import Stage
+from app.services.stage_registry import get_stage_registry, publish_stage_change
 from app.models.settings import UserSettings
-from app.core.security import decrypt_value
+from app.services.chatwoot_service import ChatwootService
 from typing import List, Optional
 from pydantic import BaseModel
-import httpx
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-CHATWOOT_API_URL = os.getenv("CHATWOOT_API_URL", "http://bot-chatwoot-rails-1:3000")
 
 # Pydantic Schemas
 class StageBase(BaseModel):
@@ -39,32 +38,21 @@ class StageResponse(StageBase):
         orm_mode = True
 
 # Sync Logic
-async def sync_label_to_chatwoot(user_id: int, label_name: str, color: str = None, action: str = "create", db: Session = None):
+async def sync_label_to_chatwoot(user_id: int, label_name: str, color: str = None, action: str = "create"):
+    # Runs after the response: the request's session is already closed, so use our own
     try:
         # Get Settings
-        settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
-        if not settings or not settings.chatwoot_account_id or not settings.chatwoot_user_token:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(UserSettings).where(UserSettings.user_id == user_id))
+            settings = result.scalars().first()
+        if not settings or not settings.chatwoot_account_id:
             logger.warning("Chatwoot settings missing. Skipping Label Sync.")
             return
 
-        token = decrypt_value(settings.chatwoot_user_token)
-        account_id = settings.chatwoot_account_id
-        base_url = settings.chatwoot_url or CHATWOOT_API_URL
-        
-        headers = {"api_access_token": token, "Content-Type": "application/json"}
-
         # 1. Create Label
         if action == "create":
-             # Idempotency: Check if exists first? Or just try create (Chatwoot might 422 if exists)
-             payload = {"title": label_name, "color": color or "#000000"}
-             async with httpx.AsyncClient() as client:
-                 res = await client.post(f"{base_url}/api/v1/accounts/{account_id}/labels", json=payload, headers=headers)
-                 if res.status_code in [200, 201]:
-                     logger.info(f"Synced Label {label_name} to Chatwoot.")
-                 elif res.status_code == 422:
-                     logger.info(f"Label {label_name} already exists in Chatwoot.")
-                 else:
-                     logger.error(f"Failed to sync label: {res.text}")
+             # Idempotency: Chatwoot answers 422 if the label already exists
+             await ChatwootService(settings).create_label(label_name, color)
 
         # 2. Update Label (Not fully supported by all Chatwoot versions via simple API, usually requires ID)
         # Assuming we can find by name or we store Chatwoot ID. For now skipping complex update logic.
@@ -74,8 +62,8 @@ async def sync_label_to_chatwoot(user_id: int, label_name: str, color: str = Non
 
 @router.get("/", response_model=List[StageResponse])
 @router.get("", response_model=List[StageResponse], include_in_schema=False)
-def read_stages(db: Session = Depends(get_db)):
-    stages = db.query(Stage).order_by(Stage.order).all()
+async def read_stages(db: AsyncSession = Depends(get_async_db)):
+    stages = (await get_stage_registry(db)).stages
     # Seed default if empty
     if not stages:
         defaults = [
@@ -88,45 +76,49 @@ def read_stages(db: Session = Depends(get_db)):
         for d in defaults:
             s = Stage(**d)
             db.add(s)
-        db.commit()
-        stages = db.query(Stage).order_by(Stage.order).all()
+        await db.commit()
+        await publish_stage_change()
+        stages = (await get_stage_registry(db)).stages
     
     return stages
 
 @router.post("/", response_model=StageResponse)
 @router.post("", response_model=StageResponse, include_in_schema=False)
-def create_stage(stage: StageCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def create_stage(stage: StageCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     # Check duplicate
-    if db.query(Stage).filter(Stage.slug == stage.slug).first():
+    result = await db.execute(select(Stage.id).where(Stage.slug == stage.slug))
+    if result.first():
         raise HTTPException(status_code=400, detail="Stage ID (slug) already exists")
 
     new_stage = Stage(**stage.dict())
     db.add(new_stage)
-    db.commit()
-    db.refresh(new_stage)
+    await db.commit()
+    await db.refresh(new_stage)
+    await publish_stage_change()
 
     # Sync to Chatwoot
     # We use admin user (id=1) settings for global sync usually
-    background_tasks.add_task(sync_label_to_chatwoot, 1, stage.name, "#64748b", "create", db)
+    background_tasks.add_task(sync_label_to_chatwoot, 1, stage.name, "#64748b", "create")
 
     return new_stage
 
 @router.patch("/{stage_id}", response_model=StageResponse)
-def update_stage(stage_id: int, stage_update: StageUpdate, db: Session = Depends(get_db)):
-    db_stage = db.query(Stage).filter(Stage.id == stage_id).first()
+async def update_stage(stage_id: int, stage_update: StageUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_stage = await db.get(Stage, stage_id)
     if not db_stage:
         raise HTTPException(status_code=404, detail="Stage not found")
     
     for key, value in stage_update.dict(exclude_unset=True).items():
         setattr(db_stage, key, value)
     
-    db.commit()
-    db.refresh(db_stage)
+    await db.commit()
+    await db.refresh(db_stage)
+    await publish_stage_change()
     return db_stage
 
 @router.delete("/{stage_id}")
-def delete_stage(stage_id: int, db: Session = Depends(get_db)):
-    db_stage = db.query(Stage).filter(Stage.id == stage_id).first()
+async def delete_stage(stage_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_stage = await db.get(Stage, stage_id)
     if not db_stage:
         raise HTTPException(status_code=404, detail="Stage not found")
     
@@ -136,9 +128,11 @@ def delete_stage(stage_id: int, db: Session = Depends(get_db)):
     # Safety: Check leads
     # (Requires Deal model import, circular import risk if not careful, imported inside func usually fine)
     from app.models.deal import Deal
-    if db.query(Deal).filter(Deal.status == db_stage.slug).count() > 0:
+    result = await db.execute(select(Deal.id).where(Deal.status == db_stage.slug).limit(1))
+    if result.first():
          raise HTTPException(status_code=400, detail="Cannot delete stage with active deals")
 
-    db.delete(db_stage)
-    db.commit()
+    await db.delete(db_stage)
+    await db.commit()
+    await publish_stage_change()
     return {"message": "Stage deleted"}
@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import List, Optional
+
+class StageAnalytics(BaseModel):
+    stage: str
+    entered: int = 0            # Moves into the stage in the period
+    entered_value: float = 0.0  # Sum of deal values at the time of those moves
+    exited: int = 0
+    avg_hours_in_stage: Optional[float] = None     # Over the exits in the period
+    median_hours_in_stage: Optional[float] = None  # Approximate (histogram buckets)
+
+class StageTransition(BaseModel):
+    from_status: Optional[str] = None
+    to_status: str
+    moves: int = 0
+    value: float = 0.0
+    rate: Optional[float] = None  # Share of the exits from `from_status` that went to `to_status`
+
+class DailyStageValue(BaseModel):
+    day: date
+    stage: str
+    entered: int = 0
+    entered_value: float = 0.0
+
+class PipelineAnalytics(BaseModel):
+    start: date
+    end: date
+    stages: List[StageAnalytics] = []
+    transitions: List[StageTransition] = []
+    daily: List[DailyStageValue] = []
+    won: int = 0
+    won_value: float = 0.0
+    lost: int = 0
+    lost_value: float = 0.0
+    win_rate: Optional[float] = None  # won / (won + lost)
@@ -0,0 +1,20 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+
+from app.schemas.deal import DealResponse
+
+class BoardStage(BaseModel):
+    id: int
+    name: str
+    slug: str
+    color: Optional[str] = "bg-slate-500"
+    order: Optional[int] = 0
+    is_default: bool
+
+    model_config = ConfigDict(from_attributes=True)
+
+class BoardColumn(BaseModel):
+    stage: BoardStage
+    count: int = 0          # Total deals in the stage (not just the returned cards)
+    total_value: float = 0.0
+    deals: List[DealResponse] = []
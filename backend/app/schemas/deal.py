@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -34,6 +34,15 @@ class DealUpdate(BaseModel):
     value: Optional[float] = None
     priority: Optional[DealPriority] = None
 
+class DealBulkUpdate(DealUpdate):
+    id: int
+
+class DealBulkDelete(BaseModel):
+    ids: List[int]
+
+class DealBulkDeleteResponse(BaseModel):
+    deleted: List[int]
+
 class DealResponse(DealBase):
     id: int
     user_id: int
@@ -1,9 +1,37 @@
+import os
 import json
+import time
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Set, Tuple
 
-from openai import OpenAI
-from anthropic import Anthropic
+import httpx
+import openai
+import anthropic
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", "60"))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "10"))
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "3"))
+AI_CLIENT_CACHE_SIZE = int(os.getenv("AI_CLIENT_CACHE_SIZE", "256"))
+AI_JSON_MODE = os.getenv("AI_JSON_MODE", "true").lower() in ("1", "true", "yes")
+
+RESULT_FIELDS = ("name", "email", "phone", "value", "priority")
+PRIORITIES = ("high", "medium", "low")
+
+# provider -> base URL (None: SDK default)
+PROVIDERS = {
+    "openai": None,
+    "anthropic": None,
+    "groq": "https://api.groq.com/openai/v1",
+}
 
 # System Prompt is aggressive as requested
 SYSTEM_PROMPT = """
@@ -22,7 +50,145 @@ Regras:
 3. Se o texto não parecer uma apólice, retorne um JSON com todos os campos null.
 """
 
-def extract_lead_info(
+# Characters of document text sent to the model (pdf_service stops reading pages past this)
+MAX_CONTEXT_CHARS = int(os.getenv("AI_MAX_CONTEXT_CHARS", "15000"))
+
+# Changes whenever the prompt does: part of the extraction cache key
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# (provider, sha256(api_key)) -> async SDK client
+_clients: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+# (provider, model) pairs that rejected response_format
+_no_json_mode: Set[Tuple[str, str]] = set()
+
+def _is_retryable(error: BaseException) -> bool:
+    """Connection errors/timeouts, 429 and 5xx are worth another attempt; other 4xx are not."""
+    if isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError)):
+        return True
+    if isinstance(error, (openai.APIStatusError, anthropic.APIStatusError)):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def get_ai_client(provider: str, api_key: str):
+    """
+    Async SDK client for (provider, api_key), reused across calls so requests share
+    the client's connection pool. Keys are held by hash; the cache is LRU-bounded.
+    SDK retries are off: extract_lead_info retries itself (with metrics).
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Provedor IA não suportado: {provider}")
+
+    key = (provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+    client = _clients.get(key)
+    if client is not None:
+        _clients.move_to_end(key)
+        return client
+
+    timeout = httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
+    if provider == "anthropic":
+        client = AsyncAnthropic(api_key=api_key, timeout=timeout, max_retries=0)
+    else:
+        client = AsyncOpenAI(api_key=api_key, base_url=PROVIDERS[provider], timeout=timeout, max_retries=0)
+
+    _clients[key] = client
+    # Evicted clients are just dropped (not closed): a request may still be using them
+    while len(_clients) > AI_CLIENT_CACHE_SIZE:
+        _clients.popitem(last=False)
+    return client
+
+async def close_ai_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"Error closing AI client: {str(e)}")
+
+async def _complete(client, provider: str, model: str, text: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """One completion call. Returns (content, prompt tokens, completion tokens)."""
+    user_message = f"Texto da apólice:\n---\n{text[:MAX_CONTEXT_CHARS]}"  # Limit context to avoid token issues
+
+    if provider == "anthropic":
+        # No JSON mode in the Messages API: prefill the reply with "{" so it starts as an object
+        response = await client.messages.create(
+            model=model,
+            max_tokens=1024,
+            system=SYSTEM_PROMPT,
+            messages=[
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": "{"}
+            ],
+            temperature=0.1
+        )
+        usage = getattr(response, "usage", None)
+        return (
+            "{" + response.content[0].text,
+            getattr(usage, "input_tokens", None),
+            getattr(usage, "output_tokens", None),
+        )
+
+    # OpenAI and OpenAI-compatible APIs (Groq)
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+    json_mode = AI_JSON_MODE and (provider, model) not in _no_json_mode
+    try:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.1, # Low temperature for consistent data extraction
+            **({"response_format": {"type": "json_object"}} if json_mode else {})
+        )
+    except openai.BadRequestError as e:
+        if not json_mode or "response_format" not in str(e):
+            raise
+        # Model without JSON mode: remember and fall back to prompt-only
+        logger.info(f"{provider}/{model} does not support JSON mode")
+        _no_json_mode.add((provider, model))
+        response = await client.chat.completions.create(model=model, messages=messages, temperature=0.1)
+
+    usage = response.usage
+    return (
+        response.choices[0].message.content,
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None,
+    )
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    cleaned = str(value).replace("R$", "").strip()
+    if "," in cleaned:
+        # Brazilian format: 1.234,56
+        cleaned = cleaned.replace(".", "").replace(",", ".")
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+def parse_lead_json(content: Optional[str]) -> Dict[str, Any]:
+    """
+    Parses the model reply into {name, email, phone, value, priority}.
+    Tolerates markdown fences and text around the object; unknown keys are dropped.
+    Raises ValueError if there is no JSON object.
+    """
+    content = (content or "").replace("```json", "").replace("```", "")
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("no JSON object in reply")
+    data = json.loads(content[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+
+    result = {key: data.get(key) for key in RESULT_FIELDS}
+    result["value"] = _to_float(result["value"])
+    priority = str(result["priority"] or "").lower()
+    result["priority"] = priority if priority in PRIORITIES else None
+    return result
+
+async def extract_lead_info(
     text: str, 
     provider: str, 
     api_key: str, 
@@ -30,61 +196,36 @@ def extract_lead_info(
 ) -> Dict[str, Any]:
     """
     Extracts lead info from text using the specified AI provider.
+    Retries connection errors, 429 and 5xx with exponential backoff (AI_MAX_ATTEMPTS).
+    Raises ValueError with a user-facing message on failure.
     """
+    client = get_ai_client(provider, api_key)
+    started = time.monotonic()
+
     try:
-        if provider == "openai":
-            client = OpenAI(api_key=api_key)
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": f"Texto da apólice:\n---\n{text[:15000]}"} # Limit context to avoid token issues
-                ],
-                temperature=0.1 # Low temperature for consistent data extraction
-            )
-            content = response.choices[0].message.content
-        
-        elif provider == "anthropic":
-            client = Anthropic(api_key=api_key)
-            response = client.messages.create(
-                model=model,
-                max_tokens=1024,
-                system=SYSTEM_PROMPT,
-                messages=[
-                    {"role": "user", "content": f"Texto da apólice:\n---\n{text[:15000]}"}
-                ],
-                temperature=0.1
-            )
-            content = response.content[0].text
-        
-        elif provider == "groq":
-             # Implementing Groq using OpenAI compatible client if needed, or dedicated.
-             # User mentioned Groq in settings earlier, usually uses OpenAI SDK base_url
-             client = OpenAI(
-                 base_url="https://api.groq.com/openai/v1",
-                 api_key=api_key
-             )
-             response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": f"Texto da apólice:\n---\n{text[:15000]}"}
-                ],
-                temperature=0.1
-            )
-             content = response.choices[0].message.content
-
-        else:
-            raise ValueError(f"Provedor IA não suportado: {provider}")
-
-        # Clean up potential markdown formatting if the model disobeys
-        cleaned_content = content.replace("```json", "").replace("```", "").strip()
-        
-        return json.loads(cleaned_content)
-
-    except json.JSONDecodeError:
-        logging.error(f"Erro ao decodificar JSON da IA: {content}")
-        raise ValueError("A IA retornou um formato inválido. Tente novamente.")
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(AI_MAX_ATTEMPTS),
+            wait=wait_exponential(multiplier=1, min=1, max=20),
+            retry=retry_if_exception(_is_retryable),
+            before_sleep=lambda _: metrics.incr("ai.retries", provider=provider),
+            reraise=True,
+        ):
+            with attempt:
+                content, prompt_tokens, completion_tokens = await _complete(client, provider, model, text)
     except Exception as e:
-        logging.error(f"Erro na chamada da IA ({provider}): {str(e)}")
+        metrics.incr("ai.errors", provider=provider)
+        logger.error(f"Erro na chamada da IA ({provider}): {str(e)}")
         raise ValueError(f"Erro ao processar com IA: {str(e)}")
+
+    metrics.observe("ai.latency_seconds", time.monotonic() - started, provider=provider)
+    if prompt_tokens:
+        metrics.incr("ai.tokens.prompt", prompt_tokens, provider=provider)
+    if completion_tokens:
+        metrics.incr("ai.tokens.completion", completion_tokens, provider=provider)
+
+    try:
+        return parse_lead_json(content)
+    except ValueError:
+        metrics.incr("ai.invalid_json", provider=provider)
+        logger.error(f"Erro ao decodificar JSON da IA: {content}")
+        raise ValueError("A IA retornou um formato inválido. Tente novamente.")
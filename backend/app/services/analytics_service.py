@@ -0,0 +1,223 @@
+import os
+import bisect
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Sequence
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import func, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.analytics import DealStageEvent, PipelineDailyStat
+from app.models.deal import DealStatus
+
+logger = logging.getLogger(__name__)
+
+# Rollup days are calendar days in this timezone
+try:
+    ANALYTICS_TIMEZONE = ZoneInfo(os.getenv("ANALYTICS_TIMEZONE", "America/Sao_Paulo"))
+except ZoneInfoNotFoundError:
+    # Slim images may ship without tz data
+    logger.warning("ANALYTICS_TIMEZONE not available, rolling up by UTC day")
+    ANALYTICS_TIMEZONE = timezone.utc
+
+# Upper bounds (hours) of the time-in-stage histogram buckets; one extra bucket
+# holds everything longer. Append only: existing rollup rows keep their layout.
+TIME_IN_STAGE_BUCKETS = (1, 4, 12, 24, 48, 96, 168, 336, 720, 1440, 2160)
+_BUCKET_SECONDS = [hours * 3600.0 for hours in TIME_IN_STAGE_BUCKETS]
+
+WON_STATUS = DealStatus.WON.value
+LOST_STATUS = DealStatus.LOST.value
+
+@dataclass(frozen=True)
+class StageChange:
+    deal_id: int
+    from_status: Optional[str]
+    to_status: str
+    value: Optional[float]
+    # When the deal was created: time-in-stage fallback for its first move
+    created_at: Optional[datetime] = None
+
+def _bucket(seconds: float) -> int:
+    return bisect.bisect_left(_BUCKET_SECONDS, seconds)
+
+def _empty_histogram() -> List[int]:
+    return [0] * (len(_BUCKET_SECONDS) + 1)
+
+def histogram_median(histogram: Sequence[int]) -> Optional[float]:
+    """Median in seconds, interpolated linearly inside the bucket holding it."""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total / 2
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = _BUCKET_SECONDS[i - 1] if i > 0 else 0.0
+            if i >= len(_BUCKET_SECONDS):
+                return lower  # open-ended bucket: report its lower bound
+            return lower + (target - seen) / count * (_BUCKET_SECONDS[i] - lower)
+        seen += count
+    return None
+
+async def record_stage_changes(db: AsyncSession, user_id: int, changes: Iterable[StageChange]):
+    """
+    Appends one DealStageEvent per real status change and folds them into the
+    daily rollup. Call in the transaction that changes the statuses. Does not commit.
+    """
+    changes = [c for c in changes if c.to_status and c.from_status != c.to_status]
+    if not changes:
+        return
+
+    now = datetime.now(timezone.utc)
+    day = now.astimezone(ANALYTICS_TIMEZONE).date()
+
+    # When each deal entered its current stage (its latest event)
+    result = await db.execute(
+        select(DealStageEvent.deal_id, func.max(DealStageEvent.occurred_at))
+        .where(DealStageEvent.user_id == user_id, DealStageEvent.deal_id.in_({c.deal_id for c in changes}))
+        .group_by(DealStageEvent.deal_id)
+    )
+    entered_at = dict(result.all())
+
+    events = []
+    rollup = defaultdict(lambda: {"moves": 0, "moved_value": 0.0, "seconds_in_stage": 0.0, "seconds_histogram": _empty_histogram()})
+    for change in changes:
+        since = entered_at.get(change.deal_id) or change.created_at
+        seconds = max(0.0, (now - since).total_seconds()) if since else None
+        events.append({
+            "user_id": user_id,
+            "deal_id": change.deal_id,
+            "from_status": change.from_status,
+            "to_status": change.to_status,
+            "value": change.value,
+            "seconds_in_stage": seconds,
+            "occurred_at": now,
+        })
+        # Same deal moved twice in one batch: the second move starts from the first
+        entered_at[change.deal_id] = now
+
+        row = rollup[(change.from_status or "", change.to_status)]
+        row["moves"] += 1
+        row["moved_value"] += change.value or 0.0
+        if seconds is not None:
+            row["seconds_in_stage"] += seconds
+            row["seconds_histogram"][_bucket(seconds)] += 1
+
+    await db.execute(insert(DealStageEvent), events)
+
+    # Sorted keys: concurrent transactions lock rollup rows in the same order (no deadlocks)
+    rows = [
+        {"user_id": user_id, "day": day, "from_status": from_status, "to_status": to_status, **totals}
+        for (from_status, to_status), totals in sorted(rollup.items())
+    ]
+    stmt = pg_insert(PipelineDailyStat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            PipelineDailyStat.user_id, PipelineDailyStat.day,
+            PipelineDailyStat.from_status, PipelineDailyStat.to_status,
+        ],
+        set_={
+            "moves": PipelineDailyStat.moves + stmt.excluded.moves,
+            "moved_value": PipelineDailyStat.moved_value + stmt.excluded.moved_value,
+            "seconds_in_stage": PipelineDailyStat.seconds_in_stage + stmt.excluded.seconds_in_stage,
+            # Element-wise sum, by position (unnest pads the shorter array with NULLs)
+            "seconds_histogram": literal_column(
+                "ARRAY(SELECT sum(coalesce(a, 0) + coalesce(b, 0))::integer "
+                "FROM unnest(crm_pipeline_daily.seconds_histogram, excluded.seconds_histogram) "
+                "WITH ORDINALITY AS h(a, b, i) GROUP BY i ORDER BY i)"
+            ),
+        },
+    )
+    await db.execute(stmt)
+
+def _hours(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds / 3600, 2) if seconds is not None else None
+
+async def get_pipeline_analytics(db: AsyncSession, user_id: int, start: date, end: date) -> dict:
+    """
+    Pipeline metrics for [start, end] (inclusive), computed from the daily rollup only:
+    per-stage entries/exits and time in stage, stage-to-stage conversion, won/lost,
+    and the value moved into each stage per day.
+    """
+    result = await db.execute(
+        select(PipelineDailyStat)
+        .where(PipelineDailyStat.user_id == user_id, PipelineDailyStat.day.between(start, end))
+        .order_by(PipelineDailyStat.day)
+    )
+
+    stages = defaultdict(lambda: {
+        "entered": 0, "entered_value": 0.0, "exited": 0,
+        "seconds_in_stage": 0.0, "seconds_histogram": _empty_histogram(),
+    })
+    transitions = defaultdict(lambda: {"moves": 0, "value": 0.0})
+    daily = defaultdict(lambda: {"entered": 0, "entered_value": 0.0})
+
+    for row in result.scalars():
+        entered = stages[row.to_status]
+        entered["entered"] += row.moves
+        entered["entered_value"] += row.moved_value
+
+        daily_row = daily[(row.day, row.to_status)]
+        daily_row["entered"] += row.moves
+        daily_row["entered_value"] += row.moved_value
+
+        if row.from_status:
+            exited = stages[row.from_status]
+            exited["exited"] += row.moves
+            exited["seconds_in_stage"] += row.seconds_in_stage
+            for i, count in enumerate(row.seconds_histogram):
+                if i >= len(exited["seconds_histogram"]):
+                    exited["seconds_histogram"].append(0)
+                exited["seconds_histogram"][i] += count
+
+        transition = transitions[(row.from_status or None, row.to_status)]
+        transition["moves"] += row.moves
+        transition["value"] += row.moved_value
+
+    stage_list = []
+    for slug, s in sorted(stages.items()):
+        timed = sum(s["seconds_histogram"])
+        stage_list.append({
+            "stage": slug,
+            "entered": s["entered"],
+            "entered_value": s["entered_value"],
+            "exited": s["exited"],
+            "avg_hours_in_stage": _hours(s["seconds_in_stage"] / timed) if timed else None,
+            "median_hours_in_stage": _hours(histogram_median(s["seconds_histogram"])),
+        })
+
+    transition_list = []
+    for (from_status, to_status), t in sorted(transitions.items(), key=lambda item: (item[0][0] or "", item[0][1])):
+        exits = stages[from_status]["exited"] if from_status else 0
+        transition_list.append({
+            "from_status": from_status,
+            "to_status": to_status,
+            "moves": t["moves"],
+            "value": t["value"],
+            "rate": round(t["moves"] / exits, 4) if exits else None,
+        })
+
+    won = stages[WON_STATUS] if WON_STATUS in stages else None
+    lost = stages[LOST_STATUS] if LOST_STATUS in stages else None
+    won_count = won["entered"] if won else 0
+    lost_count = lost["entered"] if lost else 0
+
+    return {
+        "start": start,
+        "end": end,
+        "stages": stage_list,
+        "transitions": transition_list,
+        "daily": [
+            {"day": day, "stage": stage, **totals}
+            for (day, stage), totals in sorted(daily.items())
+        ],
+        "won": won_count,
+        "won_value": won["entered_value"] if won else 0.0,
+        "lost": lost_count,
+        "lost_value": lost["entered_value"] if lost else 0.0,
+        "win_rate": round(won_count / (won_count + lost_count), 4) if won_count + lost_count else None,
+    }
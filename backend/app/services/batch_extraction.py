@@ -0,0 +1,156 @@
+import io
+import os
+import asyncio
+import zlib
+import zipfile
+import logging
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.schemas.deal import DealCreate
+from app.services.deal_service import bulk_create_deals
+from app.services.extraction_jobs import get_extraction_queue
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_BATCH_MAX_FILES = int(os.getenv("EXTRACT_BATCH_MAX_FILES", "100"))
+EXTRACT_BATCH_MAX_FILE_BYTES = int(os.getenv("EXTRACT_BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+# All PDFs of one request, uncompressed (they are held in memory together)
+EXTRACT_BATCH_MAX_TOTAL_BYTES = int(os.getenv("EXTRACT_BATCH_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+# AI calls in flight per batch request (PDF parsing is bounded by the process pool)
+EXTRACT_BATCH_CONCURRENCY = int(os.getenv("EXTRACT_BATCH_CONCURRENCY", "4"))
+
+class BatchError(ValueError):
+    pass
+
+def is_zip(filename: str, content_type: str) -> bool:
+    return filename.lower().endswith(".zip") or content_type in ("application/zip", "application/x-zip-compressed")
+
+def is_pdf(filename: str, content_type: str) -> bool:
+    return filename.lower().endswith(".pdf") or content_type == "application/pdf"
+
+def pdfs_from_zip(data: bytes, max_total_bytes: int = EXTRACT_BATCH_MAX_TOTAL_BYTES) -> List[Tuple[str, bytes]]:
+    """
+    PDF entries of a ZIP. Declared sizes are checked (per file and summed against
+    `max_total_bytes`) before anything is inflated (zip bombs).
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise BatchError("Arquivo ZIP inválido.")
+
+    with archive:
+        entries = []
+        total = 0
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".pdf"):
+                continue
+            if info.file_size > EXTRACT_BATCH_MAX_FILE_BYTES:
+                raise BatchError(f"{name}: arquivo muito grande.")
+            if len(entries) >= EXTRACT_BATCH_MAX_FILES:
+                raise BatchError(f"No máximo {EXTRACT_BATCH_MAX_FILES} PDFs por lote.")
+            total += info.file_size
+            if total > max_total_bytes:
+                raise BatchError("Lote muito grande: reduza o número ou o tamanho dos PDFs.")
+            entries.append(info)
+
+        pdfs = []
+        for info in entries:
+            try:
+                pdfs.append((info.filename, archive.read(info)))
+            except RuntimeError:
+                # Encrypted entry (no password given)
+                raise BatchError(f"{info.filename}: arquivo protegido por senha.")
+            except NotImplementedError:
+                raise BatchError(f"{info.filename}: método de compressão não suportado.")
+            except (zipfile.BadZipFile, zlib.error, EOFError):
+                raise BatchError(f"{info.filename}: arquivo corrompido no ZIP.")
+    return pdfs
+
+def _deal_from_result(result: dict) -> DealCreate:
+    return DealCreate(**{k: v for k, v in result.items() if v is not None and k in DealCreate.model_fields})
+
+async def extract_batch(
+    user_id: int,
+    files: List[Tuple[str, bytes]],
+    provider: str,
+    api_key: str,
+    model: str,
+    create_deals: bool = False,
+) -> AsyncIterator[dict]:
+    """
+    Extracts every PDF in `files` and yields one event per file, in completion order:
+
+        {"type": "result", "file": name, "result": {...}}
+        {"type": "error", "file": name, "error": "..."}
+
+    With `create_deals`, the successful results are then inserted with one bulk
+    INSERT and a {"type": "created", "deals": [{"file", "id"}]} event follows; if that
+    INSERT fails it is rolled back and each of those files gets an "error" event.
+    The stream ends with {"type": "done", "succeeded": n, "failed": n}.
+    """
+    queue = get_extraction_queue()
+    slots = asyncio.Semaphore(EXTRACT_BATCH_CONCURRENCY)
+
+    async def run(name: str, data: bytes):
+        async with slots:
+            try:
+                return name, await queue.extract(user_id, data, provider, api_key, model), None
+            except ValueError as e:
+                return name, None, str(e)
+            except Exception as e:
+                logger.error(f"Batch extraction failed for {name}: {str(e)}")
+                return name, None, "Erro ao processar PDF."
+
+    tasks = [asyncio.create_task(run(name, data)) for name, data in files]
+    succeeded: List[Tuple[str, dict]] = []
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            name, result, error = await next_done
+            if error is None:
+                succeeded.append((name, result))
+                yield {"type": "result", "file": name, "result": result}
+            else:
+                failed += 1
+                yield {"type": "error", "file": name, "error": error}
+    finally:
+        # Client went away: don't keep spending on AI calls
+        for task in tasks:
+            task.cancel()
+
+    metrics.incr("extract.batch.files", len(files))
+
+    if create_deals and succeeded:
+        names, deals = [], []
+        for name, result in succeeded:
+            try:
+                deals.append(_deal_from_result(result))
+                names.append(name)
+            except ValidationError as e:
+                failed += 1
+                yield {"type": "error", "file": name, "error": f"Dados insuficientes para criar o lead: {e.errors()[0]['msg']}"}
+
+        if deals:
+            created = None
+            async with AsyncSessionLocal() as db:
+                try:
+                    created = await bulk_create_deals(db, user_id, deals)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    metrics.incr("extract.batch.create_failed")
+                    logger.error(f"Batch deal creation failed for user {user_id}: {str(e)}")
+            if created is None:
+                # One INSERT for all of them: none was created
+                failed += len(names)
+                for name in names:
+                    yield {"type": "error", "file": name, "error": "Erro ao criar o lead."}
+            else:
+                yield {"type": "created", "deals": [{"file": name, "id": deal.id} for name, deal in zip(names, created)]}
+
+    yield {"type": "done", "succeeded": len(succeeded), "failed": failed}
@@ -1,185 +1,312 @@
+import os
 import httpx
 import logging
 from typing import Optional
-from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.http import http_request
+from app.core.security import decrypt_value
 from app.models.deal import Deal
 from app.models.settings import UserSettings
-from app.core.crypto import decrypt_secret
 
 logger = logging.getLogger(__name__)
 
+CHATWOOT_API_URL = os.getenv("CHATWOOT_API_URL", "http://bot-chatwoot-rails-1:3000")
+# Conversation label sets we last read or wrote, so a status sync can skip the GET.
+# Labels changed by agents in Chatwoot are picked up once the entry expires.
+CHATWOOT_LABEL_CACHE_TTL = float(os.getenv("CHATWOOT_LABEL_CACHE_TTL", "300"))
+_conversation_labels = TTLCache(maxsize=10000, ttl=CHATWOOT_LABEL_CACHE_TTL)
+# Statuses worth retrying: rate limited or Chatwoot having trouble
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class ChatwootTransientError(Exception):
+    """Chatwoot answered with a transient status (429/5xx); the request may succeed later."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Chatwoot responded {status_code}")
+        self.status_code = status_code
+
+async def sign_in(email: str, password: str, timeout: Optional[float] = None) -> httpx.Response:
+    """
+    Validates credentials against Chatwoot (Devise Token Auth).
+    `timeout` overrides the pool default for this call.
+    Raises httpx.RequestError if Chatwoot is unreachable (timeouts included).
+    """
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    return await http_request(
+        CHATWOOT_API_URL, "POST", "/auth/sign_in",
+        json={"email": email, "password": password}, **kwargs
+    )
+
 class ChatwootService:
     """
     Service layer for Chatwoot API operations.
     Handles all external Chatwoot communication with proper multi-tenant isolation.
     Secrets are decrypted on-demand and never logged.
+    All requests go through the shared connection pool (app.core.http).
+    `rate_limiter` (anything with `async acquire()`) is awaited before every HTTP request.
     """
-    
-    def __init__(self, user_settings: UserSettings):
-        if not user_settings.chatwoot_url or not user_settings.chatwoot_api_key:
+
+    def __init__(self, user_settings: UserSettings, rate_limiter=None):
+        if not user_settings.chatwoot_account_id:
             raise ValueError("Chatwoot configuration incomplete for user")
-        
-        self.url = user_settings.chatwoot_url.rstrip('/')
+
+        self.url = (user_settings.chatwoot_url or CHATWOOT_API_URL).rstrip('/')
         self.account_id = user_settings.chatwoot_account_id
-        
-        # Decrypt API key (may be encrypted in DB)
-        try:
-            self.api_key = decrypt_secret(user_settings.chatwoot_api_key) if user_settings.chatwoot_api_key else None
-        except Exception as e:
-            # If decryption fails, assume it's stored in plaintext (legacy)
-            logger.warning(f"API key decryption failed, using plaintext: {str(e)}")
-            self.api_key = user_settings.chatwoot_api_key
-        
+        self.rate_limiter = rate_limiter
+        self.api_key = self._resolve_token(user_settings)
+
         if not self.api_key:
             raise ValueError("Chatwoot API key is empty or invalid")
-        
+
         self.headers = {
             "api_access_token": self.api_key,
             "Content-Type": "application/json"
         }
-    
+
+    @staticmethod
+    def _resolve_token(user_settings: UserSettings) -> Optional[str]:
+        # User access token, as used by the CRM sync paths
+        if user_settings.chatwoot_user_token:
+            token = decrypt_value(user_settings.chatwoot_user_token)
+            if token:
+                return token
+        # Account API key (may be plaintext in legacy rows)
+        if user_settings.chatwoot_api_key:
+            token = decrypt_value(user_settings.chatwoot_api_key)
+            if token:
+                return token
+            # If decryption fails, assume it's stored in plaintext (legacy)
+            logger.warning("API key decryption failed, using plaintext")
+            return user_settings.chatwoot_api_key
+        return None
+
+    @property
+    def _account_path(self) -> str:
+        return f"/api/v1/accounts/{self.account_id}"
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        return await http_request(self.url, method, f"{self._account_path}{path}", headers=self.headers, **kwargs)
+
+    async def _sync_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        # Sync path: transient failures are raised so the caller can retry them
+        response = await self._request(method, path, **kwargs)
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise ChatwootTransientError(response.status_code)
+        return response
+
     async def create_contact(self, contact_data: dict) -> Optional[dict]:
         """
         Creates a new contact in Chatwoot.
-        
+
         Args:
             contact_data: Dict with keys: name, email, phone_number
-            
+
         Returns:
             Contact data if successful, None otherwise
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.url}/api/v1/accounts/{self.account_id}/contacts",
-                    json=contact_data,
-                    headers=self.headers,
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Created Chatwoot contact: {contact_data.get('email')}")
-                    return response.json()
-                else:
-                    logger.error(f"Failed to create contact: {response.status_code} - {response.text}")
-                    return None
-                    
-            except httpx.RequestError as e:
-                logger.error(f"Chatwoot API request failed: {str(e)}")
+        try:
+            response = await self._request("POST", "/contacts", json=contact_data)
+
+            if response.status_code == 200:
+                logger.info(f"Created Chatwoot contact: {contact_data.get('email')}")
+                return response.json()
+            else:
+                logger.error(f"Failed to create contact: {response.status_code} - {response.text}")
                 return None
-    
-    async def sync_status_to_chatwoot(self, deal: Deal, db: Session) -> bool:
+
+        except httpx.RequestError as e:
+            logger.error(f"Chatwoot API request failed: {str(e)}")
+            return None
+
+    async def create_label(self, title: str, color: Optional[str] = None) -> bool:
+        """
+        Creates an account label. An existing label (422) counts as success.
+        """
+        try:
+            response = await self._request("POST", "/labels", json={"title": title, "color": color or "#000000"})
+            if response.status_code in [200, 201]:
+                logger.info(f"Synced Label {title} to Chatwoot.")
+                return True
+            elif response.status_code == 422:
+                logger.info(f"Label {title} already exists in Chatwoot.")
+                return True
+            logger.error(f"Failed to sync label: {response.text}")
+            return False
+        except httpx.RequestError as e:
+            logger.error(f"Failed to sync label: {str(e)}")
+            return False
+
+    async def sync_status_to_chatwoot(self, deal: Deal) -> bool:
         """
-        Syncs deal status to Chatwoot conversation labels.
-        Implements Read-Modify-Write pattern to avoid label conflicts.
-        
+        Syncs deal status to Chatwoot: mirrors status/value into the contact's
+        custom attributes, then adds the status label to the contact's
+        conversation (Read-Modify-Write on a cached label set). With both ids
+        known this is one or two requests (PUT contact, POST labels if missing).
+
+        Uses deal.chatwoot_contact_id / deal.last_conversation_id when known and
+        only searches Chatwoot when they are missing or stale (404). Ids found
+        along the way are set on the deal; the caller persists them.
+
         Args:
             deal: Deal object to sync
-            db: Database session
-            
+
         Returns:
-            True if successful, False otherwise
+            True if successful, False on a permanent failure (not worth retrying)
+
+        Raises:
+            httpx.RequestError, ChatwootTransientError: transient failures
         """
-        if not deal.email and not deal.phone:
+        if not deal.chatwoot_contact_id and not deal.email and not deal.phone:
             logger.warning(f"Deal {deal.id} has no contact info for Chatwoot sync")
             return False
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                # 1. Find contact by email/phone
-                search_identifier = deal.email or deal.phone
-                contact_res = await client.get(
-                    f"{self.url}/api/v1/accounts/{self.account_id}/contacts/search",
-                    params={"q": search_identifier},
-                    headers=self.headers,
-                    timeout=10.0
-                )
-                
-                if contact_res.status_code != 200:
-                    logger.error(f"Contact search failed: {contact_res.status_code}")
-                    return False
-                
-                contacts = contact_res.json().get("payload", [])
-                if not contacts:
-                    logger.warning(f"No Chatwoot contact found for {search_identifier}")
-                    return False
-                
-                contact_id = contacts[0].get("id")
-                
-                # 2. Find open conversation for contact
-                conv_res = await client.get(
-                    f"{self.url}/api/v1/accounts/{self.account_id}/conversations",
-                    params={"status": "open", "contact_id": contact_id},
-                    headers=self.headers,
-                    timeout=10.0
-                )
-                
-                if conv_res.status_code != 200:
-                    logger.error(f"Conversation search failed: {conv_res.status_code}")
-                    return False
-                
-                conversations = conv_res.json().get("data", {}).get("payload", [])
-                if not conversations:
-                    logger.info(f"No open conversation for contact {contact_id}")
-                    return False
-                
-                conversation = conversations[0]
-                conversation_id = conversation["id"]
-                current_labels = conversation.get("labels", [])
-                
-                # 3. Read-Modify-Write: Add new label if not present
-                new_label = deal.status
-                if new_label not in current_labels:
-                    updated_labels = current_labels + [new_label]
-                    
-                    label_res = await client.post(
-                        f"{self.url}/api/v1/accounts/{self.account_id}/conversations/{conversation_id}/labels",
-                        json={"labels": updated_labels},
-                        headers=self.headers,
-                        timeout=10.0
-                    )
-                    
-                    if label_res.status_code == 200:
-                        logger.info(f"Updated Chatwoot labels for conversation {conversation_id}: {updated_labels}")
-                        return True
-                    else:
-                        logger.error(f"Failed to update labels: {label_res.status_code}")
-                        return False
-                else:
-                    logger.info(f"Label '{new_label}' already present in conversation {conversation_id}")
-                    return True
-                    
-            except httpx.RequestError as e:
-                logger.error(f"Chatwoot sync failed: {str(e)}")
+
+        for _ in range(2):
+            cached_contact = deal.chatwoot_contact_id is not None
+            contact_id = deal.chatwoot_contact_id or await self.find_contact_id(deal.email or deal.phone)
+            if not contact_id:
                 return False
-    
+            deal.chatwoot_contact_id = contact_id
+
+            # Contact first: a 404 here means the cached ids are stale, so don't touch labels yet
+            attributes_status = await self._put_contact_attributes(contact_id, {
+                "crm_status": deal.status,
+                "crm_deal_value": str(deal.value)
+            })
+
+            if attributes_status == 404 and cached_contact:
+                # Contact was deleted/merged in Chatwoot: forget cached ids and search again
+                logger.info(f"Cached Chatwoot contact {contact_id} not found, searching again")
+                deal.chatwoot_contact_id = None
+                deal.last_conversation_id = None
+                continue
+            if attributes_status != 200:
+                return False
+
+            synced = await self._sync_status_label(deal, contact_id)
+            if synced:
+                logger.info(f"Successfully synced Deal {deal.id} to Chatwoot Contact {contact_id}")
+            return synced
+        return False
+
+    async def find_contact_id(self, search_identifier: Optional[str]) -> Optional[int]:
+        """
+        Searches a contact by email/phone. Returns its id or None.
+        Raises httpx.RequestError / ChatwootTransientError on transient failures.
+        """
+        if not search_identifier:
+            return None
+        contact_res = await self._sync_request("GET", "/contacts/search", params={"q": search_identifier})
+
+        if contact_res.status_code != 200:
+            logger.error(f"Contact search failed: {contact_res.status_code}")
+            return None
+
+        contacts = contact_res.json().get("payload", [])
+        if not contacts:
+            logger.warning(f"No Chatwoot contact found for {search_identifier}")
+            return None
+        return contacts[0].get("id")
+
+    def _labels_key(self, conversation_id: int) -> tuple:
+        return (self.url, self.account_id, conversation_id)
+
+    async def _sync_status_label(self, deal: Deal, contact_id: int) -> bool:
+        # 1. Known conversation: use its cached label set, or read it
+        if deal.last_conversation_id:
+            labels = _conversation_labels.get(self._labels_key(deal.last_conversation_id))
+            if labels is None:
+                res = await self._sync_request("GET", f"/conversations/{deal.last_conversation_id}/labels")
+                if res.status_code == 200:
+                    labels = res.json().get("payload", [])
+                elif res.status_code != 404:
+                    logger.error(f"Failed to read conversation labels: {res.status_code}")
+                    return False
+            if labels is not None:
+                return await self._add_conversation_label(deal.last_conversation_id, labels, deal.status)
+            deal.last_conversation_id = None
+
+        # 2. Fallback: find open conversation for contact
+        conv_res = await self._sync_request(
+            "GET", "/conversations", params={"status": "open", "contact_id": contact_id}
+        )
+        if conv_res.status_code != 200:
+            logger.error(f"Conversation search failed: {conv_res.status_code}")
+            return False
+
+        conversations = conv_res.json().get("data", {}).get("payload", [])
+        if not conversations:
+            logger.info(f"No open conversation for contact {contact_id}")
+            return True
+
+        conversation = conversations[0]
+        deal.last_conversation_id = conversation["id"]
+        return await self._add_conversation_label(
+            conversation["id"], conversation.get("labels", []), deal.status
+        )
+
+    async def _add_conversation_label(self, conversation_id: int, current_labels: list, new_label: str) -> bool:
+        # Read-Modify-Write: Add new label if not present
+        key = self._labels_key(conversation_id)
+        if new_label in current_labels:
+            logger.info(f"Label '{new_label}' already present in conversation {conversation_id}")
+            _conversation_labels.set(key, list(current_labels))
+            return True
+        labels = list(current_labels) + [new_label]
+        try:
+            updated = await self._post_conversation_labels(conversation_id, labels)
+        except (httpx.RequestError, ChatwootTransientError):
+            # Unknown state upstream: read it again next time
+            _conversation_labels.pop(key)
+            raise
+        if updated:
+            _conversation_labels.set(key, labels)
+        else:
+            _conversation_labels.pop(key)
+        return updated
+
+    async def _put_contact_attributes(self, contact_id: int, custom_attributes: dict) -> int:
+        response = await self._sync_request(
+            "PUT", f"/contacts/{contact_id}", json={"custom_attributes": custom_attributes}
+        )
+        if response.status_code != 200:
+            logger.error(f"Failed to update chatwoot contact: {response.status_code} - {response.text}")
+        return response.status_code
+
+    async def update_contact_attributes(self, contact_id: int, custom_attributes: dict) -> bool:
+        """
+        Updates custom attributes of a Chatwoot contact.
+        """
+        try:
+            return await self._put_contact_attributes(contact_id, custom_attributes) == 200
+        except (httpx.RequestError, ChatwootTransientError) as e:
+            logger.error(f"Failed to update chatwoot contact: {str(e)}")
+            return False
+
     async def update_conversation_labels(self, conversation_id: int, labels: list) -> bool:
         """
         Updates labels for a specific conversation.
-        
+
         Args:
             conversation_id: Chatwoot conversation ID
             labels: List of label strings
-            
+
         Returns:
             True if successful, False otherwise
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.url}/api/v1/accounts/{self.account_id}/conversations/{conversation_id}/labels",
-                    json={"labels": labels},
-                    headers=self.headers,
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"Updated labels for conversation {conversation_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to update labels: {response.status_code}")
-                    return False
-                    
-            except httpx.RequestError as e:
-                logger.error(f"Failed to update conversation labels: {str(e)}")
-                return False
+        try:
+            return await self._post_conversation_labels(conversation_id, labels)
+        except (httpx.RequestError, ChatwootTransientError) as e:
+            logger.error(f"Failed to update conversation labels: {str(e)}")
+            return False
+
+    async def _post_conversation_labels(self, conversation_id: int, labels: list) -> bool:
+        response = await self._sync_request(
+            "POST", f"/conversations/{conversation_id}/labels", json={"labels": labels}
+        )
+        if response.status_code == 200:
+            logger.info(f"Updated labels for conversation {conversation_id}: {labels}")
+            return True
+        logger.error(f"Failed to update labels: {response.status_code}")
+        return False
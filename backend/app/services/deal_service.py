@@ -0,0 +1,185 @@
+import re
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Float, Integer, String, case, cast, column, delete, func, insert, or_, select, tuple_, update, values,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.normalization import normalize_email, normalize_phone
+from app.models.deal import Deal, DealPriority
+from app.schemas.deal import DealBase, DealUpdate
+from app.services.analytics_service import StageChange, record_stage_changes
+
+logger = logging.getLogger(__name__)
+
+def deal_row(deal: DealBase, user_id: int) -> dict:
+    """
+    Column values for a Core INSERT of `deal`.
+    Core statements bypass the Deal validators, so the matching keys are set here.
+    """
+    row = deal.dict()
+    row["user_id"] = user_id
+    row["email_normalized"] = normalize_email(row.get("email"))
+    row["phone_e164"] = normalize_phone(row.get("phone"))
+    return row
+
+async def bulk_create_deals(db: AsyncSession, user_id: int, deals: Sequence[DealBase]) -> List[Deal]:
+    """Inserts all deals with one INSERT ... RETURNING, returned in input order. Does not commit."""
+    if not deals:
+        return []
+    result = await db.scalars(
+        insert(Deal).returning(Deal, sort_by_parameter_order=True),
+        [deal_row(deal, user_id) for deal in deals],
+    )
+    return list(result.all())
+
+async def bulk_update_deals(db: AsyncSession, user_id: int, updates: Dict[int, DealUpdate]) -> List[Deal]:
+    """
+    Applies per-deal partial updates ({deal_id: DealUpdate}) with a single
+    UPDATE ... FROM (VALUES ...). Fields left unset (or null) keep their current
+    value. Deals of other tenants are silently skipped. Status changes are
+    recorded for analytics (analytics_service). Does not commit.
+    """
+    if not updates:
+        return []
+
+    rows = []
+    for deal_id, changes in updates.items():
+        data = changes.dict(exclude_unset=True)
+        email = data.get("email")
+        phone = data.get("phone")
+        priority = data.get("priority")
+        rows.append((
+            deal_id,
+            data.get("name"),
+            email,
+            normalize_email(email),
+            phone,
+            normalize_phone(phone),
+            data.get("status"),
+            data.get("value"),
+            # The enum column stores member names
+            DealPriority(priority).name if priority is not None else None,
+        ))
+
+    # Statuses before the update, for the stage-change log (rows locked until commit)
+    moved_ids = [deal_id for deal_id, changes in updates.items() if changes.status]
+    previous_status = {}
+    if moved_ids:
+        result = await db.execute(
+            select(Deal.id, Deal.status)
+            .where(Deal.id.in_(moved_ids), Deal.user_id == user_id)
+            .with_for_update()
+        )
+        previous_status = dict(result.all())
+
+    v = values(
+        column("id", Integer),
+        column("name", String),
+        column("email", String),
+        column("email_normalized", String),
+        column("phone", String),
+        column("phone_e164", String),
+        column("status", String),
+        column("value", Float),
+        column("priority", String),
+        name="v",
+    ).data(rows)
+
+    stmt = (
+        update(Deal)
+        .where(Deal.id == v.c.id, Deal.user_id == user_id)
+        .values(
+            name=func.coalesce(v.c.name, Deal.name),
+            email=func.coalesce(v.c.email, Deal.email),
+            email_normalized=func.coalesce(v.c.email_normalized, Deal.email_normalized),
+            phone=func.coalesce(v.c.phone, Deal.phone),
+            phone_e164=func.coalesce(v.c.phone_e164, Deal.phone_e164),
+            status=func.coalesce(v.c.status, Deal.status),
+            value=func.coalesce(cast(v.c.value, Float), Deal.value),
+            priority=func.coalesce(cast(v.c.priority, Deal.priority.type), Deal.priority),
+            updated_at=func.now(),
+        )
+        .returning(Deal)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.scalars(stmt)
+    updated = list(result.all())
+
+    if previous_status:
+        await record_stage_changes(db, user_id, [
+            StageChange(deal.id, previous_status[deal.id], deal.status, deal.value, deal.created_at)
+            for deal in updated if deal.id in previous_status
+        ])
+    return updated
+
+async def bulk_delete_deals(db: AsyncSession, user_id: int, deal_ids: Iterable[int]) -> List[int]:
+    """Deletes the tenant's deals among `deal_ids`. Returns the ids actually deleted. Does not commit."""
+    deal_ids = list(set(deal_ids))
+    if not deal_ids:
+        return []
+    result = await db.execute(
+        delete(Deal)
+        .where(Deal.id.in_(deal_ids), Deal.user_id == user_id)
+        .returning(Deal.id)
+        .execution_options(synchronize_session=False)
+    )
+    return [row[0] for row in result.all()]
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+async def search_deals(
+    db: AsyncSession,
+    user_id: int,
+    q: str,
+    limit: int,
+    after: Optional[Tuple[float, int]] = None,
+    status_filter: Optional[Sequence[str]] = None,
+) -> List[Tuple[Deal, float]]:
+    """
+    Tenant-scoped lead search, best matches first: [(deal, rank)] ordered by (rank DESC, id DESC).
+
+    - name: accent/case-insensitive substring, or fuzzy (pg_trgm word similarity) for typos
+    - email: substring of the normalized email
+    - phone: digits of `q` (3+) inside the E.164 phone
+
+    Every predicate matches an expression of the ix_crm_deals_user_*_trgm GIN indexes
+    (see app.core.migrations), so the cost follows the number of matches, not of deals.
+    `after` is the (rank, id) of the last row of the previous page.
+    """
+    q = q.strip()
+    pattern = _escape_like(q.lower())
+    digits = re.sub(r"\D", "", q)
+
+    # Same expression as the name index: lower(f_unaccent(name))
+    name_key = func.lower(func.f_unaccent(Deal.name))
+    term = func.lower(func.f_unaccent(q))
+    name_contains = name_key.like(func.lower(func.f_unaccent(f"%{pattern}%")), escape="\\")
+    name_prefix = name_key.like(func.lower(func.f_unaccent(f"{pattern}%")), escape="\\")
+    email_contains = Deal.email_normalized.like(f"%{pattern}%", escape="\\")
+
+    matches = [name_contains, term.op("<%", is_comparison=True)(name_key), email_contains]
+    scores = [
+        # Prefix matches of the name first, then by similarity
+        func.word_similarity(term, name_key) + case((name_prefix, 0.5), else_=0.0),
+        case((email_contains, 0.8), else_=0.0),
+    ]
+    if len(digits) >= 3:
+        phone_contains = Deal.phone_e164.like(f"%{digits}%")
+        matches.append(phone_contains)
+        scores.append(case((phone_contains, 0.9), else_=0.0))
+
+    rank = cast(func.greatest(*scores), Float)
+
+    # SECURITY: Filter by user_id
+    query = select(Deal, rank.label("rank")).where(Deal.user_id == user_id, or_(*matches))
+    if status_filter:
+        query = query.where(Deal.status.in_(status_filter))
+    if after:
+        query = query.where(tuple_(rank, Deal.id) < tuple_(*after))
+
+    result = await db.execute(query.order_by(rank.desc(), Deal.id.desc()).limit(limit))
+    return [(deal, score) for deal, score in result.all()]
@@ -0,0 +1,99 @@
+import io
+import os
+import csv
+import json
+import zlib
+import logging
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.models.deal import Deal
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = ("id", "name", "email", "phone", "status", "value", "priority", "created_at", "updated_at")
+
+def _record(row) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "email": row.email,
+        "phone": row.phone,
+        "status": row.status,
+        "value": row.value,
+        "priority": row.priority.value if row.priority is not None else None,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
+
+def _encode_csv(rows, header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    if header:
+        writer.writeheader()
+    for row in rows:
+        writer.writerow(_record(row))
+    return buffer.getvalue()
+
+def _encode_ndjson(rows) -> str:
+    return "".join(json.dumps(_record(row), ensure_ascii=False) + "\n" for row in rows)
+
+async def export_deals(
+    user_id: int,
+    fmt: str = "csv",
+    compress: bool = False,
+    status_filter: Optional[List[str]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields the tenant's deals as CSV or NDJSON bytes, oldest first.
+
+    Rows come from a server-side cursor (stream_results) EXPORT_BATCH_ROWS at a time
+    and are encoded (and gzip-compressed, if asked) batch by batch, so memory stays
+    constant regardless of the number of deals.
+    """
+    query = (
+        select(*(getattr(Deal, name) for name in EXPORT_COLUMNS))
+        .where(Deal.user_id == user_id)
+        .order_by(Deal.id)
+        .execution_options(yield_per=EXPORT_BATCH_ROWS)
+    )
+    if status_filter:
+        query = query.where(Deal.status.in_(status_filter))
+
+    # wbits=31: gzip container (header + CRC), readable by gunzip and browsers
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    exported = 0
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        first = True
+        async for rows in result.partitions():
+            if fmt == "csv":
+                text = _encode_csv(rows, header=first)
+            else:
+                text = _encode_ndjson(rows)
+            first = False
+            exported += len(rows)
+
+            data = text.encode("utf-8")
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+        if first and fmt == "csv":
+            # No deals: still emit the header
+            data = _encode_csv([], header=True).encode("utf-8")
+            yield compressor.compress(data) if compressor else data
+
+    if compressor:
+        yield compressor.flush()
+
+    metrics.incr("deals.export.rows", exported)
+    logger.info(f"Exported {exported} deals for user {user_id} ({fmt}{', gzip' if compress else ''})")
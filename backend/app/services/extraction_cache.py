@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+from app.services.ai_service import MAX_CONTEXT_CHARS, SYSTEM_PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", str(7 * 24 * 3600)))
+EXTRACT_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACT_CACHE_MAX_ENTRIES", "5000"))
+EXTRACT_CACHE_MAX_TEXT_CHARS = int(os.getenv("EXTRACT_CACHE_MAX_TEXT_CHARS", "200000"))
+
+TEXT_PREFIX = "extract:text:"
+RESULT_PREFIX = "extract:result:"
+# Sorted set of cache keys by last use: entries past EXTRACT_CACHE_MAX_ENTRIES are evicted LRU-first
+INDEX_KEY = "extract:cache:index"
+
+def file_digest(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def result_digest(user_id: int, text: str, provider: str, model: str) -> str:
+    """
+    Results are cached per tenant (and provider, model and prompt version): they came
+    from the tenant's own AI account and must never be served to another tenant.
+    Only the PDF text cache is shared.
+    """
+    h = hashlib.sha256()
+    for part in (SYSTEM_PROMPT_VERSION, str(user_id), provider or "", model or "", text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+async def _get(key: str, kind: str) -> Optional[str]:
+    try:
+        redis = get_redis()
+        value = await redis.get(key)
+        if value is not None:
+            await redis.zadd(INDEX_KEY, {key: time.time()})
+    except RedisError as e:
+        logger.warning(f"Extraction cache unavailable: {str(e)}")
+        return None
+    metrics.incr("extract.cache.hits" if value is not None else "extract.cache.misses", kind=kind)
+    return value
+
+async def _set(key: str, value: str):
+    try:
+        redis = get_redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, value, ex=EXTRACT_CACHE_TTL)
+            pipe.zadd(INDEX_KEY, {key: time.time()})
+            pipe.zcard(INDEX_KEY)
+            *_, size = await pipe.execute()
+
+        excess = size - EXTRACT_CACHE_MAX_ENTRIES
+        if excess > 0:
+            evicted = [member for member, _ in await redis.zpopmin(INDEX_KEY, excess)]
+            if evicted:
+                await redis.delete(*evicted)
+                metrics.incr("extract.cache.evictions", len(evicted))
+    except RedisError as e:
+        logger.warning(f"Extraction cache unavailable: {str(e)}")
+
+def _text_key(digest: str) -> str:
+    # Text is cut to the context budget at extraction time, so the budget is part of the key
+    return f"{TEXT_PREFIX}{MAX_CONTEXT_CHARS}:{digest}"
+
+async def get_text(digest: str) -> Optional[str]:
+    return await _get(_text_key(digest), "text")
+
+async def set_text(digest: str, text: str):
+    if len(text) <= EXTRACT_CACHE_MAX_TEXT_CHARS:
+        await _set(_text_key(digest), text)
+
+async def get_result(digest: str) -> Optional[Dict[str, Any]]:
+    value = await _get(f"{RESULT_PREFIX}{digest}", "result")
+    return json.loads(value) if value is not None else None
+
+async def set_result(digest: str, result: Dict[str, Any]):
+    await _set(f"{RESULT_PREFIX}{digest}", json.dumps(result))
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from redis.exceptions import RedisError
+
+from app.core.metrics import metrics
+from app.core.redis import get_redis
+from app.services import extraction_cache
+from app.services.pdf_service import PdfText, extract_pdf_text
+from app.services.ai_service import extract_lead_info
+from app.services.local_extractor import extract_local
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+EXTRACT_PDF_PROCESSES = int(os.getenv("EXTRACT_PDF_PROCESSES", str(min(4, os.cpu_count() or 1))))
+EXTRACT_QUEUE_SIZE = int(os.getenv("EXTRACT_QUEUE_SIZE", "100"))
+EXTRACT_JOB_TTL = int(os.getenv("EXTRACT_JOB_TTL", "3600"))  # seconds a finished job stays pollable
+# Skip the AI call when the regex extractor finds name, value and a contact
+EXTRACT_LOCAL_SKIP_AI = os.getenv("EXTRACT_LOCAL_SKIP_AI", "true").lower() in ("1", "true", "yes")
+
+# Liveness of the process running a job: queued/running jobs whose process stopped
+# heartbeating (restart, crash) are reported as failed instead of pending forever
+EXTRACT_HEARTBEAT_TTL = int(os.getenv("EXTRACT_HEARTBEAT_TTL", "60"))
+EXTRACT_HEARTBEAT_INTERVAL = EXTRACT_HEARTBEAT_TTL / 3
+
+JOB_KEY_PREFIX = "extract:job:"
+WORKER_KEY_PREFIX = "extract:worker:"
+INTERRUPTED_ERROR = "Processamento interrompido. Envie o arquivo novamente."
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFullError(Exception):
+    pass
+
+class JobStoreUnavailable(Exception):
+    """Redis (job status store) can't be reached: the job can't be tracked, so it isn't accepted."""
+    pass
+
+@dataclass
+class ExtractionJob:
+    """In-memory job payload. Only status/result go to Redis; the file and API key never leave the process."""
+    id: str
+    user_id: int
+    file_bytes: bytes
+    file_digest: str
+    provider: str
+    api_key: str
+    model: str
+
+def job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+def worker_key(instance_id: str) -> str:
+    return f"{WORKER_KEY_PREFIX}{instance_id}"
+
+def record_pdf_stats(pdf: PdfText):
+    # Parsing runs in a child process: stats are recorded here, in the parent
+    metrics.observe("pdf.pages_total", pdf.page_count)
+    metrics.observe("pdf.pages_read", pdf.pages_read)
+    metrics.observe("pdf.chars", pdf.chars)
+    if pdf.truncated:
+        metrics.incr("pdf.truncated")
+
+class ExtractionQueue:
+    """
+    Runs PDF extractions in the background so the upload request returns at once.
+
+    - PyMuPDF parsing is CPU-bound: it runs in a process pool (EXTRACT_PDF_PROCESSES).
+    - The AI call runs on a bounded set of async workers (EXTRACT_WORKERS).
+    - Job status and results live in Redis (EXTRACT_JOB_TTL), so any API process
+      can answer the polling endpoint. Jobs themselves live in this process: each
+      job records the process instance, which heartbeats in Redis while it runs.
+    - PDF text and AI results are cached by content hash (extraction_cache):
+      re-uploads of a known file finish at submit time without being queued.
+
+    The queue is bounded: submit() raises QueueFullError instead of piling up uploads.
+    """
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, processes: int = EXTRACT_PDF_PROCESSES):
+        self.worker_count = workers
+        self.process_count = processes
+        self._queue: "asyncio.Queue[ExtractionJob]" = asyncio.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        # Wakes up long-polls for jobs finished by this process
+        self._finished: Dict[str, asyncio.Event] = {}
+        self.instance_id = uuid.uuid4().hex
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+            self._workers.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Jobs still queued here are lost: let pollers see that right away
+        try:
+            await get_redis().delete(worker_key(self.instance_id))
+        except RedisError as e:
+            logger.warning(f"Could not clear extraction worker heartbeat: {str(e)}")
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.process_count)
+        return self._pool
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await get_redis().set(worker_key(self.instance_id), 1, ex=EXTRACT_HEARTBEAT_TTL)
+            except RedisError as e:
+                logger.warning(f"Extraction worker heartbeat failed: {str(e)}")
+            await asyncio.sleep(EXTRACT_HEARTBEAT_INTERVAL)
+
+    async def submit(self, user_id: int, file_bytes: bytes, provider: str, api_key: str, model: str) -> str:
+        """Queues a job and returns its id. Raises QueueFullError or JobStoreUnavailable."""
+        try:
+            return await self._submit(user_id, file_bytes, provider, api_key, model)
+        except RedisError as e:
+            logger.error(f"Extraction job store unavailable: {str(e)}")
+            metrics.incr("extract.jobs.rejected", reason="redis")
+            raise JobStoreUnavailable(str(e))
+
+    async def _submit(self, user_id: int, file_bytes: bytes, provider: str, api_key: str, model: str) -> str:
+        job = ExtractionJob(
+            id=uuid.uuid4().hex, user_id=user_id, file_bytes=file_bytes,
+            file_digest=extraction_cache.file_digest(file_bytes),
+            provider=provider, api_key=api_key, model=model,
+        )
+
+        # Known file with a cached result: done without queueing
+        cached = await self._cached_result(job)
+        if cached is not None:
+            await get_redis().hset(job_key(job.id), mapping={
+                "status": DONE,
+                "user_id": user_id,
+                "created_at": time.time(),
+                "result": json.dumps(cached),
+            })
+            await get_redis().expire(job_key(job.id), EXTRACT_JOB_TTL)
+            metrics.incr("extract.jobs.cached")
+            return job.id
+
+        if self._queue.full():
+            raise QueueFullError()
+
+        # Heartbeat now too, so no poller can see this job before the heartbeat exists
+        await get_redis().set(worker_key(self.instance_id), 1, ex=EXTRACT_HEARTBEAT_TTL)
+        await get_redis().hset(job_key(job.id), mapping={
+            "status": QUEUED,
+            "user_id": user_id,
+            "created_at": time.time(),
+            "worker": self.instance_id,
+        })
+        await get_redis().expire(job_key(job.id), EXTRACT_JOB_TTL)
+        self._finished[job.id] = asyncio.Event()
+        self._queue.put_nowait(job)
+        metrics.incr("extract.jobs.submitted")
+        return job.id
+
+    async def _cached_result(self, job: ExtractionJob) -> Optional[dict]:
+        text = await extraction_cache.get_text(job.file_digest)
+        if text is None:
+            return None
+        local = extract_local(text)
+        if EXTRACT_LOCAL_SKIP_AI and local.confident:
+            return local.result()
+        result = await extraction_cache.get_result(
+            extraction_cache.result_digest(job.user_id, text, job.provider, job.model)
+        )
+        return local.fill_missing(result) if result is not None else None
+
+    async def get(self, job_id: str, user_id: int) -> Optional[dict]:
+        """Job status for its owner (None if unknown, expired or owned by another user)."""
+        data = await get_redis().hgetall(job_key(job_id))
+        if not data or int(data.get("user_id", -1)) != user_id:
+            return None
+        if data["status"] in (QUEUED, RUNNING) and data.get("worker") != self.instance_id:
+            if not await get_redis().exists(worker_key(data.get("worker", ""))):
+                # The process holding the job is gone (restart/crash): it will never finish
+                await get_redis().hset(job_key(job_id), mapping={"status": FAILED, "error": INTERRUPTED_ERROR})
+                metrics.incr("extract.jobs.interrupted")
+                data.update(status=FAILED, error=INTERRUPTED_ERROR)
+        job = {"job_id": job_id, "status": data["status"]}
+        if "result" in data:
+            job["result"] = json.loads(data["result"])
+        if "error" in data:
+            job["error"] = data["error"]
+        return job
+
+    async def wait(self, job_id: str, user_id: int, timeout: float) -> Optional[dict]:
+        """Long-poll: returns as soon as the job finishes or `timeout` elapses."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await self.get(job_id, user_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED) or remaining <= 0:
+                return job
+            event = self._finished.get(job_id)
+            if event is not None:
+                # Finished by this process: woken up directly
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(0.5, remaining))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Extraction job {job.id} crashed: {str(e)}")
+            finally:
+                self._queue.task_done()
+                event = self._finished.pop(job.id, None)
+                if event is not None:
+                    event.set()
+
+    async def extract(
+        self, user_id: int, file_bytes: bytes, provider: str, api_key: str, model: str,
+        file_digest: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Parses the PDF in the process pool, then runs the local regex extractor and,
+        unless that was conclusive, the AI extraction (reusing cached text/results).
+        Fields the AI left null are filled from the local extraction, which is also
+        the fallback when the AI call fails. User-facing errors are raised as ValueError.
+        Cached AI results are scoped to `user_id`.
+        """
+        file_digest = file_digest or extraction_cache.file_digest(file_bytes)
+        text = await extraction_cache.get_text(file_digest)
+        if text is None:
+            loop = asyncio.get_running_loop()
+            pdf = await loop.run_in_executor(self._get_pool(), extract_pdf_text, file_bytes)
+            record_pdf_stats(pdf)
+            text = pdf.text
+            await extraction_cache.set_text(file_digest, text)
+
+        local = extract_local(text)
+        if EXTRACT_LOCAL_SKIP_AI and local.confident:
+            metrics.incr("extract.local.skipped_ai")
+            return local.result()
+
+        digest = extraction_cache.result_digest(user_id, text, provider, model)
+        result = await extraction_cache.get_result(digest)
+        if result is None:
+            try:
+                result = await extract_lead_info(
+                    text=text,
+                    provider=provider,
+                    api_key=api_key,
+                    model=model
+                )
+            except ValueError:
+                if not local.found:
+                    raise
+                metrics.incr("extract.local.fallback")
+                return local.result()
+            await extraction_cache.set_result(digest, result)
+        return local.fill_missing(result)
+
+    async def _run(self, job: ExtractionJob):
+        key = job_key(job.id)
+        await get_redis().hset(key, "status", RUNNING)
+        started = time.monotonic()
+
+        try:
+            result = await self.extract(
+                job.user_id, job.file_bytes, job.provider, job.api_key, job.model, job.file_digest
+            )
+        except ValueError as e:
+            # pdf_service / ai_service report user-facing errors as ValueError
+            await get_redis().hset(key, mapping={"status": FAILED, "error": str(e)})
+            metrics.incr("extract.jobs.failed")
+        except Exception as e:
+            logger.error(f"Extraction job {job.id} failed: {str(e)}")
+            await get_redis().hset(key, mapping={"status": FAILED, "error": "Erro ao processar PDF."})
+            metrics.incr("extract.jobs.failed")
+        else:
+            await get_redis().hset(key, mapping={"status": DONE, "result": json.dumps(result)})
+            metrics.incr("extract.jobs.succeeded")
+        finally:
+            metrics.observe("extract.job_seconds", time.monotonic() - started)
+            await get_redis().expire(key, EXTRACT_JOB_TTL)
+
+extraction_queue: Optional[ExtractionQueue] = None
+
+def get_extraction_queue() -> ExtractionQueue:
+    global extraction_queue
+    if extraction_queue is None:
+        extraction_queue = ExtractionQueue()
+    return extraction_queue
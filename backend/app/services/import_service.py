@@ -0,0 +1,296 @@
+import os
+import csv
+import json
+import codecs
+import logging
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from pydantic import ValidationError
+from sqlalchemy import Float, String, and_, cast, column, exists, insert, literal, or_, select, table, text
+
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.core.normalization import normalize_email, normalize_phone
+from app.models.deal import Deal, DealPriority
+from app.schemas.deal import DealBase
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "5000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "100"))
+# Validated rows are spooled here while the upload is read; past this size the spool moves to disk
+IMPORT_SPOOL_MAX_MEMORY = int(os.getenv("IMPORT_SPOOL_MAX_MEMORY", str(8 * 1024 * 1024)))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+STAGING_TABLE = "crm_deals_import"
+STAGING_COLUMNS = (
+    "name", "email", "email_normalized", "phone", "phone_e164", "status", "value", "priority"
+)
+_DEAL_FIELDS = set(DealBase.model_fields)
+
+staging = table(
+    STAGING_TABLE,
+    column("name", String),
+    column("email", String),
+    column("email_normalized", String),
+    column("phone", String),
+    column("phone_e164", String),
+    column("status", String),
+    column("value", Float),
+    column("priority", String),
+)
+
+class ImportFormatError(ValueError):
+    pass
+
+def detect_format(fmt: Optional[str], content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Explicit format wins, then the file extension, then the Content-Type."""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in IMPORT_FORMATS:
+            raise ImportFormatError(f"Unsupported import format: {fmt}")
+        return fmt
+    if filename:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension in ("csv", "txt"):
+            return "csv"
+        if extension in ("ndjson", "jsonl"):
+            return "ndjson"
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type in ("text/csv", "application/csv", "text/plain"):
+        return "csv"
+    raise ImportFormatError("Could not detect import format; pass format=csv or format=ndjson")
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decodes a byte stream into lines without holding more than one partial line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """
+    Yields (row_number, dict) per CSV record, keyed by the lowercased header.
+    Quoted fields may span lines. The delimiter (',' or ';') is taken from the header.
+    """
+    header = None
+    delimiter = ","
+    record = None
+    row_number = 0
+    async for line in lines:
+        record = line if record is None else f"{record}\n{line}"
+        # An odd number of quotes means a quoted field continues on the next line
+        if record.count('"') % 2:
+            continue
+        if not record.strip():
+            record = None
+            continue
+
+        if header is None:
+            delimiter = ";" if record.count(";") > record.count(",") else ","
+            header = [h.strip().lower() for h in next(csv.reader([record], delimiter=delimiter))]
+        else:
+            row_number += 1
+            try:
+                values = next(csv.reader([record], delimiter=delimiter))
+            except csv.Error as e:
+                yield row_number, ValueError(f"Invalid CSV: {e}")
+            else:
+                yield row_number, dict(zip(header, values))
+        record = None
+
+    if record is not None and record.strip():
+        row_number += 1
+        yield row_number, ValueError("Unterminated quoted field")
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[tuple]:
+    """Yields (row_number, dict) per non-blank line; parse errors are yielded in place of the dict."""
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield row_number, ValueError("Each line must be a JSON object")
+            continue
+        yield row_number, {str(k).strip().lower(): v for k, v in row.items()}
+
+def _clean(row: dict) -> dict:
+    """Keeps DealBase fields and treats empty cells as missing."""
+    cleaned = {}
+    for key, value in row.items():
+        if key not in _DEAL_FIELDS:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        if value is not None:
+            cleaned[key] = value
+    return cleaned
+
+def _staging_record(deal: DealBase) -> tuple:
+    return (
+        deal.name,
+        deal.email,
+        normalize_email(deal.email),
+        deal.phone,
+        normalize_phone(deal.phone),
+        deal.status,
+        deal.value,
+        # The enum column stores member names
+        DealPriority(deal.priority).name,
+    )
+
+def _row_errors(error: Exception) -> List[Dict[str, str]]:
+    if isinstance(error, ValidationError):
+        return [
+            {"field": ".".join(str(part) for part in e["loc"]), "message": e["msg"]}
+            for e in error.errors()
+        ]
+    return [{"field": None, "message": str(error)}]
+
+def _merge_statement(user_id: int):
+    """
+    INSERT INTO crm_deals SELECT ... FROM staging, skipping rows whose email or
+    phone already belongs to one of the tenant's deals.
+    """
+    existing = exists().where(and_(
+        Deal.user_id == user_id,
+        or_(
+            and_(staging.c.email_normalized.isnot(None), Deal.email_normalized == staging.c.email_normalized),
+            and_(staging.c.phone_e164.isnot(None), Deal.phone_e164 == staging.c.phone_e164),
+        ),
+    ))
+    rows = select(
+        literal(user_id),
+        staging.c.name,
+        staging.c.email,
+        staging.c.email_normalized,
+        staging.c.phone,
+        staging.c.phone_e164,
+        staging.c.status,
+        staging.c.value,
+        cast(staging.c.priority, Deal.priority.type),
+    ).where(~existing)
+    return insert(Deal).from_select(
+        ["user_id", "name", "email", "email_normalized", "phone", "phone_e164", "status", "value", "priority"],
+        rows,
+    )
+
+async def _copy_and_merge(user_id: int, spool) -> int:
+    """COPYs the spooled records into a temporary staging table and merges them. Returns the rows inserted."""
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(text(f"""
+                CREATE TEMP TABLE {STAGING_TABLE} (
+                    name text, email text, email_normalized text, phone text,
+                    phone_e164 text, status text, value double precision, priority text
+                ) ON COMMIT DROP
+            """))
+            # COPY goes through asyncpg directly, on the session's connection/transaction
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            driver = raw.driver_connection
+
+            batch: List[tuple] = []
+            for line in spool:
+                batch.append(tuple(json.loads(line)))
+                if len(batch) >= IMPORT_BATCH_ROWS:
+                    await driver.copy_records_to_table(STAGING_TABLE, records=batch, columns=STAGING_COLUMNS)
+                    batch.clear()
+            if batch:
+                await driver.copy_records_to_table(STAGING_TABLE, records=batch, columns=STAGING_COLUMNS)
+
+            result = await db.execute(_merge_statement(user_id))
+            await db.commit()
+            return result.rowcount
+        except Exception:
+            await db.rollback()
+            raise
+
+async def import_deals(user_id: int, fmt: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """
+    Streams an uploaded CSV/NDJSON file into the tenant's deals and yields progress events:
+
+        {"type": "error", "row": n, "errors": [...]}       invalid row (first IMPORT_MAX_REPORTED_ERRORS only)
+        {"type": "progress", "rows": n, "staged": n, ...}   after every IMPORT_BATCH_ROWS valid rows
+        {"type": "done", "inserted": n, ...}                 final summary
+        {"type": "failed", "detail": "..."}                  nothing was imported
+
+    The upload is parsed and validated first, without a database connection; valid
+    rows are spooled (memory, then a temp file). Only once the whole file is read
+    are they COPYed into a temporary staging table and merged into crm_deals with a
+    single INSERT ... SELECT, in one short transaction, so a slow upload never holds
+    a connection or locks.
+    Rows are deduplicated by normalized email/phone, both within the file and against
+    the tenant's existing deals (duplicates are skipped, not updated).
+    """
+    rows = iter_csv_rows(iter_lines(chunks)) if fmt == "csv" else iter_ndjson_rows(iter_lines(chunks))
+
+    total = invalid = duplicates = staged = 0
+    seen_emails: Set[str] = set()
+    seen_phones: Set[str] = set()
+
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY, mode="w+", encoding="utf-8") as spool:
+        try:
+            async for row_number, row in rows:
+                total += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    deal = DealBase(**_clean(row))
+                except (ValidationError, ValueError, TypeError) as e:
+                    invalid += 1
+                    if invalid <= IMPORT_MAX_REPORTED_ERRORS:
+                        yield {"type": "error", "row": row_number, "errors": _row_errors(e)}
+                    continue
+
+                record = _staging_record(deal)
+                email_key, phone_key = record[2], record[4]
+                if (email_key and email_key in seen_emails) or (phone_key and phone_key in seen_phones):
+                    duplicates += 1
+                    continue
+                if email_key:
+                    seen_emails.add(email_key)
+                if phone_key:
+                    seen_phones.add(phone_key)
+
+                spool.write(json.dumps(record) + "\n")
+                staged += 1
+                if staged % IMPORT_BATCH_ROWS == 0:
+                    yield {"type": "progress", "rows": total, "staged": staged, "invalid": invalid, "duplicates": duplicates}
+
+            spool.seek(0)
+            inserted = await _copy_and_merge(user_id, spool)
+        except Exception as e:
+            metrics.incr("deals.import.failed")
+            logger.error(f"Deal import failed for user {user_id}: {str(e)}")
+            yield {"type": "failed", "detail": "Import failed; no deals were created", "rows": total}
+            return
+
+    duplicates += staged - inserted
+    metrics.incr("deals.import.rows", inserted)
+    logger.info(f"Imported {inserted} deals for user {user_id} ({total} rows, {invalid} invalid, {duplicates} duplicates)")
+    yield {
+        "type": "done",
+        "rows": total,
+        "inserted": inserted,
+        "invalid": invalid,
+        "duplicates": duplicates,
+    }
@@ -0,0 +1,186 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+# Same thresholds SYSTEM_PROMPT gives the model
+HIGH_PRIORITY_VALUE = 10000
+MEDIUM_PRIORITY_VALUE = 5000
+
+CPF_RE = re.compile(r"(?<![\d./-])(\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?![\d./-]*\d)")
+CNPJ_RE = re.compile(r"(?<![\d./-])(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})(?![\d./-]*\d)")
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# DDD (area code) required; mobile numbers have a leading 9
+PHONE_RE = re.compile(
+    r"(?<!\d)(?P<country>\+?55[\s.-]?)?(?P<open>\()?(?P<ddd>[1-9][0-9])(?(open)\))[\s.-]?"
+    r"(?P<first>9?\d{4})(?P<sep>[\s.-]?)(?P<last>\d{4})(?!\d)"
+)
+# A bare run of digits is only a phone when labeled as one (policy/document numbers aren't)
+PHONE_LABEL_RE = re.compile(r"\b(?:tel|telefone|fone|celular|cel|whats\s*app)\b[^\n\d]{0,15}$")
+# Currency marker (group 1, folded to lowercase) and the whole amount (group 2); see parse_brl
+MONEY = r"(r\$\s*)?(\d[\d.,]*\d|\d)"
+BRL_DECIMAL_RE = re.compile(r"\d{1,3}(?:\.\d{3})*,\d{2}|\d+,\d{2}")
+DOT_DECIMAL_RE = re.compile(r"\d+\.\d{2}")
+BRL_INTEGER_RE = re.compile(r"\d{1,3}(?:\.\d{3})+|\d+")
+# Patterns run on accent-folded, lowercased text
+PREMIUM_RE = re.compile(r"premio\s+(?:total|liquido\s+total)[^\d\n]{0,40}?" + MONEY)
+INSURED_VALUE_RE = re.compile(r"importancia\s+segurada[^\d\n]{0,40}?" + MONEY)
+NAME_RE = re.compile(r"(?:nome\s+do\s+)?(?:segurado|proponente|estipulante)(?:\(a\))?\s*[:\-]\s*([^\n\d]{3,80})")
+# Where a name captured on a form line ends (next label or column gap)
+NAME_END_RE = re.compile(r"\s{2,}|\t|\s+(?:cpf|cnpj|rg|e-?mail|tel|telefone|celular|data)\b")
+
+@dataclass
+class LocalExtraction:
+    """Fields found by the regex extractor. `confident` means the LLM call can be skipped."""
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    value: Optional[float] = None
+    priority: Optional[str] = None
+    cpf: Optional[str] = None
+    cnpj: Optional[str] = None
+    # Phone written like one ("(11) ...", "...-4321", "+55 ..."), not just labeled digits
+    phone_formatted: bool = False
+    found: List[str] = field(default_factory=list)
+
+    @property
+    def confident(self) -> bool:
+        return bool(self.name and self.value is not None and (self.email or self.phone_formatted))
+
+    def fill_missing(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of an AI result with its null fields taken from this extraction."""
+        merged = dict(result)
+        for key, value in self.result().items():
+            if merged.get(key) is None and value is not None:
+                merged[key] = value
+        return merged
+
+    def result(self) -> Dict[str, Any]:
+        """Same shape as the AI extraction result."""
+        return {
+            "name": self.name,
+            "email": self.email,
+            "phone": self.phone,
+            "value": self.value,
+            "priority": self.priority,
+        }
+
+def _fold(text: str) -> str:
+    """Lowercase, accents removed; keeps string length so offsets map back to the original."""
+    return "".join(
+        unicodedata.normalize("NFKD", ch).encode("ascii", "ignore").decode("ascii")[:1] or ch
+        for ch in text
+    ).lower()
+
+def _digits(value: str) -> str:
+    return re.sub(r"\D", "", value)
+
+def is_valid_cpf(value: str) -> bool:
+    digits = _digits(value)
+    if len(digits) != 11 or digits == digits[0] * 11:
+        return False
+    for length in (9, 10):
+        total = sum(int(d) * w for d, w in zip(digits[:length], range(length + 1, 1, -1)))
+        check = (total * 10) % 11 % 10
+        if check != int(digits[length]):
+            return False
+    return True
+
+def is_valid_cnpj(value: str) -> bool:
+    digits = _digits(value)
+    if len(digits) != 14 or digits == digits[0] * 14:
+        return False
+    weights = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    for length in (12, 13):
+        w = weights if length == 12 else [6] + weights
+        total = sum(int(d) * k for d, k in zip(digits[:length], w))
+        check = 0 if total % 11 < 2 else 11 - total % 11
+        if check != int(digits[length]):
+            return False
+    return True
+
+def parse_brl(value: str, currency: bool = False) -> Optional[float]:
+    """
+    '1.234,56' -> 1234.56 (also accepts '1234.56'). Amounts without a two-digit
+    decimal part are only taken after 'R$' (`currency`): 'R$ 1.234' -> 1234.0,
+    while a bare '1.234' (thousands or decimals?) gives None.
+    """
+    if BRL_DECIMAL_RE.fullmatch(value):
+        return float(value.replace(".", "").replace(",", "."))
+    if DOT_DECIMAL_RE.fullmatch(value):
+        return float(value)
+    if currency and BRL_INTEGER_RE.fullmatch(value):
+        return float(value.replace(".", ""))
+    return None
+
+def priority_for_value(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    if value > HIGH_PRIORITY_VALUE:
+        return "high"
+    if value > MEDIUM_PRIORITY_VALUE:
+        return "medium"
+    return "low"
+
+def extract_local(text: str) -> LocalExtraction:
+    """
+    Deterministic extraction of CPF/CNPJ, e-mail, Brazilian phone (with DDD),
+    insured name and "Prêmio Total" from policy text. Cheap enough to run on every document.
+    """
+    found = LocalExtraction()
+    folded = _fold(text)
+    # Document numbers are excluded from phone matching
+    taken = []
+
+    for match in CNPJ_RE.finditer(text):
+        if is_valid_cnpj(match.group(1)):
+            found.cnpj = found.cnpj or _digits(match.group(1))
+            taken.append(match.span(1))
+    for match in CPF_RE.finditer(text):
+        if is_valid_cpf(match.group(1)):
+            found.cpf = found.cpf or _digits(match.group(1))
+            taken.append(match.span(1))
+
+    email = EMAIL_RE.search(text)
+    if email:
+        found.email = email.group(0).lower()
+
+    for match in PHONE_RE.finditer(text):
+        start, end = match.span()
+        if any(start < t_end and t_start < end for t_start, t_end in taken):
+            continue
+        formatted = bool(
+            match.group("open") or match.group("sep") == "-" or (match.group("country") or "").startswith("+")
+        )
+        line_start = folded.rfind("\n", 0, start) + 1
+        if not formatted and not PHONE_LABEL_RE.search(folded, line_start, start):
+            continue
+        found.phone = f"({match.group('ddd')}) {match.group('first')}-{match.group('last')}"
+        found.phone_formatted = formatted
+        break
+
+    for pattern in (PREMIUM_RE, INSURED_VALUE_RE):
+        match = pattern.search(folded)
+        if match:
+            found.value = parse_brl(match.group(2), currency=match.group(1) is not None)
+            if found.value is not None:
+                break
+    found.priority = priority_for_value(found.value)
+
+    match = NAME_RE.search(folded)
+    if match:
+        start, end = match.span(1)
+        cut = NAME_END_RE.search(folded, start, end)
+        if cut:
+            end = cut.start()
+        # Take the name from the original text (offsets match, accents preserved)
+        name = text[start:end].strip(" \t:-/")
+        if name:
+            found.name = " ".join(name.split())
+
+    found.found = [k for k, v in found.result().items() if v is not None]
+    if found.cpf:
+        found.found.append("cpf")
+    if found.cnpj:
+        found.found.append("cnpj")
+    return found
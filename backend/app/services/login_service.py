@@ -0,0 +1,169 @@
+import os
+import hmac
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import httpx
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache import TTLCache, broadcast_invalidation, register_invalidation_handler
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.core.security import pwd_context
+from app.models.credential import LoginCredential
+from app.services.chatwoot_service import sign_in
+
+logger = logging.getLogger(__name__)
+
+# A local credential is trusted this long after the last successful Chatwoot sign-in;
+# after that, the next login goes upstream again (and refreshes it).
+LOGIN_CREDENTIAL_MAX_AGE = timedelta(hours=float(os.getenv("LOGIN_CREDENTIAL_MAX_AGE_HOURS", "24")))
+# When Chatwoot is unreachable, older credentials are still accepted up to this age
+LOGIN_OFFLINE_MAX_AGE = timedelta(hours=float(os.getenv("LOGIN_OFFLINE_MAX_AGE_HOURS", "168")))
+# Upper bound for the whole upstream sign-in (connect + response)
+LOGIN_UPSTREAM_TIMEOUT = float(os.getenv("LOGIN_UPSTREAM_TIMEOUT", "5"))
+LOGIN_CACHE_TTL = float(os.getenv("LOGIN_CACHE_TTL", "300"))
+LOGIN_CACHE_MAXSIZE = int(os.getenv("LOGIN_CACHE_MAXSIZE", "10000"))
+
+# Warm path: email -> (HMAC(email, password), user). The HMAC key is random per
+# process and never leaves memory, so entries can't be brute-forced offline like
+# a plain hash, and checking one costs microseconds instead of a bcrypt round.
+_PROCESS_KEY = secrets.token_bytes(32)
+_verified = TTLCache(maxsize=LOGIN_CACHE_MAXSIZE, ttl=LOGIN_CACHE_TTL)
+
+class InvalidCredentials(Exception):
+    pass
+
+class AuthUnavailable(Exception):
+    """Chatwoot is unreachable and there is no usable local credential."""
+    pass
+
+def normalize_login(email: str) -> str:
+    return email.strip().lower()
+
+def _digest(email: str, password: str) -> bytes:
+    return hmac.new(_PROCESS_KEY, f"{email}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+def user_from_credential(credential: LoginCredential) -> dict:
+    return {"email": credential.email, "id": credential.chatwoot_user_id, "name": credential.name}
+
+def _remember(email: str, password: str, user: dict, verified_at: datetime):
+    # Never outlive the credential itself
+    ttl = min(LOGIN_CACHE_TTL, (verified_at + LOGIN_CREDENTIAL_MAX_AGE - datetime.now(timezone.utc)).total_seconds())
+    if ttl > 0:
+        _verified.set(email, (_digest(email, password), user), ttl=ttl)
+
+async def _verify_hash(password: str, password_hash: str) -> bool:
+    # bcrypt is deliberately slow: keep it off the event loop
+    return await run_in_threadpool(pwd_context.verify, password, password_hash)
+
+async def get_credential(email: str) -> Optional[LoginCredential]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(LoginCredential).where(LoginCredential.email == normalize_login(email)))
+        return result.scalars().first()
+
+async def _store_credential(email: str, password: str, user_data: dict) -> LoginCredential:
+    password_hash = await run_in_threadpool(pwd_context.hash, password)
+    now = datetime.now(timezone.utc)
+    values = {
+        "email": email,
+        "password_hash": password_hash,
+        "chatwoot_user_id": user_data.get("id"),
+        "name": user_data.get("name"),
+        "verified_at": now,
+    }
+    stmt = insert(LoginCredential).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LoginCredential.email],
+        set_={**{k: stmt.excluded[k] for k in values if k != "email"}, "updated_at": now},
+    ).returning(LoginCredential)
+    async with AsyncSessionLocal() as db:
+        credential = (await db.execute(stmt)).scalars().one()
+        await db.commit()
+    return credential
+
+async def forget_credential(email: str):
+    """Drops the local credential (e.g. Chatwoot rejected the password) in every process."""
+    email = normalize_login(email)
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(LoginCredential).where(LoginCredential.email == email))
+        await db.commit()
+    await broadcast_invalidation("logins", email=email)
+
+async def authenticate(email: str, password: str) -> dict:
+    """
+    Verifies a login and returns {"email", "id", "name"} (id = Chatwoot user id).
+
+    1. Memory: same email/password verified recently in this process.
+    2. Local credential (bcrypt) verified against Chatwoot within LOGIN_CREDENTIAL_MAX_AGE.
+    3. Chatwoot sign_in (bounded by LOGIN_UPSTREAM_TIMEOUT); refreshes the local credential.
+       If Chatwoot is unreachable, a credential up to LOGIN_OFFLINE_MAX_AGE is accepted.
+
+    Raises InvalidCredentials or AuthUnavailable.
+    """
+    email = normalize_login(email)
+    cached = _verified.get(email)
+    if cached is not None and hmac.compare_digest(cached[0], _digest(email, password)):
+        metrics.incr("auth.login", source="memory")
+        return cached[1]
+
+    credential = await get_credential(email)
+    age = datetime.now(timezone.utc) - credential.verified_at if credential is not None else None
+    password_ok = None  # bcrypt result, computed at most once
+
+    if credential is not None and age < LOGIN_CREDENTIAL_MAX_AGE:
+        password_ok = await _verify_hash(password, credential.password_hash)
+        if password_ok:
+            user = user_from_credential(credential)
+            _remember(email, password, user, credential.verified_at)
+            metrics.incr("auth.login", source="local")
+            return user
+        # Wrong password for the stored hash: it may have changed in Chatwoot, so ask upstream
+
+    try:
+        response = await sign_in(email, password, timeout=LOGIN_UPSTREAM_TIMEOUT)
+    except httpx.RequestError as exc:
+        logger.warning(f"Connection error to Chatwoot during login: {exc}")
+        if credential is not None and age < LOGIN_OFFLINE_MAX_AGE:
+            if password_ok is None:
+                password_ok = await _verify_hash(password, credential.password_hash)
+            if password_ok:
+                metrics.incr("auth.login", source="offline")
+                return user_from_credential(credential)
+        metrics.incr("auth.login.errors", reason="unavailable")
+        raise AuthUnavailable(str(exc))
+
+    if response.status_code != 200:
+        if credential is not None and response.status_code == 401:
+            # Chatwoot rejects a password we hold a hash for (changed or revoked upstream):
+            # drop it so neither the local nor the offline path accepts it again
+            if password_ok is None:
+                password_ok = await _verify_hash(password, credential.password_hash)
+            if password_ok:
+                await forget_credential(email)
+        metrics.incr("auth.login.errors", reason="invalid")
+        raise InvalidCredentials()
+
+    user_data = response.json().get("data", {})
+    if user_data.get("id") is None:
+        logger.error("Chatwoot sign_in succeeded without a user id")
+        metrics.incr("auth.login.errors", reason="invalid")
+        raise InvalidCredentials()
+    credential = await _store_credential(email, password, user_data)
+    user = user_from_credential(credential)
+    _remember(email, password, user, credential.verified_at)
+    metrics.incr("auth.login", source="chatwoot")
+    return user
+
+def _on_invalidation(message: dict):
+    if message.get("email") is None:
+        _verified.clear()
+    else:
+        _verified.pop(message["email"])
+
+register_invalidation_handler("logins", _on_invalidation)
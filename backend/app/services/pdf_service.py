@@ -1,24 +1,143 @@
+import os
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(file_bytes: bytes) -> str:
+from app.services.ai_service import MAX_CONTEXT_CHARS
+
+# Pages searched for keywords before the budget is spent (0 disables prioritization)
+PDF_PRIORITY_SCAN_PAGES = int(os.getenv("PDF_PRIORITY_SCAN_PAGES", "30"))
+
+# Pages mentioning these (accent-insensitive) hold the fields the AI extracts
+PRIORITY_KEYWORDS = (
+    "premio total", "premio liquido", "importancia segurada", "segurado",
+    "proponente", "estipulante", "cpf", "cnpj", "e-mail", "telefone", "celular",
+)
+
+NO_TEXT_ERROR = "PDF sem camada de texto detectado. Por favor, envie um PDF pesquisável (não imagem/scanner)."
+
+@dataclass
+class PdfText:
+    """Extracted text plus stats for observability."""
+    text: str
+    page_count: int
+    pages_read: int
+    chars: int
+    truncated: bool
+    priority_pages: List[int] = field(default_factory=list)  # 0-based
+
+def _fold(text: str) -> str:
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+def _has_keywords(text: str) -> bool:
+    folded = _fold(text)
+    return any(keyword in folded for keyword in PRIORITY_KEYWORDS)
+
+@dataclass
+class PageSelection:
+    """Pages chosen for the context budget; `texts` are already trimmed to fit."""
+    texts: Dict[int, str]
+    priority_pages: List[int]
+    pages_read: int
+    trimmed: bool
+
+def select_pages(
+    get_text: Callable[[int], str],
+    page_count: int,
+    max_chars: int,
+    priority_scan_pages: int,
+) -> PageSelection:
     """
-    Extracts text from a PDF file (bytes).
-    Raises ValueError if no text is found (e.g. scanned image).
+    Picks pages for a `max_chars` budget, calling `get_text(n)` only for pages it needs.
+
+    Pages with policy keywords among the first `priority_scan_pages` come first,
+    then the rest in document order. The last page taken (the lowest priority one)
+    is trimmed to what is left of the budget, so joining the selection in document
+    order never pushes keyword pages out of it.
     """
+    read = {}
+
+    def page(number: int) -> str:
+        if number not in read:
+            read[number] = get_text(number)
+        return read[number]
+
+    priority_pages = []
+    priority_chars = 0
+    for number in range(min(priority_scan_pages, page_count)):
+        # Keyword pages alone already fill the budget: stop scanning
+        if priority_chars >= max_chars:
+            break
+        if _has_keywords(page(number)):
+            priority_pages.append(number)
+            priority_chars += len(read[number]) + 1
+    prioritized = set(priority_pages)
+    order = priority_pages + [n for n in range(page_count) if n not in prioritized]
+
+    texts = {}
+    chars = 0
+    trimmed = False
+    for number in order:
+        # One "\n" separator before every page but the first
+        room = max_chars - chars - (1 if texts else 0)
+        if room <= 0:
+            break
+        page_text = page(number)
+        if not page_text.strip():
+            continue
+        if len(page_text) > room:
+            page_text = page_text[:room]
+            trimmed = True
+        chars += len(page_text) + (1 if texts else 0)
+        texts[number] = page_text
+
+    return PageSelection(texts=texts, priority_pages=priority_pages, pages_read=len(read), trimmed=trimmed)
+
+def extract_pdf_text(
+    file_bytes: bytes,
+    max_chars: int = MAX_CONTEXT_CHARS,
+    priority_scan_pages: Optional[int] = None,
+) -> PdfText:
+    """
+    Extracts at most `max_chars` of text from a PDF (bytes), reading pages only
+    until the budget is spent.
+
+    Pages with policy keywords (premium, insured, CPF...) among the first
+    `priority_scan_pages` are taken first (see select_pages); the selected pages
+    are then joined in document order. Raises ValueError if no text is found
+    (e.g. scanned image).
+    """
+    if priority_scan_pages is None:
+        priority_scan_pages = PDF_PRIORITY_SCAN_PAGES
+
     try:
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        
-        doc.close()
-
-        if not text.strip():
-            raise ValueError("PDF sem camada de texto detectado. Por favor, envie um PDF pesquisável (não imagem/scanner).")
-        
-        return text
+        # The bytes are handed to MuPDF as-is (no BytesIO / bytearray copy)
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            page_count = doc.page_count
+            selection = select_pages(lambda n: doc[n].get_text(), page_count, max_chars, priority_scan_pages)
     except Exception as e:
-        # Re-raise known errors or wrap unknown ones
-        if "PDF sem camada" in str(e):
-            raise e
         raise ValueError(f"Erro ao processar PDF: {str(e)}")
+
+    text = "\n".join(selection.texts[n] for n in sorted(selection.texts))
+    truncated = selection.trimmed or selection.pages_read < page_count
+
+    if not text.strip():
+        raise ValueError(NO_TEXT_ERROR)
+
+    return PdfText(
+        text=text,
+        page_count=page_count,
+        pages_read=selection.pages_read,
+        chars=len(text),
+        truncated=truncated,
+        priority_pages=selection.priority_pages,
+    )
+
+def extract_text_from_pdf(file_bytes: bytes) -> str:
+    """
+    Extracts text from a PDF file (bytes), up to MAX_CONTEXT_CHARS.
+    Raises ValueError if no text is found (e.g. scanned image).
+    """
+    return extract_pdf_text(file_bytes).text
@@ -0,0 +1,101 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import broadcast_invalidation, register_invalidation_handler
+from app.models.stage import Stage
+
+logger = logging.getLogger(__name__)
+
+# Safety net in case an invalidation message is lost
+STAGE_CACHE_TTL = float(os.getenv("STAGE_CACHE_TTL", "300"))
+
+@dataclass(frozen=True)
+class StageInfo:
+    """Detached, read-only copy of a Stage row (safe to share across sessions)."""
+    id: int
+    name: str
+    slug: str
+    color: Optional[str]
+    order: Optional[int]
+    is_default: bool
+
+class StageRegistry:
+    """
+    In-memory snapshot of the pipeline stages with O(1) Chatwoot label -> slug resolution.
+    Labels match a stage by slug or by name, case-insensitively.
+    """
+
+    def __init__(self, stages: Iterable[StageInfo]):
+        self.stages: Tuple[StageInfo, ...] = tuple(stages)
+        self.loaded_at = time.monotonic()
+
+        self._by_label: Dict[str, str] = {}
+        # Slugs win over names when both match the same label
+        for stage in self.stages:
+            self._by_label.setdefault(stage.name.lower(), stage.slug)
+        for stage in self.stages:
+            self._by_label[stage.slug.lower()] = stage.slug
+
+        defaults = [s for s in self.stages if s.is_default]
+        self.default_slug = defaults[0].slug if defaults else "new"
+
+    def resolve_label(self, label: str) -> Optional[str]:
+        return self._by_label.get(label.lower())
+
+    def resolve_labels(self, labels: Iterable[str]) -> Optional[str]:
+        """Slug of the first label that maps to a stage."""
+        for label in labels:
+            slug = self.resolve_label(label)
+            if slug:
+                return slug
+        return None
+
+    def is_expired(self) -> bool:
+        return time.monotonic() - self.loaded_at > STAGE_CACHE_TTL
+
+_registry: Optional[StageRegistry] = None
+_generation = 0
+_load_lock = asyncio.Lock()
+
+async def get_stage_registry(db: AsyncSession) -> StageRegistry:
+    """Returns the cached registry, loading it from the database on first use or after invalidation."""
+    global _registry
+    registry = _registry
+    if registry is not None and not registry.is_expired():
+        return registry
+
+    async with _load_lock:
+        if _registry is not None and not _registry.is_expired():
+            return _registry
+
+        generation = _generation
+        result = await db.execute(select(Stage).order_by(Stage.order, Stage.id))
+        registry = StageRegistry(
+            StageInfo(
+                id=s.id, name=s.name, slug=s.slug, color=s.color,
+                order=s.order, is_default=bool(s.is_default),
+            )
+            for s in result.scalars().all()
+        )
+        # Don't publish a snapshot that was invalidated while it was being loaded
+        if generation == _generation:
+            _registry = registry
+        return registry
+
+def invalidate_stage_registry(message: Optional[dict] = None):
+    global _registry, _generation
+    _registry = None
+    _generation += 1
+
+async def publish_stage_change():
+    """Call after any write to crm_stages: drops the registry in every process."""
+    await broadcast_invalidation("stages")
+
+register_invalidation_handler("stages", invalidate_stage_registry)
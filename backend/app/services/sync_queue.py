@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from tenacity import AsyncRetrying, RetryError, retry_if_exception_type, stop_after_attempt, wait_exponential
+import httpx
+
+from app.core.cache import TTLCache
+from app.core.database import AsyncSessionLocal
+from app.core.metrics import metrics
+from app.models.deal import Deal
+from app.models.settings import UserSettings
+from app.services.chatwoot_service import ChatwootService, ChatwootTransientError
+
+logger = logging.getLogger(__name__)
+
+SYNC_DEBOUNCE_SECONDS = float(os.getenv("CHATWOOT_SYNC_DEBOUNCE", "2"))
+SYNC_WORKERS = int(os.getenv("CHATWOOT_SYNC_WORKERS", "4"))
+SYNC_MAX_ATTEMPTS = int(os.getenv("CHATWOOT_SYNC_MAX_ATTEMPTS", "4"))
+# Chatwoot HTTP requests per second per tenant (a sync makes several: lookup, labels, attributes)
+SYNC_TENANT_RATE = float(os.getenv("CHATWOOT_SYNC_TENANT_RATE", "5"))
+SYNC_TENANT_BURST = int(os.getenv("CHATWOOT_SYNC_TENANT_BURST", "10"))
+# Buckets idle this long are dropped (a new one starts full, as the old one would be by then)
+SYNC_BUCKET_IDLE_SECONDS = float(os.getenv("CHATWOOT_SYNC_BUCKET_IDLE", "300"))
+SYNC_BUCKET_MAXSIZE = int(os.getenv("CHATWOOT_SYNC_BUCKET_MAXSIZE", "10000"))
+
+class TokenBucket:
+    """Async token bucket: acquire() waits until a token is available."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ChatwootSyncQueue:
+    """
+    Coalescing, debounced reverse-sync of deal status to Chatwoot.
+
+    - enqueue(deal_id) (re)starts a per-deal debounce timer; only the state of the
+      deal when the timer fires is synced, so dragging a card across three columns
+      costs one sync (last write wins).
+    - A bounded pool of workers runs the syncs. No DB connection is held during the
+      HTTP calls: the deal is loaded in one short session, discovered Chatwoot ids
+      are written in another.
+    - Transient failures (connection errors, 429/5xx) are retried with exponential
+      backoff (tenacity); permanent ones (contact not found, 4xx) are not.
+    - Chatwoot HTTP requests are rate limited per tenant (user_id): the bucket is
+      handed to ChatwootService, which takes one token per request.
+
+    The queue is per process: a change made while the same deal is syncing is
+    re-queued once that sync finishes.
+    """
+
+    def __init__(self, debounce: float = SYNC_DEBOUNCE_SECONDS, workers: int = SYNC_WORKERS):
+        self.debounce = debounce
+        self.worker_count = workers
+        self._queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._in_flight: Set[int] = set()
+        self._rerun: Set[int] = set()
+        self._buckets = TTLCache(maxsize=SYNC_BUCKET_MAXSIZE, ttl=SYNC_BUCKET_IDLE_SECONDS)
+        self._workers: List[asyncio.Task] = []
+
+    def enqueue(self, deal_id: int):
+        if deal_id in self._in_flight:
+            self._rerun.add(deal_id)
+            return
+
+        timer = self._timers.pop(deal_id, None)
+        if timer is not None:
+            timer.cancel()
+            metrics.incr("chatwoot_sync.coalesced")
+
+        loop = asyncio.get_running_loop()
+        self._timers[deal_id] = loop.call_later(self.debounce, self._release, deal_id)
+
+    def enqueue_many(self, deal_ids):
+        for deal_id in deal_ids:
+            self.enqueue(deal_id)
+
+    def _release(self, deal_id: int):
+        self._timers.pop(deal_id, None)
+        self._queue.put_nowait(deal_id)
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self, timeout: float = 10.0):
+        """Flushes pending (debounced) syncs, waits up to `timeout` for them, then stops the workers."""
+        for deal_id, timer in list(self._timers.items()):
+            timer.cancel()
+            self._release(deal_id)
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping Chatwoot sync queue with {self._queue.qsize()} syncs pending")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self):
+        while True:
+            deal_id = await self._queue.get()
+            self._in_flight.add(deal_id)
+            try:
+                await self._sync(deal_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reverse Sync Error for Deal {deal_id}: {e}")
+            finally:
+                self._in_flight.discard(deal_id)
+                self._queue.task_done()
+                if deal_id in self._rerun:
+                    self._rerun.discard(deal_id)
+                    self.enqueue(deal_id)
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(SYNC_TENANT_RATE, SYNC_TENANT_BURST)
+        # Re-set on every use: the TTL counts from the last sync, not the first
+        self._buckets.set(user_id, bucket)
+        return bucket
+
+    async def _load(self, deal_id: int) -> Optional[Tuple[Deal, UserSettings]]:
+        async with AsyncSessionLocal() as db:
+            deal = await db.get(Deal, deal_id)
+            if not deal:
+                return None
+
+            result = await db.execute(select(UserSettings).where(UserSettings.user_id == deal.user_id))
+            settings = result.scalars().first()
+            if not settings or not settings.chatwoot_account_id:
+                logger.warning("Chatwoot settings not configured for user. Skipping sync.")
+                return None
+            return deal, settings
+
+    async def _sync(self, deal_id: int):
+        loaded = await self._load(deal_id)
+        if loaded is None:
+            return
+        deal, settings = loaded
+        known_ids = (deal.chatwoot_contact_id, deal.last_conversation_id)
+        service = ChatwootService(settings, rate_limiter=self._bucket(deal.user_id))
+
+        try:
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(SYNC_MAX_ATTEMPTS),
+                wait=wait_exponential(multiplier=1, min=1, max=30),
+                retry=retry_if_exception_type((httpx.RequestError, ChatwootTransientError)),
+            ):
+                with attempt:
+                    synced = await service.sync_status_to_chatwoot(deal)
+        except RetryError as e:
+            synced = False
+            logger.error(
+                f"Giving up Chatwoot sync for Deal {deal_id} after {SYNC_MAX_ATTEMPTS} attempts: "
+                f"{e.last_attempt.exception()}"
+            )
+
+        metrics.incr("chatwoot_sync.succeeded" if synced else "chatwoot_sync.failed")
+
+        # Persist Chatwoot ids discovered/refreshed during the sync
+        if (deal.chatwoot_contact_id, deal.last_conversation_id) != known_ids:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Deal)
+                    .where(Deal.id == deal_id)
+                    .values(chatwoot_contact_id=deal.chatwoot_contact_id, last_conversation_id=deal.last_conversation_id)
+                )
+                await db.commit()
+
+sync_queue: Optional[ChatwootSyncQueue] = None
+
+def get_sync_queue() -> ChatwootSyncQueue:
+    global sync_queue
+    if sync_queue is None:
+        sync_queue = ChatwootSyncQueue()
+    return sync_queue
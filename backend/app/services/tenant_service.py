@@ -0,0 +1,88 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache, broadcast_invalidation, register_invalidation_handler
+from app.models.settings import UserSettings
+
+logger = logging.getLogger(__name__)
+
+TENANT_CACHE_TTL = float(os.getenv("TENANT_CACHE_TTL", "300"))
+TENANT_CACHE_NEGATIVE_TTL = float(os.getenv("TENANT_CACHE_NEGATIVE_TTL", "30"))
+TENANT_CACHE_MAXSIZE = int(os.getenv("TENANT_CACHE_MAXSIZE", "4096"))
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """Immutable snapshot of the UserSettings fields needed on the webhook hot path."""
+    user_id: int
+    chatwoot_account_id: int
+    webhook_secret: Optional[str]
+    chatwoot_url: Optional[str]
+    auto_create_opportunity: bool
+    require_interest_tag: bool
+
+    @classmethod
+    def from_settings(cls, settings: UserSettings) -> "TenantConfig":
+        return cls(
+            user_id=settings.user_id,
+            chatwoot_account_id=settings.chatwoot_account_id,
+            webhook_secret=settings.chatwoot_webhook_secret,
+            chatwoot_url=settings.chatwoot_url,
+            auto_create_opportunity=bool(settings.auto_create_opportunity),
+            require_interest_tag=bool(settings.require_interest_tag),
+        )
+
+# chatwoot_account_id -> TenantConfig, or None for accounts with no settings (negative cache)
+_tenants = TTLCache(maxsize=TENANT_CACHE_MAXSIZE, ttl=TENANT_CACHE_TTL)
+_MISS = object()
+
+async def get_tenant_by_account(db: AsyncSession, account_id: int) -> Optional[TenantConfig]:
+    """
+    Resolves a Chatwoot account to its tenant config.
+    Served from memory after the first lookup; hits the database only on miss/expiry.
+    """
+    account_id = int(account_id)
+    cached = _tenants.get(account_id, _MISS)
+    if cached is not _MISS:
+        return cached
+
+    result = await db.execute(
+        select(UserSettings).where(UserSettings.chatwoot_account_id == account_id)
+    )
+    settings = result.scalars().first()
+
+    if settings is None:
+        _tenants.set(account_id, None, ttl=TENANT_CACHE_NEGATIVE_TTL)
+        return None
+
+    tenant = TenantConfig.from_settings(settings)
+    _tenants.set(account_id, tenant)
+    return tenant
+
+def invalidate_tenant(user_id: Optional[int] = None, account_id: Optional[int] = None):
+    """
+    Drops local cached tenant entries (use publish_tenant_change() after writes).
+    Negative entries are dropped too, since the write may have just linked an account.
+    """
+    if account_id is not None:
+        _tenants.pop(int(account_id))
+    removed = _tenants.pop_where(
+        lambda _, tenant: tenant is None or (user_id is not None and tenant.user_id == user_id)
+    )
+    logger.debug(f"Invalidated tenant cache (user={user_id}, account={account_id}, entries={removed})")
+
+async def publish_tenant_change(user_id: Optional[int] = None, account_id: Optional[int] = None):
+    """Call after any UserSettings write: invalidates the tenant in every process."""
+    await broadcast_invalidation("tenants", user_id=user_id, account_id=account_id)
+
+def _on_invalidation(message: dict):
+    if message.get("user_id") is None and message.get("account_id") is None:
+        _tenants.clear()
+    else:
+        invalidate_tenant(message.get("user_id"), message.get("account_id"))
+
+register_invalidation_handler("tenants", _on_invalidation)
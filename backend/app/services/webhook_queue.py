@@ -0,0 +1,104 @@
+import os
+import time
+import zlib
+import hashlib
+from typing import Optional
+
+# Redis Streams layout for Chatwoot webhook ingestion.
+# Events are sharded by conversation so that a single consumer owns every event
+# of a given conversation and can apply them in arrival order.
+WEBHOOK_STREAM_PREFIX = os.getenv("WEBHOOK_STREAM_PREFIX", "chatwoot:events")
+WEBHOOK_STREAM_SHARDS = int(os.getenv("WEBHOOK_STREAM_SHARDS", "4"))
+WEBHOOK_STREAM_MAXLEN = int(os.getenv("WEBHOOK_STREAM_MAXLEN", "100000"))  # approximate trim per shard
+WEBHOOK_CONSUMER_GROUP = os.getenv("WEBHOOK_CONSUMER_GROUP", "webhook-workers")
+DEAD_LETTER_STREAM = f"{WEBHOOK_STREAM_PREFIX}:dead"
+STATS_HASH = f"{WEBHOOK_STREAM_PREFIX}:stats"
+DEDUP_TTL = int(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))  # seconds a delivered event id is remembered
+
+# Atomic "dedup + enqueue" in one round-trip:
+# SET NX EX the event id; only if it was not seen before, XADD the event.
+# Duplicates are counted in STATS_HASH so the total is shared across workers.
+ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+    return redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(ARGV, 3))
+end
+redis.call('HINCRBY', KEYS[3], 'duplicates', 1)
+return false
+"""
+
+def stream_name(shard: int) -> str:
+    return f"{WEBHOOK_STREAM_PREFIX}:{shard}"
+
+def ordering_key(payload: dict) -> str:
+    """
+    Key that must be processed in order: the conversation for conversation/message
+    events, the contact for contact events, the account otherwise.
+    """
+    event_type = payload.get("event")
+    account_id = payload.get("account", {}).get("id")
+
+    if event_type == "conversation_updated":
+        conversation_id = payload.get("data", {}).get("conversation", {}).get("id") or payload.get("id")
+        if conversation_id:
+            return f"{account_id}:conversation:{conversation_id}"
+    elif event_type == "message_created":
+        conversation_id = payload.get("conversation", {}).get("id")
+        if conversation_id:
+            return f"{account_id}:conversation:{conversation_id}"
+    elif event_type == "contact_created":
+        contact_id = payload.get("data", {}).get("contact", {}).get("id") or payload.get("id")
+        if contact_id:
+            return f"{account_id}:contact:{contact_id}"
+
+    return f"{account_id}:account"
+
+def shard_for(key: str) -> int:
+    # crc32 is stable across processes (unlike hash() with PYTHONHASHSEED)
+    return zlib.crc32(key.encode()) % WEBHOOK_STREAM_SHARDS
+
+def event_id(payload: dict, body: bytes) -> str:
+    """
+    Identity of a webhook delivery for deduplication.
+    message_created / contact_created carry the message / contact id. Other events
+    (e.g. conversation_updated) have no event id, so the body digest is used:
+    Chatwoot retries resend the same body, while real changes differ.
+    """
+    event_type = payload.get("event") or "unknown"
+    account_id = payload.get("account", {}).get("id")
+
+    if event_type in ("message_created", "contact_created") and payload.get("id"):
+        return f"{account_id}:{event_type}:{payload['id']}"
+    return f"{account_id}:{event_type}:{hashlib.sha256(body).hexdigest()}"
+
+def dedup_key(payload: dict, body: bytes) -> str:
+    return f"dedup:chatwoot:{event_id(payload, body)}"
+
+def build_entry(body: bytes, payload: dict) -> tuple:
+    """Returns (stream, fields) for XADD. The raw body is kept as received."""
+    key = ordering_key(payload)
+    fields = {
+        "key": key,
+        "event": payload.get("event") or "",
+        "account_id": str(payload.get("account", {}).get("id") or ""),
+        "body": body,
+        "received_at": str(time.time()),
+    }
+    return stream_name(shard_for(key)), fields
+
+async def enqueue_event(redis, body: bytes, payload: dict) -> Optional[str]:
+    """
+    Deduplicates and enqueues a verified webhook atomically.
+    Returns the stream entry id, or None if the event was already received.
+    """
+    stream, fields = build_entry(body, payload)
+    args = [DEDUP_TTL, WEBHOOK_STREAM_MAXLEN]
+    for name, value in fields.items():
+        args.extend([name, value])
+    return await redis.eval(ENQUEUE_SCRIPT, 3, dedup_key(payload, body), stream, STATS_HASH, *args)
+
+def dead_letter_fields(fields: dict, error: Optional[str], attempts: int) -> dict:
+    dead = dict(fields)
+    dead["error"] = (error or "")[:2000]
+    dead["attempts"] = str(attempts)
+    dead["failed_at"] = str(time.time())
+    return dead
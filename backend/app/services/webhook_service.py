@@ -0,0 +1,158 @@
+import logging
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.normalization import normalize_email, normalize_phone
+from app.models.deal import Deal
+from app.services.analytics_service import StageChange, record_stage_changes
+from app.services.stage_registry import get_stage_registry
+from app.services.tenant_service import get_tenant_by_account
+
+logger = logging.getLogger(__name__)
+
+async def process_event(payload: dict, db: AsyncSession) -> dict:
+    """
+    Applies a verified Chatwoot webhook payload to the CRM.
+    Shared by the webhook router (inline fallback) and the stream worker.
+    Events handled:
+    - contact_created: Creates a new Deal (Lead)
+    - conversation_updated / message_created: updates deal stage based on labels
+    """
+    event_type = payload.get("event")
+    account_id = payload.get("account", {}).get("id")
+
+    if event_type == "contact_created":
+        return await handle_contact_created(payload, db, account_id)
+
+    elif event_type == "conversation_updated" or event_type == "message_created":
+        return await handle_conversation_updated(payload, db, account_id)
+
+    return {"status": "ignored", "reason": "unhandled_event"}
+
+async def find_deal_by_contact(db: AsyncSession, user_id: int, email: str = None, phone: str = None, contact_id: int = None):
+    """
+    Tenant-scoped deal lookup by Chatwoot contact id, normalized e-mail or E.164 phone.
+    Served by the (user_id, chatwoot_contact_id) / (user_id, email_normalized) /
+    (user_id, phone_e164) indexes.
+    """
+    conditions = []
+    if contact_id:
+        conditions.append(Deal.chatwoot_contact_id == int(contact_id))
+    email_normalized = normalize_email(email)
+    phone_e164 = normalize_phone(phone)
+    if email_normalized:
+        conditions.append(Deal.email_normalized == email_normalized)
+    if phone_e164:
+        conditions.append(Deal.phone_e164 == phone_e164)
+    if not conditions:
+        return None
+
+    result = await db.execute(
+        select(Deal).where(Deal.user_id == user_id, or_(*conditions)).order_by(Deal.id).limit(1)
+    )
+    return result.scalars().first()
+
+async def handle_contact_created(payload, db: AsyncSession, chatwoot_account_id: int):
+    contact = payload.get("data", {}).get("contact", {})
+    name = contact.get("name", "Novo Lead Chatwoot")
+    email = contact.get("email")
+    phone = contact.get("phone_number")
+    
+    # DYNAMIC USER LOOKUP
+    tenant = await get_tenant_by_account(db, chatwoot_account_id)
+
+    if tenant:
+        target_user_id = tenant.user_id
+    else:
+        logger.warning(f"No user found for Chatwoot Account ID {chatwoot_account_id}. Skipping deal creation.")
+        # STRICT SECURITY: Do not fallback to admin for multi-tenant safety?
+        # User prompt says "Proibido usar user_id=1". So we SKIP if not found.
+        return {"status": "skipped", "reason": "user_not_found_for_account"}
+
+    # Check if deal exists
+    contact_id = contact.get("id")
+    existing_deal = await find_deal_by_contact(db, target_user_id, email, phone, contact_id)
+
+    if existing_deal:
+        if contact_id and existing_deal.chatwoot_contact_id != contact_id:
+            existing_deal.chatwoot_contact_id = contact_id
+            await db.commit()
+        return {"status": "skipped", "reason": "duplicate"}
+
+    # Create Deal
+    start_status = (await get_stage_registry(db)).default_slug
+
+    new_deal = Deal(
+        name=name,
+        email=email,
+        phone=phone,
+        value=0, # Default value
+        priority="medium",
+        status=start_status,
+        user_id=target_user_id,
+        chatwoot_contact_id=contact_id
+    )
+    db.add(new_deal)
+    await db.commit()
+    logger.info(f"Created Deal from Chatwoot: {name} assigned to User {target_user_id}")
+    return {"status": "success", "action": "created_deal", "id": new_deal.id}
+
+async def handle_conversation_updated(payload, db: AsyncSession, chatwoot_account_id: int):
+    # Logic: Look for labels in the conversation
+    conversation = payload.get("data", {}).get("conversation", {}) if payload.get("event") == "conversation_updated" else payload.get("conversation", {})
+    
+    if not conversation:
+        return {"status": "skipped", "reason": "no_conversation_data"}
+
+    labels = conversation.get("labels", [])
+    
+    registry = await get_stage_registry(db)
+    new_status = registry.resolve_labels(labels)
+
+    # Find deal by contact info
+    contact = conversation.get("contact_inbox", {}).get("contact", {})
+    email = contact.get("email")
+    phone = contact.get("phone_number")
+    contact_id = contact.get("id")
+    conversation_id = conversation.get("id")
+
+    if not email and not phone and not contact_id:
+         return {"status": "skipped", "reason": "no_contact_info"}
+
+    # SECURITY: Only match deals of the tenant that owns this Chatwoot account
+    tenant = await get_tenant_by_account(db, chatwoot_account_id) if chatwoot_account_id else None
+    if not tenant:
+        logger.warning(f"No user found for Chatwoot Account ID {chatwoot_account_id}. Skipping status update.")
+        return {"status": "skipped", "reason": "user_not_found_for_account"}
+
+    deal = await find_deal_by_contact(db, tenant.user_id, email, phone, contact_id)
+
+    if not deal:
+        return {"status": "skipped", "reason": "deal_not_found"}
+
+    # Remember Chatwoot ids so the reverse sync can skip its search calls
+    ids_changed = False
+    if contact_id and deal.chatwoot_contact_id != contact_id:
+        deal.chatwoot_contact_id = contact_id
+        ids_changed = True
+    if conversation_id and deal.last_conversation_id != conversation_id:
+        deal.last_conversation_id = conversation_id
+        ids_changed = True
+
+    if not new_status:
+        if ids_changed:
+            await db.commit()
+        return {"status": "skipped", "reason": "no_matching_labels"}
+
+    if deal.status != new_status:
+        await record_stage_changes(db, tenant.user_id, [StageChange(
+            deal.id, deal.status, new_status, deal.value, deal.created_at
+        )])
+        deal.status = new_status
+        await db.commit()
+        logger.info(f"Updated Deal {deal.name} status to {new_status}")
+        return {"status": "success", "action": "updated_status", "new_status": new_status}
+
+    if ids_changed:
+        await db.commit()
+    return {"status": "skipped", "reason": "same_status"}
@@ -0,0 +1,94 @@
+"""
+Re-encrypts the secrets stored in crm_settings with the primary key of the keyring.
+
+Run: python -m app.workers.reencrypt_secrets [--dry-run] [--encrypt-plaintext]
+
+Use after rotating keys (prepend the new key to ENCRYPTION_KEYS, keeping the old
+ones) or to migrate legacy Fernet / unversioned AES-GCM values to the current
+format. Once no row needs re-encryption, old keys can be removed from the ring.
+
+- Values already in the current format under the primary key are skipped.
+- Values that no key can decrypt are reported and left untouched, unless
+  --encrypt-plaintext is given for columns that may hold legacy plaintext
+  (chatwoot_api_key), in which case they are encrypted as-is.
+"""
+import argparse
+import logging
+
+from sqlalchemy import select
+
+from app.core.crypto import decrypt_secret, encrypt_secret, keyring, needs_reencryption
+from app.core.database import SessionLocal
+from app.models.settings import UserSettings
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# Encrypted UserSettings columns; True if legacy rows may hold plaintext
+SECRET_COLUMNS = {
+    "ai_api_key": False,
+    "chatwoot_user_token": False,
+    "chatwoot_api_key": True,
+}
+
+def reencrypt_all(dry_run: bool = False, encrypt_plaintext: bool = False) -> dict:
+    stats = {"rows": 0, "reencrypted": 0, "plaintext_encrypted": 0, "current": 0, "failed": 0}
+    last_id = 0
+
+    with SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(UserSettings).where(UserSettings.id > last_id).order_by(UserSettings.id).limit(BATCH_SIZE)
+            ).scalars().all()
+            if not rows:
+                break
+
+            for settings in rows:
+                stats["rows"] += 1
+                for column, may_be_plaintext in SECRET_COLUMNS.items():
+                    value = getattr(settings, column)
+                    if not value:
+                        continue
+                    if not needs_reencryption(value):
+                        stats["current"] += 1
+                        continue
+                    try:
+                        new_value = encrypt_secret(decrypt_secret(value))
+                        stats["reencrypted"] += 1
+                    except ValueError:
+                        if not (may_be_plaintext and encrypt_plaintext):
+                            logger.error(f"crm_settings.id={settings.id} {column}: cannot decrypt, left as is")
+                            stats["failed"] += 1
+                            continue
+                        new_value = encrypt_secret(value)
+                        stats["plaintext_encrypted"] += 1
+                    if not dry_run:
+                        setattr(settings, column, new_value)
+
+            last_id = rows[-1].id
+            if not dry_run:
+                db.commit()
+            # Drop this batch from the identity map
+            db.expunge_all()
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encrypt stored secrets with the primary encryption key.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument(
+        "--encrypt-plaintext", action="store_true",
+        help="encrypt legacy plaintext values in columns that may contain them"
+    )
+    args = parser.parse_args()
+
+    logger.info(f"Re-encrypting secrets with key '{keyring.primary_id}'{' (dry run)' if args.dry_run else ''}")
+    stats = reencrypt_all(dry_run=args.dry_run, encrypt_plaintext=args.encrypt_plaintext)
+    logger.info(f"Done: {stats}")
+    if stats["failed"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
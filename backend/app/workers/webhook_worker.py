@@ -0,0 +1,216 @@
+"""
+Chatwoot webhook stream worker.
+
+Consumes the Redis Streams filled by POST /webhooks/chatwoot and applies each
+event with webhook_service.process_event.
+
+Run: python -m app.workers.webhook_worker
+
+- Events of one conversation/contact share a shard and are applied in order.
+  Run ONE consumer per shard (WEBHOOK_WORKER_SHARDS, default: all shards) to
+  keep that guarantee; different shards can be spread across processes.
+- Failed events stay pending and are retried after WEBHOOK_RETRY_IDLE_MS; newer
+  events of the same conversation wait behind them.
+- After WEBHOOK_MAX_ATTEMPTS failures an event is moved to the dead-letter stream.
+- Redis errors don't stop the worker: it backs off (up to WEBHOOK_ERROR_BACKOFF_MAX
+  seconds) and resumes; a consumer group that went missing (NOGROUP) is recreated.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError, ResponseError
+
+from app.core.cache import listen_for_invalidations
+from app.core.database import AsyncSessionLocal, async_engine
+from app.core.redis import close_redis, get_redis
+from app.services.webhook_queue import (
+    DEAD_LETTER_STREAM,
+    WEBHOOK_CONSUMER_GROUP,
+    WEBHOOK_STREAM_PREFIX,
+    WEBHOOK_STREAM_SHARDS,
+    dead_letter_fields,
+    stream_name,
+)
+from app.services.webhook_service import process_event
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+BLOCK_MS = int(os.getenv("WEBHOOK_BLOCK_MS", "5000"))
+MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+RETRY_IDLE_MS = int(os.getenv("WEBHOOK_RETRY_IDLE_MS", "30000"))
+RECLAIM_INTERVAL = float(os.getenv("WEBHOOK_RECLAIM_INTERVAL", "10"))
+ERROR_BACKOFF_MAX = float(os.getenv("WEBHOOK_ERROR_BACKOFF_MAX", "30"))
+ATTEMPTS_HASH = f"{WEBHOOK_STREAM_PREFIX}:attempts"
+
+class WebhookWorker:
+    def __init__(self, redis: aioredis.Redis, shards: List[int], consumer: str):
+        self.redis = redis
+        self.streams = [stream_name(shard) for shard in shards]
+        self.consumer = consumer
+        # ordering key -> id of the failed entry every later entry of that key waits for
+        self.blocked: Dict[str, str] = {}
+        self._stopping = False
+
+    def stop(self):
+        logger.info("Stopping webhook worker after current batch...")
+        self._stopping = True
+
+    async def ensure_groups(self):
+        for stream in self.streams:
+            try:
+                await self.redis.xgroup_create(stream, WEBHOOK_CONSUMER_GROUP, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def run(self):
+        logger.info(f"Webhook worker {self.consumer} consuming {self.streams}")
+
+        groups_ready = False
+        last_reclaim = 0.0
+        backoff = 0.0
+        while not self._stopping:
+            try:
+                if not groups_ready:
+                    await self.ensure_groups()
+                    groups_ready = True
+
+                if time.monotonic() - last_reclaim >= RECLAIM_INTERVAL:
+                    await self.reclaim()
+                    last_reclaim = time.monotonic()
+
+                response = await self.redis.xreadgroup(
+                    WEBHOOK_CONSUMER_GROUP,
+                    self.consumer,
+                    {stream: ">" for stream in self.streams},
+                    count=BATCH_SIZE,
+                    block=BLOCK_MS,
+                )
+                for stream, entries in response or []:
+                    await self.process_batch(stream, entries)
+                backoff = 0.0
+            except RedisError as e:
+                if isinstance(e, ResponseError) and "NOGROUP" in str(e):
+                    # Stream or group deleted (e.g. Redis flushed): recreate before reading again
+                    logger.warning(f"Webhook consumer group missing, recreating: {e}")
+                    groups_ready = False
+                backoff = min(ERROR_BACKOFF_MAX, backoff * 2 or 1.0)
+                logger.error(f"Redis error in webhook worker, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+
+    async def reclaim(self):
+        """Takes over entries left pending (failed here, or owned by a dead consumer) for retry."""
+        for stream in self.streams:
+            start_id = "0-0"
+            while not self._stopping:
+                result = await self.redis.xautoclaim(
+                    stream,
+                    WEBHOOK_CONSUMER_GROUP,
+                    self.consumer,
+                    min_idle_time=RETRY_IDLE_MS,
+                    start_id=start_id,
+                    count=BATCH_SIZE,
+                )
+                start_id, entries = result[0], result[1]
+                # Entries trimmed from the stream while pending come back without fields
+                entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+                if entries:
+                    await self.process_batch(stream, entries)
+                if not entries or start_id == "0-0":
+                    break
+
+    async def process_batch(self, stream: str, entries: list):
+        """Runs different ordering keys concurrently and entries of the same key sequentially."""
+        groups: Dict[str, list] = {}
+        for entry_id, fields in entries:
+            groups.setdefault(fields.get("key", ""), []).append((entry_id, fields))
+
+        await asyncio.gather(*(
+            self.process_group(stream, key, items) for key, items in groups.items()
+        ))
+
+    async def process_group(self, stream: str, key: str, items: list):
+        for entry_id, fields in items:
+            head = self.blocked.get(key)
+            if head is not None and head != entry_id:
+                # An older event of this conversation is still failing; leave this one pending.
+                continue
+
+            if await self.handle(stream, entry_id, fields):
+                self.blocked.pop(key, None)
+            else:
+                self.blocked[key] = entry_id
+
+    async def handle(self, stream: str, entry_id: str, fields: dict) -> bool:
+        """Processes one entry. Returns True once it is done with (applied or dead-lettered)."""
+        try:
+            payload = json.loads(fields["body"])
+        except (KeyError, ValueError) as e:
+            await self.dead_letter(stream, entry_id, fields, f"Invalid payload: {e}", 1)
+            return True
+
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await process_event(payload, db)
+            logger.info(f"Processed {fields.get('event')} ({entry_id}) for {fields.get('key')}: {result}")
+            await self.ack(stream, entry_id)
+            return True
+        except Exception as e:
+            attempts = await self.redis.hincrby(ATTEMPTS_HASH, f"{stream}:{entry_id}", 1)
+            logger.error(f"Webhook event {entry_id} failed (attempt {attempts}/{MAX_ATTEMPTS}): {str(e)}")
+            if attempts >= MAX_ATTEMPTS:
+                await self.dead_letter(stream, entry_id, fields, str(e), attempts)
+                return True
+            return False
+
+    async def ack(self, stream: str, entry_id: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(stream, WEBHOOK_CONSUMER_GROUP, entry_id)
+            pipe.hdel(ATTEMPTS_HASH, f"{stream}:{entry_id}")
+            await pipe.execute()
+
+    async def dead_letter(self, stream: str, entry_id: str, fields: dict, error: Optional[str], attempts: int):
+        logger.error(f"Moving webhook event {entry_id} to {DEAD_LETTER_STREAM}: {error}")
+        dead = dead_letter_fields(fields, error, attempts)
+        dead["source_stream"] = stream
+        dead["source_id"] = entry_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(DEAD_LETTER_STREAM, dead)
+            pipe.xack(stream, WEBHOOK_CONSUMER_GROUP, entry_id)
+            pipe.hdel(ATTEMPTS_HASH, f"{stream}:{entry_id}")
+            await pipe.execute()
+
+def configured_shards() -> List[int]:
+    raw = os.getenv("WEBHOOK_WORKER_SHARDS", "").strip()
+    if not raw:
+        return list(range(WEBHOOK_STREAM_SHARDS))
+    return [int(s) for s in raw.split(",") if s.strip()]
+
+async def main():
+    consumer = os.getenv("WEBHOOK_WORKER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+    worker = WebhookWorker(get_redis(), configured_shards(), consumer)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    # Keep the stage/tenant caches in step with writes made through the API
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    try:
+        await worker.run()
+    finally:
+        invalidation_listener.cancel()
+        await close_redis()
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
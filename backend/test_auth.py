@@ -0,0 +1,85 @@
+"""
+Test script for bearer token verification and the decoded-claims cache.
+Run with: python -m pytest backend/test_auth.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from app.core.auth import get_current_claims, get_token_claims, invalidate_cached_tokens
+from app.core.security import create_access_token, create_refresh_token
+
+CLAIMS = {"sub": "ana@example.com", "uid": 7, "role": "admin"}
+
+def _request():
+    return SimpleNamespace(state=SimpleNamespace())
+
+def _rejected(token: str) -> bool:
+    try:
+        asyncio.run(get_current_claims(_request(), token))
+    except HTTPException as e:
+        assert e.status_code == 401
+        return True
+    return False
+
+def test_access_token_is_accepted_and_cached():
+    """Test that an access token authenticates, and the second check is served from cache."""
+    invalidate_cached_tokens()
+    token = create_access_token(CLAIMS)
+    request = _request()
+
+    claims = asyncio.run(get_current_claims(request, token))
+    assert claims["uid"] == 7
+    assert request.state.user_id == 7
+    assert get_token_claims(token) is claims  # same cached object
+    print("✅ Access token test PASSED")
+
+def test_refresh_token_is_rejected_even_when_cached():
+    """Test that a refresh token is never a bearer token, cold or warm cache."""
+    invalidate_cached_tokens()
+    token = create_refresh_token(CLAIMS)
+
+    assert _rejected(token)
+    # Warm the cache with its (valid) claims: still rejected
+    assert get_token_claims(token)["type"] == "refresh"
+    assert _rejected(token)
+    print("✅ Refresh token rejection test PASSED")
+
+def test_invalid_tokens_are_rejected():
+    """Test expired, tampered and uid-less tokens."""
+    invalidate_cached_tokens()
+    assert _rejected(create_access_token(CLAIMS, expires_delta=timedelta(seconds=-10)))
+    token = create_access_token(CLAIMS)
+    assert _rejected(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+    assert _rejected(create_access_token({"sub": "ana@example.com"}))
+    print("✅ Invalid token test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("AUTH TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_access_token_is_accepted_and_cached()
+        print()
+        test_refresh_token_is_rejected_even_when_cached()
+        print()
+        test_invalid_tokens_are_rejected()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
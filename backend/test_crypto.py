@@ -8,7 +8,13 @@ import os
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from app.core.crypto import encrypt_secret, decrypt_secret, generate_encryption_key
+import base64
+
+from app.core import crypto
+from app.core.crypto import (
+    Keyring, SecretCache, encrypt_secret, decrypt_secret, generate_encryption_key,
+    needs_reencryption, reencrypt_secret, set_keyring,
+)
 
 def test_encryption_roundtrip():
     """Test that encryption and decryption work correctly."""
@@ -67,6 +73,80 @@ def test_generate_key():
     
     print("✅ Key generation test PASSED")
 
+def test_versioned_format():
+    """Test that ciphertexts carry the format version and the primary key id."""
+    encrypted = encrypt_secret("versioned-secret")
+    version, key_id, _ = encrypted.split(":", 2)
+
+    assert version == "v1"
+    assert key_id == crypto.keyring.primary_id
+    assert not needs_reencryption(encrypted)
+
+    print("✅ Versioned format test PASSED")
+
+def test_key_rotation():
+    """Test that old ciphertexts still decrypt after rotation and re-encrypt with the new key."""
+    original = crypto.keyring
+    old_key = base64.b64decode(generate_encryption_key())
+    new_key = base64.b64decode(generate_encryption_key())
+    try:
+        set_keyring(Keyring({"old": old_key}, "old"))
+        encrypted = encrypt_secret("rotating-secret")
+
+        set_keyring(Keyring({"new": new_key, "old": old_key}, "new"))
+        assert decrypt_secret(encrypted) == "rotating-secret"
+        assert needs_reencryption(encrypted)
+
+        rotated = reencrypt_secret(encrypted)
+        assert rotated.startswith("v1:new:")
+        assert decrypt_secret(rotated) == "rotating-secret"
+
+        # Without the old key, old ciphertexts are rejected
+        set_keyring(Keyring({"new": new_key}, "new"))
+        try:
+            decrypt_secret(encrypted)
+            assert False, "Decryption with a removed key should fail"
+        except ValueError:
+            pass
+    finally:
+        set_keyring(original)
+
+    print("✅ Key rotation test PASSED")
+
+def test_legacy_ciphertexts():
+    """Test that values written by the old AES-GCM and Fernet helpers still decrypt."""
+    from Crypto.Cipher import AES
+    from Crypto.Random import get_random_bytes
+    from cryptography.fernet import Fernet
+
+    key = crypto.keyring.primary_key
+
+    nonce = get_random_bytes(12)
+    ciphertext, tag = AES.new(key, AES.MODE_GCM, nonce=nonce).encrypt_and_digest(b"legacy-aes")
+    legacy_aes = base64.b64encode(nonce + tag + ciphertext).decode()
+    assert decrypt_secret(legacy_aes) == "legacy-aes"
+
+    legacy_fernet = Fernet(base64.urlsafe_b64encode(key)).encrypt(b"legacy-fernet").decode()
+    assert decrypt_secret(legacy_fernet) == "legacy-fernet"
+    assert needs_reencryption(legacy_fernet)
+
+    print("✅ Legacy ciphertext test PASSED")
+
+def test_secret_cache_zeroizes_on_eviction():
+    """Test that the decrypted-secret LRU is bounded and wipes evicted plaintexts."""
+    cache = SecretCache(maxsize=1)
+    cache.set(b"a", "first-secret")
+    buffer = cache._data[b"a"]
+
+    cache.set(b"b", "second-secret")
+
+    assert cache.get(b"a") is None
+    assert cache.get(b"b") == "second-secret"
+    assert buffer == bytearray(len("first-secret")), "Evicted plaintext should be zeroed"
+    assert len(cache) == 1
+
+    print("✅ Secret cache test PASSED")
+
 if __name__ == "__main__":
     print("=" * 60)
     print("CRYPTO UTILITIES TEST SUITE")
@@ -81,6 +161,14 @@ if __name__ == "__main__":
         print()
         test_generate_key()
         print()
+        test_versioned_format()
+        print()
+        test_key_rotation()
+        print()
+        test_legacy_ciphertexts()
+        print()
+        test_secret_cache_zeroizes_on_eviction()
+        print()
         print("=" * 60)
         print("ALL TESTS PASSED ✅")
         print("=" * 60)
@@ -0,0 +1,96 @@
+"""
+Test script for tenant ownership in the bulk deal operations.
+Run with: python -m pytest backend/test_deal_service.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app.schemas.deal import DealBase, DealUpdate
+from app.services.deal_service import bulk_create_deals, bulk_delete_deals, bulk_update_deals
+
+class FakeResult:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def all(self):
+        return self.rows
+
+class CapturingSession:
+    """Records statements instead of running them; every query returns no rows."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append((stmt, params))
+        return FakeResult()
+
+    async def scalars(self, stmt, params=None):
+        self.statements.append((stmt, params))
+        return FakeResult()
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+def test_bulk_create_sets_owner():
+    """Test that created rows belong to the caller, whatever the payload says."""
+    db = CapturingSession()
+    asyncio.run(bulk_create_deals(db, 7, [DealBase(name="Ana", user_id=99), DealBase(name="Bia")]))
+
+    (stmt, rows), = db.statements
+    assert [row["user_id"] for row in rows] == [7, 7]
+    print("✅ Bulk create ownership test PASSED")
+
+def test_bulk_update_is_scoped_to_tenant():
+    """Test that both the status lock and the UPDATE only touch the caller's deals."""
+    db = CapturingSession()
+    asyncio.run(bulk_update_deals(db, 7, {1: DealUpdate(status="won"), 2: DealUpdate(name="Bia")}))
+
+    lock, update = (_sql(stmt) for stmt, _ in db.statements)
+    assert "crm_deals.user_id = 7" in lock and "FOR UPDATE" in lock
+    assert "crm_deals.id = v.id AND crm_deals.user_id = 7" in update
+    print("✅ Bulk update ownership test PASSED")
+
+def test_bulk_delete_is_scoped_to_tenant():
+    """Test that DELETE only matches the caller's deals, and nothing runs for an empty list."""
+    db = CapturingSession()
+    asyncio.run(bulk_delete_deals(db, 7, [1, 2, 2]))
+
+    (stmt, _), = db.statements
+    sql = _sql(stmt)
+    assert "crm_deals.id IN (1, 2) AND crm_deals.user_id = 7" in sql
+    assert "RETURNING crm_deals.id" in sql
+
+    db = CapturingSession()
+    assert asyncio.run(bulk_delete_deals(db, 7, [])) == []
+    assert db.statements == []
+    print("✅ Bulk delete ownership test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("DEAL SERVICE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_bulk_create_sets_owner()
+        print()
+        test_bulk_update_is_scoped_to_tenant()
+        print()
+        test_bulk_delete_is_scoped_to_tenant()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,112 @@
+"""
+Test script for the local (regex) lead extractor.
+Run with: python -m pytest backend/test_local_extractor.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.services.local_extractor import extract_local, is_valid_cpf, is_valid_cnpj, parse_brl
+
+POLICY_TEXT = """
+APÓLICE DE SEGURO AUTO
+Nome do Segurado: JOÃO DA SILVA ARAÚJO   CPF: 529.982.247-25
+Estipulante: ACME LTDA CNPJ 11.222.333/0001-81
+E-mail: Joao.Silva@Example.com  Telefone: (11) 98765-4321
+Prêmio Total: R$ 12.345,67
+"""
+
+def test_full_policy_is_confident():
+    """Test that a well-formatted policy yields every field and skips the AI."""
+    found = extract_local(POLICY_TEXT)
+
+    assert found.name == "JOÃO DA SILVA ARAÚJO"
+    assert found.email == "joao.silva@example.com"
+    assert found.phone == "(11) 98765-4321"
+    assert found.value == 12345.67
+    assert found.priority == "high"
+    assert found.cpf == "52998224725"
+    assert found.cnpj == "11222333000181"
+    assert found.confident
+    print("✅ Full policy test PASSED")
+
+def test_partial_text_is_not_confident():
+    """Test that missing name/value leaves the decision to the AI, keeping what was found."""
+    found = extract_local("Contato: maria@corretora.com.br")
+
+    assert found.email == "maria@corretora.com.br"
+    assert not found.confident
+    assert found.fill_missing({"name": "Maria", "email": None})["email"] == "maria@corretora.com.br"
+    print("✅ Partial text test PASSED")
+
+def test_document_numbers_are_not_phones():
+    """Test that a CPF is not mistaken for a phone number."""
+    found = extract_local("CPF 52998224725")
+
+    assert found.cpf == "52998224725"
+    assert found.phone is None
+    print("✅ CPF/phone disambiguation test PASSED")
+
+def test_policy_number_is_not_a_phone():
+    """Test that a bare 10-digit policy number is neither a phone nor enough to skip the AI."""
+    found = extract_local("Segurado: João Silva\nApólice nº 1234567890\nPrêmio Total: R$ 1.234,56")
+
+    assert found.phone is None
+    assert not found.confident
+
+    labeled = extract_local("Celular: 11987654321")
+    assert labeled.phone == "(11) 98765-4321"
+    assert not labeled.phone_formatted
+    print("✅ Policy number / phone test PASSED")
+
+def test_check_digits_and_money():
+    """Test CPF/CNPJ check digits and Brazilian currency parsing."""
+    assert is_valid_cpf("529.982.247-25")
+    assert not is_valid_cpf("529.982.247-26")
+    assert not is_valid_cpf("111.111.111-11")
+    assert is_valid_cnpj("11.222.333/0001-81")
+    assert not is_valid_cnpj("11.222.333/0001-80")
+    assert parse_brl("1.234,56") == 1234.56
+    assert parse_brl("1234.56") == 1234.56
+    print("✅ Check digit / money test PASSED")
+
+def test_ambiguous_amounts_are_rejected():
+    """Test that '1.234' is only read as money after R$ (thousands vs decimals)."""
+    assert parse_brl("1.234") is None
+    assert parse_brl("1.234", currency=True) == 1234.0
+    assert parse_brl("1.234,56") == 1234.56
+
+    assert extract_local("Prêmio Total: 1.234").value is None
+    assert extract_local("Prêmio Total: R$ 1.234").value == 1234.0
+    assert extract_local("Prêmio Total: 1.234,56").value == 1234.56
+    print("✅ Ambiguous amount test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("LOCAL EXTRACTOR TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_full_policy_is_confident()
+        print()
+        test_partial_text_is_not_confident()
+        print()
+        test_document_numbers_are_not_phones()
+        print()
+        test_policy_number_is_not_a_phone()
+        print()
+        test_check_digits_and_money()
+        print()
+        test_ambiguous_amounts_are_rejected()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
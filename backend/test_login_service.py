@@ -0,0 +1,160 @@
+"""
+Test script for /auth/login credential checks (memory, local, Chatwoot, offline).
+Run with: python -m pytest backend/test_login_service.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+
+from app.models.credential import LoginCredential
+from app.services import login_service
+from app.services.login_service import AuthUnavailable, InvalidCredentials, authenticate
+
+EMAIL = "ana@example.com"
+CHATWOOT_USER = {"id": 5, "name": "Ana", "email": EMAIL}
+
+class FakeChatwoot:
+    """Replaces the credential store, bcrypt and Chatwoot sign_in; records what was called."""
+
+    def __init__(self, credential=None, status_code=200, unreachable=False):
+        self.credential = credential
+        self.status_code = status_code
+        self.unreachable = unreachable
+        self.calls = []
+
+    async def get_credential(self, email):
+        self.calls.append("get_credential")
+        return self.credential
+
+    async def verify_hash(self, password, password_hash):
+        self.calls.append("bcrypt")
+        return password_hash == f"hash:{password}"
+
+    async def sign_in(self, email, password, timeout=None):
+        self.calls.append("sign_in")
+        if self.unreachable:
+            raise httpx.ConnectError("connection refused")
+        return SimpleNamespace(status_code=self.status_code, json=lambda: {"data": CHATWOOT_USER})
+
+    async def store_credential(self, email, password, user_data):
+        self.calls.append("store")
+        self.credential = _credential(password, age=timedelta(0))
+        return self.credential
+
+    async def forget_credential(self, email):
+        self.calls.append("forget")
+        self.credential = None
+
+@contextmanager
+def _chatwoot(fake: FakeChatwoot):
+    replaced = {
+        "get_credential": fake.get_credential,
+        "_verify_hash": fake.verify_hash,
+        "sign_in": fake.sign_in,
+        "_store_credential": fake.store_credential,
+        "forget_credential": fake.forget_credential,
+    }
+    originals = {name: getattr(login_service, name) for name in replaced}
+    for name, value in replaced.items():
+        setattr(login_service, name, value)
+    login_service._verified.clear()
+    try:
+        yield fake
+    finally:
+        for name, value in originals.items():
+            setattr(login_service, name, value)
+        login_service._verified.clear()
+
+def _credential(password: str, age: timedelta) -> LoginCredential:
+    return LoginCredential(
+        email=EMAIL, password_hash=f"hash:{password}", chatwoot_user_id=5, name="Ana",
+        verified_at=datetime.now(timezone.utc) - age,
+    )
+
+def _fails_with(exception, email, password) -> bool:
+    try:
+        asyncio.run(authenticate(email, password))
+    except exception:
+        return True
+    return False
+
+def test_first_login_goes_to_chatwoot_then_memory():
+    """Test that an unknown user signs in upstream once, then is served from memory."""
+    with _chatwoot(FakeChatwoot()) as fake:
+        user = asyncio.run(authenticate(" Ana@Example.com ", "secret"))
+        assert user == {"email": EMAIL, "id": 5, "name": "Ana"}
+        assert fake.calls == ["get_credential", "sign_in", "store"]
+
+        fake.calls.clear()
+        assert asyncio.run(authenticate(EMAIL, "secret")) == user
+        assert fake.calls == []
+        # Another password never matches the memory entry: it is checked again, and upstream rejects it
+        fake.status_code = 401
+        assert _fails_with(InvalidCredentials, EMAIL, "other")
+        assert fake.calls == ["get_credential", "bcrypt", "sign_in"]
+    print("✅ Chatwoot / memory login test PASSED")
+
+def test_fresh_local_credential_skips_chatwoot():
+    """Test that a recently verified credential is checked locally with one bcrypt."""
+    with _chatwoot(FakeChatwoot(_credential("secret", age=timedelta(hours=1)))) as fake:
+        assert asyncio.run(authenticate(EMAIL, "secret"))["id"] == 5
+        assert fake.calls == ["get_credential", "bcrypt"]
+    print("✅ Local login test PASSED")
+
+def test_offline_login_within_max_age():
+    """Test that Chatwoot being down accepts an older credential, up to LOGIN_OFFLINE_MAX_AGE."""
+    with _chatwoot(FakeChatwoot(_credential("secret", age=timedelta(days=2)), unreachable=True)) as fake:
+        assert asyncio.run(authenticate(EMAIL, "secret"))["id"] == 5
+        assert fake.calls == ["get_credential", "sign_in", "bcrypt"]
+        assert _fails_with(AuthUnavailable, EMAIL, "wrong")
+
+    with _chatwoot(FakeChatwoot(_credential("secret", age=timedelta(days=30)), unreachable=True)):
+        assert _fails_with(AuthUnavailable, EMAIL, "secret")
+    print("✅ Offline login test PASSED")
+
+def test_chatwoot_401_forgets_matching_credential():
+    """Test that a password Chatwoot rejects is dropped locally, but only if it is the stored one."""
+    with _chatwoot(FakeChatwoot(_credential("old", age=timedelta(days=2)), status_code=401)) as fake:
+        assert _fails_with(InvalidCredentials, EMAIL, "old")
+        assert fake.calls == ["get_credential", "sign_in", "bcrypt", "forget"]
+        assert fake.credential is None
+
+    with _chatwoot(FakeChatwoot(_credential("secret", age=timedelta(hours=1)), status_code=401)) as fake:
+        assert _fails_with(InvalidCredentials, EMAIL, "typo")
+        # bcrypt ran once (local check), and a wrong password doesn't drop the credential
+        assert fake.calls == ["get_credential", "bcrypt", "sign_in"]
+        assert fake.credential is not None
+    print("✅ 401 forget test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("LOGIN SERVICE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_first_login_goes_to_chatwoot_then_memory()
+        print()
+        test_fresh_local_credential_skips_chatwoot()
+        print()
+        test_offline_login_within_max_age()
+        print()
+        test_chatwoot_401_forgets_matching_credential()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Test script for keyset pagination cursors.
+Run with: python -m pytest backend/test_pagination.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from app.core.pagination import decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor
+
+def test_cursor_roundtrip():
+    """Test that (updated_at, id) survives encode/decode, timezone and microseconds included."""
+    updated_at = datetime(2024, 3, 5, 14, 7, 9, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(updated_at, 42)
+
+    assert "=" not in cursor  # URL-safe, unpadded
+    assert decode_cursor(cursor) == (updated_at, 42)
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+    print("✅ Cursor roundtrip test PASSED")
+
+def test_rank_cursor_roundtrip():
+    """Test that (rank, id) survives encode/decode."""
+    cursor = encode_rank_cursor(0.0607927, 7)
+    assert decode_rank_cursor(cursor) == (0.0607927, 7)
+    print("✅ Rank cursor roundtrip test PASSED")
+
+def test_malformed_cursor_is_400():
+    """Test that garbage or a cursor of the other kind is rejected with HTTP 400."""
+    for bad in ("not-a-cursor", "e30", encode_rank_cursor(1.0, 1)):
+        try:
+            decode_cursor(bad)
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError(f"{bad!r} was accepted")
+    print("✅ Malformed cursor test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("PAGINATION TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_cursor_roundtrip()
+        print()
+        test_rank_cursor_roundtrip()
+        print()
+        test_malformed_cursor_is_400()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
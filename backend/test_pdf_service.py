@@ -0,0 +1,60 @@
+"""
+Test script for PDF page selection under the context budget.
+Run with: python -m pytest backend/test_pdf_service.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.services.pdf_service import select_pages
+
+def _join(selection):
+    return "\n".join(selection.texts[n] for n in sorted(selection.texts))
+
+def test_filler_page_does_not_push_out_keyword_page():
+    """Test that an early filler page is trimmed instead of the later keyword page."""
+    pages = [
+        "Condições gerais " * 100,                       # page 1: filler, 1700 chars
+        "Segurado: João Silva\nPrêmio Total: R$ 1.234,56",  # page 2: keywords
+    ]
+    selection = select_pages(lambda n: pages[n], len(pages), max_chars=500, priority_scan_pages=30)
+    text = _join(selection)
+
+    assert selection.priority_pages == [1]
+    assert "Prêmio Total: R$ 1.234,56" in text
+    assert text.startswith("Condições gerais")
+    assert len(text) <= 500
+    assert selection.trimmed
+    print("✅ Keyword page priority test PASSED")
+
+def test_small_document_is_read_whole():
+    """Test that pages fitting the budget are kept untouched, in document order."""
+    pages = ["Proposta", "", "Prêmio Total: R$ 10,00"]
+    selection = select_pages(lambda n: pages[n], len(pages), max_chars=1000, priority_scan_pages=30)
+
+    assert _join(selection) == "Proposta\nPrêmio Total: R$ 10,00"
+    assert not selection.trimmed
+    assert selection.pages_read == 3
+    print("✅ Whole document test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("PDF SERVICE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_filler_page_does_not_push_out_keyword_page()
+        print()
+        test_small_document_is_read_whole()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
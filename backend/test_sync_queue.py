@@ -0,0 +1,112 @@
+"""
+Test script for the coalescing, debounced Chatwoot sync queue.
+Run with: python -m pytest backend/test_sync_queue.py -v
+"""
+import sys
+import os
+
+# Add backend to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import asyncio
+
+from app.services.sync_queue import ChatwootSyncQueue
+
+class RecordingQueue(ChatwootSyncQueue):
+    """Records syncs instead of calling Chatwoot; each sync takes `sync_seconds`."""
+
+    def __init__(self, debounce: float, sync_seconds: float = 0.0):
+        super().__init__(debounce=debounce, workers=2)
+        self.sync_seconds = sync_seconds
+        self.synced = []
+
+    async def _sync(self, deal_id: int):
+        self.synced.append(deal_id)
+        await asyncio.sleep(self.sync_seconds)
+
+def test_rapid_changes_are_coalesced():
+    """Test that several changes of one deal within the debounce window cost one sync."""
+    async def run():
+        queue = RecordingQueue(debounce=0.05)
+        queue.start()
+        for _ in range(3):
+            queue.enqueue(1)
+            await asyncio.sleep(0.01)
+        queue.enqueue(2)
+        await asyncio.sleep(0.2)
+        await queue.stop()
+        return queue.synced
+
+    assert sorted(asyncio.run(run())) == [1, 2]
+    print("✅ Coalescing test PASSED")
+
+def test_debounce_restarts_on_each_change():
+    """Test that the sync waits for the deal to settle, not for the first change."""
+    async def run():
+        queue = RecordingQueue(debounce=0.1)
+        queue.start()
+        queue.enqueue(1)
+        await asyncio.sleep(0.07)
+        queue.enqueue(1)
+        await asyncio.sleep(0.07)
+        settled_early = list(queue.synced)  # 0.14s after the first change, 0.07s after the last
+        await asyncio.sleep(0.1)
+        await queue.stop()
+        return settled_early, queue.synced
+
+    settled_early, synced = asyncio.run(run())
+    assert settled_early == []
+    assert synced == [1]
+    print("✅ Debounce test PASSED")
+
+def test_change_during_sync_reruns_once():
+    """Test that changes made while a deal is syncing trigger exactly one more sync."""
+    async def run():
+        queue = RecordingQueue(debounce=0.01, sync_seconds=0.1)
+        queue.start()
+        queue.enqueue(1)
+        await asyncio.sleep(0.05)  # sync of deal 1 in flight
+        queue.enqueue(1)
+        queue.enqueue(1)
+        await asyncio.sleep(0.3)
+        await queue.stop()
+        return queue.synced
+
+    assert asyncio.run(run()) == [1, 1]
+    print("✅ Rerun test PASSED")
+
+def test_stop_flushes_pending_syncs():
+    """Test that stop() runs syncs still waiting for their debounce timer."""
+    async def run():
+        queue = RecordingQueue(debounce=60)
+        queue.start()
+        queue.enqueue_many([1, 2, 3])
+        await queue.stop(timeout=1)
+        return queue.synced
+
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+    print("✅ Flush on stop test PASSED")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("CHATWOOT SYNC QUEUE TEST SUITE")
+    print("=" * 60)
+
+    try:
+        test_rapid_changes_are_coalesced()
+        print()
+        test_debounce_restarts_on_each_change()
+        print()
+        test_change_during_sync_reruns_once()
+        print()
+        test_stop_flushes_pending_syncs()
+        print()
+        print("=" * 60)
+        print("ALL TESTS PASSED ✅")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ TEST FAILED: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -1,6 +1,5 @@
 from fastapi.testclient import TestClient
-from app.routers.webhooks import router, redis_client
-from app.core.database import get_db
+from app.routers.webhooks import router
 from fastapi import FastAPI
 import hmac
 import hashlib
@@ -12,10 +11,8 @@ import time
 app = FastAPI()
 app.include_router(router)
 
-# Override get_db to avoid real DB connection if possible, or just let it fail later
-# For webhook verification (HMAC and Redis), we usually fail before DB unless valid.
-# But "handle_contact_created" needs DB.
-# We will test the "401" and "Redis Idempotency" which happen *before* logic deep inside.
+# Needs the database (tenant lookup) and Redis (webhook stream) to be reachable.
+# Valid events are only queued here; app.workers.webhook_worker applies them.
 
 client = TestClient(app)
 
@@ -50,33 +47,26 @@ def test_idempotency():
     payload = {
         "event": "conversation_updated",
         "id": 99999,
+        "account": {"id": 1},
         "data": {"conversation": {"id": 99999, "labels": []}}
     }
-    sig = generate_signature(payload)
-    headers = {"X-Chatwoot-Signature": sig}
-    
-    # Clear key first
-    redis_client.delete("lock:conv:99999")
-    
-    # First Request
-    # Note: It might fail deep inside 'handle_conversation_updated' because of DB, 
-    # but we check if it PASSED the idempotency check.
-    # If it returns "ignored" (duplicate), that's idempotency working.
-    # If it tries to process (and errors on DB), that means it PASSED idempotency (first time).
-    
-    print("Sending Request 1...")
-    try:
-        response1 = client.post("/chatwoot", json=payload, headers=headers)
-        print(f"Response 1: {response1.json()}")
-    except Exception as e:
-        print(f"Response 1 Error (Expected DB error maybe): {e}")
+    body = json.dumps(payload)
+    headers = {"X-Chatwoot-Signature": generate_signature(payload), "Content-Type": "application/json"}
+
+    # First delivery is appended to the stream
+    print("Sending Request 1 (should be queued)...")
+    response1 = client.post("/chatwoot", content=body, headers=headers)
+    print(f"Response 1: {response1.json()}")
 
-    # Second Request immediately
+    # Redelivery of the same event is dropped by the stream dedup key
     print("Sending Request 2 (should be ignored)...")
-    response2 = client.post("/chatwoot", json=payload, headers=headers)
+    response2 = client.post("/chatwoot", content=body, headers=headers)
     print(f"Response 2: {response2.json()}")
-    
-    if response2.json().get("status") == "ignored" and response2.json().get("reason") == "duplicate_event":
+
+    # Re-running the script: the event id is already known, so both are duplicates
+    first = response1.json()
+    first_ok = (first.get("status") == "queued" and bool(first.get("id"))) or first.get("reason") == "duplicate_event"
+    if first_ok and response2.json() == {"status": "ignored", "reason": "duplicate_event"}:
         print("PASS: Duplicate event ignored")
     else:
         print("FAIL: Event not ignored")
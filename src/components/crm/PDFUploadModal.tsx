@@ -52,8 +52,27 @@ export const PDFUploadModal = ({ isOpen, onClose }: PDFUploadModalProps) => {
                 throw new Error(errData.detail || 'Erro ao processar PDF');
             }
 
-            const data = await res.json();
-            setExtractedData(data); // Expects { name, value, priority, email, phone }
+            // Extraction runs as a background job: long-poll until it finishes
+            const { job_id } = await res.json();
+            let job: any = { status: 'queued' };
+            while (job.status === 'queued' || job.status === 'running') {
+                const jobRes = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/crm/leads/extract/${job_id}?wait=20`, {
+                    headers: {
+                        'Authorization': `Bearer ${token}`
+                    }
+                });
+                if (!jobRes.ok) {
+                    const errData = await jobRes.json();
+                    throw new Error(errData.detail || 'Erro ao processar PDF');
+                }
+                job = await jobRes.json();
+            }
+
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Erro ao processar PDF');
+            }
+
+            setExtractedData(job.result); // Expects { name, value, priority, email, phone }
             setStep('review');
         } catch (e: any) {
             console.error(e);
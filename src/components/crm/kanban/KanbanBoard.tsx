@@ -18,7 +18,7 @@ import { KanbanColumn } from './KanbanColumn';
 import { KanbanCard, Deal } from './KanbanCard';
 import { Loader2, Plus } from 'lucide-react';
 import toast from 'react-hot-toast';
-import { fetchStages, fetchLeads, updateLeadStatus } from '@/lib/api';
+import { fetchStages, fetchBoard, updateLeadStatus } from '@/lib/api';
 import { StageDialog } from './StageDialog';
 
 export interface Stage {
@@ -43,12 +43,9 @@ export const KanbanBoard = () => {
     useEffect(() => {
         const loadData = async () => {
             try {
-                const [stagesData, leadsData] = await Promise.all([
-                    fetchStages(),
-                    fetchLeads()
-                ]);
-                setStages(stagesData);
-                setDeals(leadsData);
+                const board: { stage: Stage; deals: Deal[] }[] = await fetchBoard();
+                setStages(board.map(column => column.stage));
+                setDeals(board.flatMap(column => column.deals));
             } catch (e) {
                 console.error("Failed to load Kanban data", e);
             } finally {
@@ -77,6 +77,14 @@ export const deleteStage = async (id: number) => {
     return handleResponse(res);
 };
 
+// Board: stages with per-stage count, total value and top cards in one request
+export const fetchBoard = async (cardsPerStage = 50) => {
+    const res = await fetch(`${API_URL}/crm/board/?cards_per_stage=${cardsPerStage}`, {
+        headers: getAuthHeaders()
+    });
+    return handleResponse(res);
+};
+
 // Leads
 export const fetchLeads = async () => {
     // Force trailing slash